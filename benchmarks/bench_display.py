@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Camera display path: the old update_frame/display_image (cv2.flip, QImage,
+rgbSwapped, QPixmap.fromImage at full size) against gui.FrameDisplay
+(scale to the label into a kept buffer, cvtColor into an RGB32 buffer Qt
+shares, flip in place), per frame.
+
+time is the median per frame. allocated is what each path allocates per
+frame: numpy/OpenCV buffers as seen by tracemalloc, plus the QImage and
+QPixmap copies, sized from the objects themselves (a pixmap that shares
+FrameDisplay's buffer is not a copy).
+
+	QT_QPA_PLATFORM=offscreen python benchmarks/bench_display.py [--frames 200] [--label 640x480]
+'''
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy
+from PyQt5 import QtGui, QtWidgets
+
+import gui
+from poseidon import camera
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def image_bytes(image):
+	return image.bytesPerLine() * image.height()
+
+
+def pixmap_bytes(pixmap):
+	return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+def legacy(label, image):
+	'''update_frame + display_image before FrameDisplay, returns the Qt bytes it copied'''
+	image = camera.cv2().flip(image, 1)
+	qimage = QtGui.QImage(image, image.shape[1], image.shape[0], image.strides[0], QtGui.QImage.Format_RGB888)
+	swapped = QtGui.QImage.rgbSwapped(qimage)
+	pixmap = QtGui.QPixmap.fromImage(swapped)
+	label.setPixmap(pixmap)
+	return image_bytes(swapped) + pixmap_bytes(pixmap)
+
+
+def current(display):
+	def show(label, image):
+		pixmap = display.pixmap(image)
+		label.setPixmap(pixmap)
+		if int(pixmap.toImage().constBits()) == display.pixels.ctypes.data:
+			return 0
+		return pixmap_bytes(pixmap)
+	return show
+
+
+def measure(show, label, frames):
+	times = []
+	for image in frames:
+		t0 = time.perf_counter()
+		show(label, image)
+		times.append(time.perf_counter() - t0)
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()
+	qt_bytes = 0
+	for image in frames[:20]:
+		tracemalloc.reset_peak()
+		qt_bytes += show(label, image)
+	# numpy buffers that were allocated and freed again still show up in the peak
+	peak = tracemalloc.get_traced_memory()[1] - before[0]
+	tracemalloc.stop()
+	return statistics.median(times), peak + qt_bytes / 20.0
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+	parser.add_argument('--frames', type=int, default=200)
+	parser.add_argument('--label', default='640x480', help='size of the image label, WxH')
+	args = parser.parse_args()
+	label_w, label_h = [int(v) for v in args.label.split('x')]
+
+	app = QtWidgets.QApplication([])
+	label = QtWidgets.QLabel()
+	label.resize(label_w, label_h)
+
+	print("label %dx%d, %d frames" % (label_w, label_h, args.frames))
+	print("%-10s %-8s %10s %14s" % ('frame', 'path', 'time', 'allocated'))
+	rng = numpy.random.default_rng(0)
+	for w, h in RESOLUTIONS:
+		frames = [rng.integers(0, 255, (h, w, 3), dtype=numpy.uint8) for _ in range(4)]
+		frames = [frames[i % 4] for i in range(args.frames)]
+		for name, show in [('legacy', legacy), ('current', current(gui.FrameDisplay(label)))]:
+			t, allocated = measure(show, label, frames)
+			print("%-10s %-8s %7.2f ms %11.2f MB" % ("%dx%d" % (w, h), name, t * 1e3, allocated / 1e6))
+
+
+if __name__ == "__main__":
+	main()
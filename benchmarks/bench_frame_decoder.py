@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Microbenchmark: per-byte frame reading (the old listening/recvPositionArduino
+loop) against poseidon.protocol.FrameDecoder.
+
+Both decoders read from a ReplayPort that hands out a captured byte stream the
+way a USB CDC serial port does, at most one 64 byte packet per read. Capture a
+real stream with e.g.
+
+	stty -F /dev/ttyACM0 230400 raw && cat /dev/ttyACM0 > capture.bin
+
+and pass it with --capture, otherwise a synthetic stream of <DISP1|n> position
+frames and replyToPC echoes is generated.
+
+	python benchmarks/bench_frame_decoder.py [--capture capture.bin] [--repeat 5]
+'''
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from poseidon import protocol
+
+
+class ReplayPort(object):
+	'''Minimal stand-in for serial.Serial that replays a byte string'''
+
+	def __init__(self, data, packet_size=64):
+		self.data = data
+		self.pos = 0
+		self.packet_size = packet_size
+		self.reads = 0
+
+	@property
+	def in_waiting(self):
+		return min(self.packet_size, len(self.data) - self.pos)
+
+	def inWaiting(self):
+		return self.in_waiting
+
+	def read(self, size=1):
+		self.reads += 1
+		chunk = self.data[self.pos:self.pos + size]
+		self.pos += len(chunk)
+		return chunk
+
+	def exhausted(self):
+		return self.pos >= len(self.data)
+
+
+def synthetic_capture(n_disp=20000):
+	'''What serialCOM_v0.1 prints for a SETTING echo followed by a three pump run'''
+	out = [b"<Arduino is ready>\r\n"]
+	out.append(b"<mode: SETTING ,setting: SPEED ,motorID: 1 ,value: 800.00 ,direction: F ,p1 optional: 0.00 ,p2 optional: 0.00 ,p3 optional: 0.00 ,Time 12>\r\n")
+	for n in range(n_disp, 0, -1):
+		out.append(b"<DISP%d|%d>" % (n % 3 + 1, n))
+	out.append(b"<mode: RUN ,setting: DIST ,motorID: 123 ,value: 0.00 ,direction: F ,p1 optional: 6400.00 ,p2 optional: 6400.00 ,p3 optional: 6400.00 ,Time 40>\r\n")
+	return b"".join(out)
+
+
+def legacy_decode(port):
+	'''The read loop gui.py used before FrameDecoder, minus the print()s'''
+	startMarker = 60
+	endMarker = 62
+	midMarker = 124
+	frames = 0
+	while not port.exhausted():
+		x = "z"
+		ck = ""
+		while not x or ord(x) != startMarker:
+			x = port.read()
+			if not x:
+				return frames
+		while ord(x) != endMarker:
+			if ord(x) == midMarker:
+				ck = ""
+				x = port.read()
+			if ord(x) != startMarker:
+				ck = ck + x.decode()
+			x = port.read()
+		frames += 1
+	return frames
+
+
+def bulk_decode(port):
+	decoder = protocol.FrameDecoder()
+	frames = 0
+	while not port.exhausted():
+		for frame in decoder.read(port):
+			frames += 1
+	return frames
+
+
+def run(name, fn, data, repeat):
+	best = None
+	for _ in range(repeat):
+		port = ReplayPort(data)
+		t0 = time.perf_counter()
+		frames = fn(port)
+		elapsed = time.perf_counter() - t0
+		if best is None or elapsed < best[0]:
+			best = (elapsed, frames, port.reads)
+	elapsed, frames, reads = best
+	print("%-8s %8d frames %9d read() calls %9.1f ms %12.0f frames/s %8.2f MB/s" % (
+		name, frames, reads, elapsed * 1e3, frames / elapsed, len(data) / elapsed / 1e6))
+	return elapsed
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+	parser.add_argument('--capture', help='raw byte stream captured from the board')
+	parser.add_argument('--repeat', type=int, default=5)
+	args = parser.parse_args()
+
+	if args.capture:
+		with open(args.capture, 'rb') as f:
+			data = f.read()
+	else:
+		data = synthetic_capture()
+	print("Replaying %d bytes" % len(data))
+
+	legacy = run('legacy', legacy_decode, data, args.repeat)
+	bulk = run('bulk', bulk_decode, data, args.repeat)
+	print("speedup  %.1fx" % (legacy / bulk))
+
+
+if __name__ == "__main__":
+	main()
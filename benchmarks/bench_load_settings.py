@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Loading a settings file into the window: what it sets off.
+
+Counts, per load, the calls into the pump input handlers (set_pump_input,
+send_pump_warning), the PumpBank updates, the unit factor lookups a
+syringe or units change costs, the conversions (entries of the *_steps
+arrays worked out, PumpBank.conversions) up to and including the next time
+the settings are sent, and the time it takes.
+
+- before: load_settings as it was before the widgets' signals were
+  blocked, copied here: the pumps set in one update each, then every
+  widget set with its signals on (each setCurrentIndex/setValue runs the
+  handlers again)
+- load_settings: MainWindow.load_settings as it is, the widgets set with
+  their signals blocked
+
+The two files alternate so every load changes every value.
+
+	QT_QPA_PLATFORM=offscreen python benchmarks/bench_load_settings.py [--loads 50]
+'''
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PyQt5 import QtCore, QtWidgets
+
+import gui
+from poseidon import pumps, settings
+
+FILES = [
+	{'notes': 'first', 'pumps': [dict(number=n, syringe='BD 10 mL', units='mL/hr', speed=1.0 * n, accel=2.0 * n, jog_delta=0.1, amount=0.5) for n in (1, 2, 3)]},
+	{'notes': 'second', 'pumps': [dict(number=n, syringe='BD 3 mL', units='mm/s', speed=0.5 * n, accel=1.0 * n, jog_delta=1.0, amount=0.2) for n in (1, 2, 3)]},
+]
+
+
+def before_load(window, name):
+	'''MainWindow.load_settings and show_pump_inputs before the signals were blocked'''
+	document = settings.load(name)
+	for n in settings.apply(window.pumps, document):
+		pump = window.pumps[n - 1]
+		for dropdown, value in [('syringe_DROPDOWN', pump.syringe), ('units_DROPDOWN', pump.units),
+				('setup_jog_delta_INPUT', str(pump.jog_delta))]:
+			widget = window.pump_widget(n, dropdown)
+			index = widget.findText(value, QtCore.Qt.MatchFixedString)
+			if index < 0:
+				widget.addItem(value)
+				index = widget.count() - 1
+			widget.setCurrentIndex(index)
+		window.pump_widget(n, 'speed_INPUT').setValue(pump.speed)
+		window.pump_widget(n, 'accel_INPUT').setValue(pump.accel)
+		window.pump_widget(n, 'amount_INPUT').setValue(pump.amount)
+		window.send_pump_warning(n)
+		window.dirty_pumps.add(n)
+	window.refresh_pumps()
+	window.experiment_notes = document['notes']
+	window.ui.experiment_notes.setText(window.experiment_notes)
+
+
+def current_load(window, name):
+	gui.QFileDialog.getOpenFileName = staticmethod(lambda *args, **kwargs: (name, ''))
+	window.load_settings()
+
+
+def counting(owner, counts, name):
+	original = getattr(owner, name)
+
+	def counted(*args, **kwargs):
+		counts[name] += 1
+		return original(*args, **kwargs)
+	counted.__wrapped__ = original
+	setattr(owner, name, counted)
+
+
+def measure(load, paths, loads):
+	window = gui.MainWindow()
+	window.port_watcher.stop()
+	counts = dict.fromkeys(['set_pump_input', 'send_pump_warning', 'update', 'factors'], 0)
+	counting(window, counts, 'set_pump_input')
+	counting(window, counts, 'send_pump_warning')
+	counting(window.pumps, counts, 'update')
+	counting(pumps.units, counts, 'factors')
+	app = QtWidgets.QApplication.instance()
+	bank = window.pumps
+	bank.settings_commands()
+	conversions, times = 0, []
+	for i in range(loads):
+		before = bank.conversions
+		t0 = time.perf_counter()
+		load(window, paths[i % 2])
+		app.processEvents()
+		times.append(time.perf_counter() - t0)
+		# what the next Send works out
+		bank.settings_commands()
+		bank.amount_steps
+		conversions += bank.conversions - before
+	pumps.units.factors = pumps.units.factors.__wrapped__
+	return dict((name, count / float(loads)) for name, count in counts.items()), conversions / float(loads), statistics.median(times)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+	parser.add_argument('--loads', type=int, default=50)
+	args = parser.parse_args()
+
+	app = QtWidgets.QApplication([])
+	directory = tempfile.mkdtemp()
+	paths = []
+	for i, document in enumerate(FILES):
+		document = dict(document, format=settings.FORMAT, version=settings.VERSION)
+		paths.append(os.path.join(directory, "settings%d.json" % i))
+		with open(paths[-1], 'w') as f:
+			f.write(json.dumps(document))
+
+	print("per load, %d loads" % args.loads)
+	print("%-14s %15s %18s %8s %8s %12s %10s" % ('', 'set_pump_input', 'send_pump_warning', 'updates', 'factors', 'conversions', 'time'))
+	for name, load in [('before', before_load), ('load_settings', current_load)]:
+		counts, conversions, t = measure(load, paths, args.loads)
+		print("%-14s %15.1f %18.1f %8.1f %8.1f %12.1f %7.2f ms" % (name, counts['set_pump_input'],
+			counts['send_pump_warning'], counts['update'], counts['factors'], conversions, t * 1e3))
+
+
+if __name__ == "__main__":
+	main()
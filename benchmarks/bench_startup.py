@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Startup cost: wall time and peak RSS of bringing gui.py's window up (and of
+the headless controller), each in a fresh interpreter.
+
+Cases:
+- controller: import poseidon.controller, what python -m poseidon pays
+- gui: import gui and build the MainWindow, OpenCV left until the camera is used
+- gui+cv2: the same with cv2 imported up front, the way gui.py used to
+- camera: gui, then the first camera use (the cv2 import) on top
+
+wall is the whole process from the parent's point of view (interpreter
+start included), ready is measured inside the child from the first line of
+this script to the window being built. Run with QT_QPA_PLATFORM=offscreen
+where there is no display.
+
+	python benchmarks/bench_startup.py [--repeat 5]
+'''
+
+import time
+T0 = time.perf_counter()
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+CASES = ['controller', 'gui', 'gui+cv2', 'camera']
+
+
+def child(case):
+	'''Runs in the fresh interpreter, prints what it measured as json'''
+	if case == 'controller':
+		import poseidon.controller
+	else:
+		if case == 'gui+cv2':
+			import cv2
+		from PyQt5 import QtWidgets
+		import gui
+		app = QtWidgets.QApplication([])
+		window = gui.MainWindow()
+		window.port_watcher.stop()
+		if case == 'camera':
+			gui.camera.cv2()
+	ready = time.perf_counter() - T0
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == 'darwin':
+		rss //= 1024
+	print(json.dumps({'ready': ready, 'rss_kb': rss, 'cv2': 'cv2' in sys.modules,
+		'qt': 'PyQt5' in sys.modules}))
+	sys.stdout.flush()
+	# skip closeEvent and the interpreter teardown, they are not startup
+	os._exit(0)
+
+
+def measure(case):
+	t0 = time.perf_counter()
+	out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', case],
+		stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, cwd=ROOT).stdout
+	result = json.loads(out.decode().strip().splitlines()[-1])
+	result['wall'] = time.perf_counter() - t0
+	return result
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+	parser.add_argument('--repeat', type=int, default=5, help='runs per case, the median is shown')
+	parser.add_argument('--child', choices=CASES, help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		child(args.child)
+		return
+
+	print("%-11s %10s %10s %12s %5s %5s" % ('', 'wall', 'ready', 'peak RSS', 'Qt', 'cv2'))
+	for case in CASES:
+		runs = [measure(case) for _ in range(args.repeat)]
+		print("%-11s %7.0f ms %7.0f ms %9.1f MB %5s %5s" % (case,
+			statistics.median(r['wall'] for r in runs) * 1e3,
+			statistics.median(r['ready'] for r in runs) * 1e3,
+			max(r['rss_kb'] for r in runs) / 1024.0,
+			'yes' if runs[0]['qt'] else 'no', 'yes' if runs[0]['cv2'] else 'no'))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+STOP latency: time from clicking the STOP button to the first byte of the
+STOP command arriving on the far side of the serial link.
+
+The GUI runs offscreen and talks to a simulated board on a pseudo terminal.
+The board timestamps every byte it receives and echoes each command like
+replyToPC() does, after --reply-delay ms, so with --busy the send window is
+kept full of SETTING traffic the whole time, the worst case for a STOP.
+
+	python benchmarks/bench_stop_latency.py [--samples 200] [--busy]
+'''
+
+import argparse
+import os
+import pty
+import sys
+import threading
+import time
+import tty
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PyQt5 import QtWidgets
+import gui
+from poseidon import log
+
+
+class SlowEchoBoard(object):
+	'''Reads commands off the pty master, notes when STOP arrives, echoes late'''
+
+	def __init__(self, master, reply_delay):
+		self.master = master
+		self.reply_delay = reply_delay
+		self.stop_arrived = threading.Event()
+		self.stop_arrived_at = None
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def reply(self, fields):
+		motor = int(fields[2]) if fields[2].isdigit() else 0
+		echo = "<mode: %s ,setting: %s ,motorID: %d ,value: 0.00 ,direction: F ,p1 optional: 0.00 ,p2 optional: 0.00 ,p3 optional: 0.00 ,Time 0>\r\n" % (fields[0], fields[1], motor)
+		os.write(self.master, echo.encode())
+
+	# what setup() prints after the reset that opening the port causes
+	def boot(self):
+		os.write(self.master, b"<Arduino is ready>\r\n")
+
+	def run(self):
+		buf = b""
+		while True:
+			try:
+				data = os.read(self.master, 4096)
+			except OSError:
+				return
+			now = time.perf_counter()
+			if b"<STOP" in data and not self.stop_arrived.is_set():
+				self.stop_arrived_at = now
+				self.stop_arrived.set()
+			buf += data
+			while b">" in buf:
+				frame, _, buf = buf.partition(b">")
+				fields = frame[frame.rfind(b"<") + 1:].decode().split(",")
+				threading.Timer(self.reply_delay, self.reply, (fields,)).start()
+
+
+def histogram(samples_us):
+	samples_us = sorted(samples_us)
+	n = len(samples_us)
+	print("n=%d  min %.0f  p50 %.0f  p90 %.0f  p99 %.0f  max %.0f  (us)" % (
+		n, samples_us[0], samples_us[n // 2], samples_us[int(n * 0.9)],
+		samples_us[min(n - 1, int(n * 0.99))], samples_us[-1]))
+	edges = [2 ** k for k in range(4, 18)]
+	counts = [0] * len(edges)
+	for s in samples_us:
+		for i, edge in enumerate(edges):
+			if s < edge or i == len(edges) - 1:
+				counts[i] += 1
+				break
+	low = 0
+	for edge, count in zip(edges, counts):
+		if count:
+			print("%7d - %7d us | %-50s %d" % (low, edge, '#' * max(1, 50 * count // n), count))
+		low = edge
+
+
+def measure(args):
+	# nothing worth keeping, and no runs/ left behind wherever it is run from
+	gui.RUN_LOG_DIRECTORY = None
+	app = QtWidgets.QApplication([])
+	window = gui.MainWindow()
+	master, slave = pty.openpty()
+	tty.setraw(master)
+	tty.setraw(slave)
+	board = SlowEchoBoard(master, args.reply_delay / 1e3)
+
+	window.port = os.ttyname(slave)
+	window.connect()
+	board.boot()
+	while not window.ui.disconnect_BTN.isEnabled():
+		app.processEvents()
+	window.ungrey_out_components()
+
+	settings = ["<SETTING,SPEED,%d,1280.0,F,0.0,0.0,0.0>" % (i % 3 + 1) for i in range(8)]
+	latencies, timeouts = [], 0
+	for _ in range(args.samples):
+		if args.busy:
+			window.controller.worker.discard_queued()
+			window.controller.worker.submit(settings)
+			time.sleep(0.002)  # let the worker fill the window
+		board.stop_arrived.clear()
+		t0 = time.perf_counter()
+		window.ui.stop_BTN.click()
+		if board.stop_arrived.wait(1.0):
+			latencies.append((board.stop_arrived_at - t0) * 1e6)
+		else:
+			timeouts += 1
+		app.processEvents()
+	window.disconnect()
+	return latencies, timeouts
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+	parser.add_argument('--samples', type=int, default=200)
+	parser.add_argument('--busy', action='store_true', help='keep the link full of SETTING traffic')
+	parser.add_argument('--reply-delay', type=float, default=5.0, help='ms before the board echoes a command')
+	args = parser.parse_args()
+
+	# gui.py logs every reply, and the ones still pending at the disconnect,
+	# keep that out of the report
+	log.setup('CRITICAL')
+	try:
+		latencies, timeouts = measure(args)
+	finally:
+		log.shutdown()
+
+	print("STOP button -> first byte on the wire, %s link" % ('busy' if args.busy else 'idle'))
+	if timeouts:
+		print("%d of %d STOPs did not arrive within 1 s, left out" % (timeouts, args.samples))
+	if latencies:
+		histogram(latencies)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Transport benchmark: how fast the host stack talks to a pump controller.
+
+Drives poseidon.transport.Transport (what sendToArduino/runTest/listening
+are built on now) against poseidon.simulator.FirmwareSimulator on a pty and
+reports
+
+- round trip: one SETTING command at a time, send to parsed echo (p50/p99)
+- commands/s: SETTING commands pipelined through the send window
+- DISP frames/s decoded while three pumps run, and reader thread CPU per frame
+
+--binary negotiates the binary command encoding first (poseidon.binary).
+Results are written as JSON. Pass a previous result with --baseline to see
+the change for every number.
+
+	python benchmarks/bench_transport.py [--output transport.json] [--baseline old.json]
+'''
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import serial
+
+from poseidon import simulator, transport
+
+
+def percentile(samples, p):
+	samples = sorted(samples)
+	return samples[min(len(samples) - 1, int(len(samples) * p / 100.0))]
+
+
+class Bench(object):
+
+	def __init__(self, baudrate, use_binary=False):
+		self.simulator = simulator.FirmwareSimulator(baudrate, boot_time=0.0)
+		self.serial = serial.Serial(self.simulator.start(), baudrate, timeout=1)
+		self.transport = transport.Transport(self.serial)
+		self.disp_frames = 0
+		self.disp_cpu = [None, None]
+		self.reader = threading.Thread(target=self.transport.read_forever, args=(self.on_frame,))
+		self.reader.daemon = True
+		self.reader.start()
+		self.binary = use_binary and self.transport.negotiate().result(5)
+
+	# runs on the reader thread, so thread_time() is the reader's own CPU time
+	def on_frame(self, frame):
+		if frame.startswith('DISP'):
+			now = time.thread_time()
+			if self.disp_cpu[0] is None:
+				self.disp_cpu[0] = now
+			self.disp_cpu[1] = now
+			self.disp_frames += 1
+
+	def round_trip(self, n):
+		latencies = []
+		for i in range(n):
+			command = "<SETTING,SPEED,%d,1280.0,F,0.0,0.0,0.0>" % (i % 3 + 1)
+			t0 = time.perf_counter()
+			self.transport.send(command).result(5)
+			latencies.append((time.perf_counter() - t0) * 1e3)
+		return {
+			'samples': n,
+			'p50_ms': percentile(latencies, 50),
+			'p99_ms': percentile(latencies, 99),
+			'max_ms': max(latencies),
+		}
+
+	def throughput(self, n):
+		commands = ["<SETTING,ACCEL,%d,6400.0,F,0.0,0.0,0.0>" % (i % 3 + 1) for i in range(n)]
+		t0 = time.perf_counter()
+		self.transport.send_all(commands, timeout=30)
+		elapsed = time.perf_counter() - t0
+		return {'commands': n, 'seconds': elapsed, 'commands_per_s': n / elapsed}
+
+	def disp_stream(self, steps):
+		self.transport.send_all(["<SETTING,SPEED,%d,20000.0,F,0.0,0.0,0.0>" % i for i in (1, 2, 3)]
+			+ ["<SETTING,ACCEL,%d,0.0,F,0.0,0.0,0.0>" % i for i in (1, 2, 3)], timeout=5)
+		self.disp_frames = 0
+		self.disp_cpu = [None, None]
+		t0 = time.perf_counter()
+		self.transport.send("<RUN,DIST,123,0.0,F,%d,%d,%d>" % (steps, steps, steps)).result(120)
+		elapsed = time.perf_counter() - t0
+		cpu = (self.disp_cpu[1] or 0.0) - (self.disp_cpu[0] or 0.0)
+		return {
+			'frames': self.disp_frames,
+			'seconds': elapsed,
+			'frames_per_s': self.disp_frames / elapsed,
+			'cpu_us_per_frame': cpu / max(1, self.disp_frames) * 1e6,
+		}
+
+	def close(self):
+		self.transport.close()
+		self.reader.join()
+		self.serial.close()
+		self.simulator.stop()
+
+
+def git_revision():
+	try:
+		return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+			cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def flatten(results, prefix=''):
+	out = {}
+	for key, value in results.items():
+		if isinstance(value, dict):
+			out.update(flatten(value, prefix + key + '.'))
+		elif isinstance(value, (int, float)):
+			out[prefix + key] = value
+	return out
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+	parser.add_argument('--baudrate', type=int, default=simulator.BAUD_RATE)
+	parser.add_argument('--round-trips', type=int, default=200)
+	parser.add_argument('--commands', type=int, default=500)
+	parser.add_argument('--steps', type=int, default=20000, help='steps per pump for the DISP run')
+	parser.add_argument('--binary', action='store_true', help='use the binary command encoding')
+	parser.add_argument('--output', default='transport.json')
+	parser.add_argument('--baseline', help='earlier JSON result to compare against')
+	args = parser.parse_args()
+
+	bench = Bench(args.baudrate, args.binary)
+	try:
+		results = {
+			'round_trip': bench.round_trip(args.round_trips),
+			'throughput': bench.throughput(args.commands),
+			'disp': bench.disp_stream(args.steps),
+		}
+	finally:
+		bench.close()
+	results['meta'] = {
+		'date': datetime.datetime.now().isoformat(),
+		'git': git_revision(),
+		'python': platform.python_version(),
+		'machine': platform.machine(),
+		'baudrate': args.baudrate,
+		'binary': bench.binary,
+	}
+
+	with open(args.output, 'w') as f:
+		json.dump(results, f, indent=2)
+
+	baseline = {}
+	if args.baseline:
+		with open(args.baseline) as f:
+			baseline = flatten(json.load(f))
+	for key, value in sorted(flatten(results).items()):
+		if key.startswith('meta.'):
+			continue
+		line = "%-30s %12.3f" % (key, value)
+		if key in baseline and baseline[key]:
+			line += "   %+7.1f%% vs baseline" % ((value - baseline[key]) / baseline[key] * 100)
+		print(line)
+	print("Results written to " + args.output)
+
+
+if __name__ == "__main__":
+	main()
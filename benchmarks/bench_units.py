@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Unit conversion: the per-call MainWindow.convert_* methods against the
+poseidon.units factor table, scalar by scalar and on a whole program of
+setpoints at once.
+
+The legacy methods are copied below as they were in gui.py (prints and all,
+stdout goes to /dev/null while they run). Both sides convert the same
+values for every syringe and unit and the results are checked against each
+other.
+
+	python benchmarks/bench_units.py [--setpoints 10000] [--repeat 5]
+'''
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy
+
+from poseidon import units
+
+
+class LegacyConversions(object):
+	'''MainWindow's conversion methods before poseidon/units.py'''
+
+	def mm2steps(self, mm):
+		steps = mm/0.8*200*32
+		return steps
+
+	def mL2steps(self, mL, syringe_area):
+		steps = self.mm2steps(self.mL2mm3(mL)/syringe_area)
+		return steps
+
+	def uL2steps(self, uL, syringe_area):
+		steps = self.mm2steps(self.uL2mm3(uL)/syringe_area)
+		return steps
+
+	def mL2mm3(self, mL):
+		return mL*1000.0
+
+	def uL2mm3(self, uL):
+		return uL
+
+	def permin2persec(self, value_per_min):
+		value_per_sec = value_per_min/60.0
+		return value_per_sec
+
+	def perhour2persec(self, value_per_hour):
+		value_per_sec = value_per_hour/60.0/60.0
+		return value_per_sec
+
+	def convert_displacement(self, displacement, units, syringe_area):
+		length = units.split("/")[0]
+		time = units.split("/")[1]
+		inp_displacement = displacement
+		if length == "mm":
+			displacement = self.mm2steps(displacement)
+		elif length == "mL":
+			displacement = self.mL2steps(displacement, syringe_area)
+		elif length == "µL":
+			displacement = self.uL2steps(displacement, syringe_area)
+		print('______________________________')
+		print("INPUT  DISPLACEMENT: " + str(inp_displacement) + ' ' + length)
+		print("OUTPUT DISPLACEMENT: " + str(displacement) + ' steps')
+		print('\n############################################################\n')
+		return displacement
+
+	def convert_speed(self, inp_speed, units, syringe_area):
+		length = units.split("/")[0]
+		time = units.split("/")[1]
+		if length == "mm":
+			speed = self.mm2steps(inp_speed)
+		elif length == "mL":
+			speed = self.mL2steps(inp_speed, syringe_area)
+		elif length == "µL":
+			speed = self.uL2steps(inp_speed, syringe_area)
+		if time == "s":
+			pass
+		elif time == "min":
+			speed = self.permin2persec(speed)
+		elif time == "hr":
+			speed = self.perhour2persec(speed)
+		print("INPUT  SPEED: " + str(inp_speed) + ' ' + units)
+		print("OUTPUT SPEED: " + str(speed) + ' steps/s')
+		return speed
+
+	def convert_accel(self, accel, units, syringe_area):
+		length = units.split("/")[0]
+		time = units.split("/")[1]
+		inp_accel = accel
+		if length == "mm":
+			accel = self.mm2steps(accel)
+		elif length == "mL":
+			accel = self.mL2steps(accel, syringe_area)
+		elif length == "µL":
+			accel = self.uL2steps(accel, syringe_area)
+		if time == "s":
+			pass
+		elif time == "min":
+			accel = self.permin2persec(self.permin2persec(accel))
+		elif time == "hr":
+			accel = self.perhour2persec(self.perhour2persec(accel))
+		print('______________________________')
+		print("INPUT  ACCEL: " + str(inp_accel) + ' ' + units + '/' + time)
+		print("OUTPUT ACCEL: " + str(accel) + ' steps/s/s')
+		return accel
+
+
+KINDS = [('displacement', 'convert_displacement', units.displacement),
+	('speed', 'convert_speed', units.speed),
+	('accel', 'convert_accel', units.accel)]
+
+
+def best_of(repeat, function):
+	best = None
+	for _ in range(repeat):
+		t0 = time.perf_counter()
+		result = function()
+		elapsed = time.perf_counter() - t0
+		best = elapsed if best is None else min(best, elapsed)
+	return best, result
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+	parser.add_argument('--setpoints', type=int, default=10000, help='values in the program')
+	parser.add_argument('--repeat', type=int, default=5, help='best of this many runs')
+	args = parser.parse_args()
+
+	legacy = LegacyConversions()
+	program = numpy.linspace(0.0, 5.0, args.setpoints)
+	values = program.tolist()
+	pairs = [(name, area, unit) for name, volume, area in units.SYRINGES for unit in units.UNITS]
+
+	print("%d setpoints x %d (syringe, unit) pairs, best of %d" % (args.setpoints, len(pairs), args.repeat))
+	print("%-13s %14s %14s %14s %9s" % ('', 'legacy', 'scalar', 'array', 'speedup'))
+	for kind, method, convert in KINDS:
+		def run_legacy():
+			with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+				return [[getattr(legacy, method)(v, unit, area) for v in values] for name, area, unit in pairs]
+
+		def run_scalar():
+			return [[convert(v, name, unit) for v in values] for name, area, unit in pairs]
+
+		def run_array():
+			return [convert(program, name, unit) for name, area, unit in pairs]
+
+		t_legacy, expected = best_of(args.repeat, run_legacy)
+		t_scalar, scalar = best_of(args.repeat, run_scalar)
+		t_array, array = best_of(args.repeat, run_array)
+		for want, got_scalar, got_array in zip(expected, scalar, array):
+			assert numpy.allclose(want, got_scalar, rtol=1e-12) and numpy.allclose(want, got_array, rtol=1e-12)
+		print("%-13s %11.1f ms %11.1f ms %11.3f ms %8.0fx" % (kind, t_legacy * 1e3, t_scalar * 1e3,
+			t_array * 1e3, t_legacy / t_array))
+
+
+if __name__ == "__main__":
+	main()
@@ -92,32 +92,30 @@ def recvFromArduino():
   
   return(ck)
 
-def recvFromArduino2():
-  global startMarker, endMarker
-  
-  ck = ""
-  x = "z" # any value that is not an end- or startMarker
-  byteCount = -1 # to allow for the fact that the last increment will be one too many
-  
-  # wait for the start character
-  while  ord(x) != startMarker: 
-    x = ser.read()
-  
-  # save data until the end marker is found
-  while ord(x) != endMarker:
-    if ord(x) == midMarker:
-      print(ck)
-      ck = ""
-      x = ser.read()
+rxBuffer = bytearray()
 
-    if ord(x) != startMarker:
-      #print(x)
-      ck = ck + x.decode()
-      byteCount += 1
-
-    x = ser.read()
-
-  return(ck)
+def recvFromArduino2():
+  global startMarker, endMarker, midMarker, rxBuffer
+
+  # read everything the port holds in one call and look for a whole frame in
+  # the buffer, rather than one ser.read() and one string copy per byte
+  while True:
+    start = rxBuffer.find(startMarker)
+    if start >= 0:
+      end = rxBuffer.find(endMarker, start + 1)
+      if end >= 0:
+        break
+    else:
+      del rxBuffer[:]
+    rxBuffer += ser.read(ser.inWaiting() or 1)
+
+  fields = bytes(rxBuffer[start + 1:end]).split(bytes([midMarker]))
+  del rxBuffer[:end + 1]
+
+  for ck in fields[:-1]:
+    print(ck.decode())
+
+  return(fields[-1].decode())
 
 
 #============================
@@ -1,86 +1,187 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import serial
-import time
-import glob
 import sys
 from datetime import datetime
-import time
 import os
 # This gets the Qt stuff
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import QMainWindow, QApplication, QFileDialog
 
-import cv2 
-# note, had to use version 3.2.0.8 otherwise it had its own 
-# pyqt packages that conflicted with mine
+# OpenCV is only imported once the camera is used, see poseidon/camera.py
+import numpy
 
-import numpy as np
 from decimal import Decimal
 # This is our window from QtCreator
 import poseidon_controller_gui
+from poseidon import camera, controller, images, log, ports, protocol, runlog, settings, timelapse, transport, units
 import pdb
 import traceback, sys
 
-# ##############################
-# MULTITHREADING : SIGNALS CLASS
-# ##############################
-class WorkerSignals(QtCore.QObject):
-    '''
-    Defines the signals available from a running worker thread.
-
-    Supported signals are:
-
-    finished
-        No data
-
-    error
-        `tuple` (exctype, value, traceback.format_exc() )
+# ##################################
+# MULTITHREADING : PORT WATCHER SIGNALS
+# ##################################
+class PortSignals(QtCore.QObject):
+	'''
+	Carries poseidon.ports.PortWatcher results from its thread to the GUI:
+	ports_changed(added, removed), emitted off the GUI thread and delivered
+	queued to MainWindow.update_ports.
+	'''
+	ports_changed = QtCore.pyqtSignal(list, list)
 
-    result
-        `object` data returned from processing, anything
 
-    '''
-    finished = QtCore.pyqtSignal()
-    error = QtCore.pyqtSignal(tuple)
-    result = QtCore.pyqtSignal(object)
-    progress = QtCore.pyqtSignal(int)
+# ##################################
+# MULTITHREADING : CAMERA SIGNALS
+# ##################################
+class CameraSignals(QtCore.QObject):
+	'''
+	frame_ready, emitted by the poseidon.camera.CaptureThread when a new frame
+	is in its slot and delivered queued to MainWindow.frame_ready. It is not
+	emitted again until the GUI has taken that frame, so a slow GUI never
+	has a backlog of them.
 
-# #############################
-# MULTITHREADING : WORKER CLASS
-# #############################
+	image_saved(path, error) comes from the image writer's threads once a
+	capture is on disk (error is empty) or could not be written.
+	'''
+	frame_ready = QtCore.pyqtSignal()
+	image_saved = QtCore.pyqtSignal(str, str)
 
 
-class Thread(QtCore.QThread):
-	def __init__(self, fn, *args, **kwargs):
-		parent = None
-		super(Thread, self).__init__(parent)
-		self.runs = True
-		self.fn = fn
-		self.args = args
-		self.kwargs = kwargs
-		self.signals = WorkerSignals()
+# ##########################
+# CAMERA : FRAME DISPLAY CLASS
+# ##########################
+class FrameDisplay(object):
+	'''
+	Turns camera frames (BGR, BGRA or grey numpy arrays) into pixmaps for a
+	label without copying them at full size:
+
+	- frames bigger than the label are scaled to fit first (cv2.resize into
+	  a kept buffer), everything after works on label sized pixels
+	- one cvtColor pass writes them straight into the 32 bit layout Qt draws
+	  from (B, G, R, x bytes is QImage.Format_RGB32 on little endian
+	  machines), the mirror is a cv2.flip in place
+	- QPixmap.fromImage shares an RGB32 image's buffer instead of converting
+	  it (raster pixmaps, which is what Qt 5 uses on the desktop)
+
+	Buffers are only allocated when the frame or label size changes. The
+	pixmap returned shares them and shows the next frame once pixmap() is
+	called again, so set it on the label and let go of it.
+	'''
 
-	def run(self):
-		try:
-			result = self.fn(*self.args, **self.kwargs)
-		except:
-			traceback.print_exc()
-			exctype, value = sys.exc_info()[:2]
-			self.signals.error.emit((exctype, value, traceback.format_exc()))
+	if sys.byteorder == 'little':
+		QFORMAT = QtGui.QImage.Format_RGB32
+		# frame channels -> cv2 conversion into the pixel buffer (None: already in order)
+		CONVERSIONS = {1: 'COLOR_GRAY2BGRA', 3: 'COLOR_BGR2BGRA', 4: None}
+	else:
+		QFORMAT = QtGui.QImage.Format_RGBX8888
+		CONVERSIONS = {1: 'COLOR_GRAY2RGBA', 3: 'COLOR_BGR2RGBA', 4: 'COLOR_BGRA2RGBA'}
+
+	def __init__(self, label, mirror=True):
+		self.label = label
+		self.mirror = mirror
+		self.geometry = None
+		self.scaled = None
+		self.pixels = None
+		self.retired = None
+
+	def prepare(self, image):
+		h, w = image.shape[:2]
+		size = self.label.size()
+		# shrink to fit, never blow it up (the label centres smaller images)
+		scale = min(1.0, size.width() / float(w), size.height() / float(h))
+		if scale <= 0:
+			# label not laid out yet
+			scale = 1.0
+		out_w, out_h = max(1, int(w * scale)), max(1, int(h * scale))
+		self.scaled = None
+		if (out_w, out_h) != (w, h):
+			self.scaled = numpy.empty((out_h, out_w) + image.shape[2:], dtype=numpy.uint8)
+		# the last pixmap handed out may still be drawing from the old pixels
+		self.retired = self.pixels
+		self.pixels = numpy.empty((out_h, out_w, 4), dtype=numpy.uint8)
+		self.geometry = (image.shape, size.width(), size.height())
+
+	def pixmap(self, image):
+		cv2 = camera.cv2()
+		size = self.label.size()
+		if self.geometry != (image.shape, size.width(), size.height()):
+			self.prepare(image)
+		pixels = self.pixels
+		h, w = pixels.shape[:2]
+		if self.scaled is not None:
+			cv2.resize(image, (w, h), dst=self.scaled, interpolation=cv2.INTER_LINEAR)
+			image = self.scaled
+		conversion = self.CONVERSIONS[image.shape[2] if image.ndim == 3 else 1]
+		if conversion is not None:
+			cv2.cvtColor(image, getattr(cv2, conversion), dst=pixels)
+		elif self.mirror:
+			cv2.flip(image, 1, dst=pixels)
 		else:
-			self.signals.result.emit(result)  # Return the result of the processing
-		finally:
-			self.signals.finished.emit()  # Done
+			numpy.copyto(pixels, image)
+		if self.mirror and conversion is not None:
+			cv2.flip(pixels, 1, dst=pixels)
+		return QtGui.QPixmap.fromImage(QtGui.QImage(pixels.data, w, h, pixels.strides[0], self.QFORMAT))
 
-			print("Job completed")
 
-	def stop(self):
-		self.runs = False
+# ####################################
+# MULTITHREADING : BOARD CONNECTOR CLASS
+# ####################################
+class BoardConnector(QtCore.QObject):
+	'''
+	Waits for a freshly opened board to finish resetting without blocking
+	the event loop. connected fires as soon as the reader thread has parsed
+	the <Arduino is ready> banner (transport.ready), and progress(percent)
+	ticks in between. Boards that do not reset when the port is opened never
+	print the banner, so after timeout seconds without it connected fires
+	anyway with banner_missing set, like the fixed sleep before did. failed
+	is for a port that closed before then.
+	'''
+	progress = QtCore.pyqtSignal(int)
+	connected = QtCore.pyqtSignal()
+	failed = QtCore.pyqtSignal(str)
+	ready = QtCore.pyqtSignal()
+
+	def __init__(self, transport, timeout=5.0, interval=100):
+		super(BoardConnector, self).__init__(None)
+		self.transport = transport
+		self.timeout = timeout
+		self.banner_missing = False
+		self.elapsed = QtCore.QElapsedTimer()
+		self.timer = QtCore.QTimer(self)
+		self.timer.setInterval(interval)
+		self.timer.timeout.connect(self.tick)
+		# emitted from the reader thread, delivered queued on the GUI thread
+		self.ready.connect(self.finish)
 
+	def start(self):
+		self.elapsed.start()
+		self.timer.start()
+		self.transport.ready.add_done_callback(lambda future: self.ready.emit())
+
+	def tick(self):
+		elapsed = self.elapsed.elapsed() / 1000.0
+		if elapsed >= self.timeout:
+			self.timer.stop()
+			self.banner_missing = True
+			self.progress.emit(100)
+			self.connected.emit()
+			return
+		self.progress.emit(int(100 * elapsed / self.timeout))
+
+	def finish(self):
+		if not self.timer.isActive():
+			# timed out or cancelled already
+			return
+		self.timer.stop()
+		if self.transport.ready.exception() is not None:
+			self.failed.emit("Connection closed before the board was ready")
+			return
+		self.progress.emit(100)
+		self.connected.emit()
 
+	def cancel(self):
+		self.timer.stop()
 
 
 # #####################################
@@ -89,6 +190,36 @@ class Thread(QtCore.QThread):
 class CannotConnectException(Exception):
 	pass
 
+gui_log = log.get(log.GUI)
+commands_log = log.get(log.COMMANDS)
+
+# Captured images, see poseidon/images.py for the formats and their levels
+# (None is OpenCV's default)
+IMAGE_DIRECTORY = "./images"
+IMAGE_FORMAT = 'png'
+IMAGE_LEVEL = None
+# A timelapse goes into a directory of its own under IMAGE_DIRECTORY, with
+# positions.csv next to the images. On pump events it also captures every
+# 1/TIMELAPSE_MILESTONES of a move, when the board reports distances
+TIMELAPSE_MILESTONES = 10
+TIMELAPSE_STOP_TIMEOUT = 0.5
+
+# Every connection records what went to the board and back in a run log
+# here, see poseidon/runlog.py. None records nothing
+RUN_LOG_DIRECTORY = "./runs"
+
+# Per pump input widgets: pumps.PumpBank input -> (widget after pN_, its
+# changed signal, how to read it, whether changing it means the settings
+# have to be sent to the controller again)
+PUMP_INPUT_WIDGETS = {
+	'syringe': ('syringe_DROPDOWN', 'currentIndexChanged', lambda w: w.currentText(), True),
+	'units': ('units_DROPDOWN', 'currentIndexChanged', lambda w: w.currentText(), True),
+	'speed': ('speed_INPUT', 'valueChanged', lambda w: w.value(), True),
+	'accel': ('accel_INPUT', 'valueChanged', lambda w: w.value(), True),
+	'jog_delta': ('setup_jog_delta_INPUT', 'currentIndexChanged', lambda w: float(w.currentText()), True),
+	'amount': ('amount_INPUT', 'valueChanged', lambda w: w.value(), False),
+}
+
 # #######################
 # GUI : MAIN WINDOW CLASS
 # #######################
@@ -104,7 +235,14 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 		self.ui = poseidon_controller_gui.Ui_MainWindow()
 		self.ui.setupUi(self)
 
-		# Put comments here
+		# One set of pN_ widgets per pump. The controller (poseidon/controller.py)
+		# holds their settings and does all the talking to the board
+		self.pump_count = self.count_pump_widgets()
+		# the frames the board sends on its own are logged by the controller,
+		# on its reader thread (see poseidon/log.py)
+		self.controller = controller.Controller(self.pump_count)
+		self.run_log = None
+		self.connector = None
 
 		self.populate_syringe_sizes()
 		self.populate_pump_jog_delta()
@@ -117,16 +255,6 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 		self.connect_all_gui_components()
 		self.grey_out_components()
 
-		# Declaring start, mid, and end marker for sending code to Arduino
-		self.startMarker = 60# <
-		self.endMarker = 62  # ,F,0.0>
-		self.midMarker = 44 # ,
-
-		# Initializing multithreading to allow parallel operations
-		self.threadpool = QtCore.QThreadPool()
-		print("Multithreading with maximum %d threads" % self.threadpool.maxThreadCount())
-
-
 		# Camera setup
 		self.timer = QtCore.QTimer()
 		self.timer.setInterval(1000)
@@ -136,6 +264,13 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 
 		# Random other things I need
 		self.image = None
+		self.capture_thread = None
+		self.frame_display = None
+		self.image_writer = None
+		self.timelapse = None
+		self.camera_signals = CameraSignals()
+		self.camera_signals.frame_ready.connect(self.frame_ready)
+		self.camera_signals.image_saved.connect(self.image_saved)
 
 
 	def recurring_timer(self):
@@ -146,29 +281,17 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 	# =============================
 	def setting_variables(self):
 
-		self.set_p1_syringe()
-		self.set_p2_syringe()
-		self.set_p3_syringe()
-
-
-
-		#self.set_p1_units()
-		#self.set_p2_units()
-		#self.set_p3_units()
-
-		self.is_p1_active = False
-		self.is_p2_active = False
-		self.is_p3_active = False
+		# Everything the user sets per pump, and the step values that come out of it
+		self.pumps = self.controller.pumps
+		self.dirty_pumps = set()
+		self.pump_refresh_pending = False
+		for n in self.pump_numbers():
+			self.read_pump_inputs(n)
+		self.dirty_pumps.update(self.pump_numbers())
+		self.refresh_pumps()
 
 		self.experiment_notes = ""
 
-	def thread_finished(self, th):
-		print("Your thread has completed. Now terminating..")
-		th.stop()
-		print("Thread has been terminated.")
-		print("=============================\n\n")
-		# here is where you need to end the thread
-
 
 	# ===================================
 	# CONNECTING : all the GUI Components
@@ -185,32 +308,11 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 		# TAB : Controller
 		# ~~~~~~~~~~~~~~~~
 
-		# Px active checkboxes
-		self.ui.p1_activate_CHECKBOX.stateChanged.connect(self.toggle_p1_activation)
-		self.ui.p2_activate_CHECKBOX.stateChanged.connect(self.toggle_p2_activation)
-		self.ui.p3_activate_CHECKBOX.stateChanged.connect(self.toggle_p3_activation)
-
-		# Px display (TODO)
-
-		# Px syringe display
-		self.ui.p1_syringe_DROPDOWN.currentIndexChanged.connect(self.display_p1_syringe)
-		self.ui.p2_syringe_DROPDOWN.currentIndexChanged.connect(self.display_p2_syringe)
-		self.ui.p3_syringe_DROPDOWN.currentIndexChanged.connect(self.display_p3_syringe)
-
-
-		# Px speed display
-		self.ui.p1_units_DROPDOWN.currentIndexChanged.connect(self.display_p1_speed)
-		self.ui.p2_units_DROPDOWN.currentIndexChanged.connect(self.display_p2_speed)
-		self.ui.p3_units_DROPDOWN.currentIndexChanged.connect(self.display_p3_speed)
-
-
+		# Px active checkboxes, inputs, send settings buttons
+		for n in self.pump_numbers():
+			self.connect_pump_widgets(n)
 
-		#self.populate_pump_units()
-
-		# Px amount
-		self.ui.p1_amount_INPUT.valueChanged.connect(self.set_p1_amount)
-		self.ui.p2_amount_INPUT.valueChanged.connect(self.set_p2_amount)
-		self.ui.p3_amount_INPUT.valueChanged.connect(self.set_p3_amount)
+		# Px syringe and speed display: refresh_pumps(), once per event loop pass
 
 		# Px jog delta
 		#self.ui.p1_jog_delta_INPUT.valueChanged.connect(self.set_p1_jog_delta)
@@ -243,6 +345,7 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 		self.ui.camera_connect_BTN.clicked.connect(self.start_camera)
 		self.ui.camera_disconnect_BTN.clicked.connect(self.stop_camera)
 		self.ui.camera_capture_image_BTN.clicked.connect(self.save_image)
+		self.ui.camera_timelapse_BTN.toggled.connect(self.toggle_timelapse)
 
 		# ~~~~~~~~~~~
 		# TAB : Setup
@@ -258,60 +361,7 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 		self.date_string =  datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 		self.date_string = self.date_string.replace(":","_") # Replace semicolons with underscores
 
-		# Px syringe size, populate then connect (population done earlier)
-		self.ui.p1_syringe_DROPDOWN.currentIndexChanged.connect(self.set_p1_syringe)
-		self.ui.p2_syringe_DROPDOWN.currentIndexChanged.connect(self.set_p2_syringe)
-		self.ui.p3_syringe_DROPDOWN.currentIndexChanged.connect(self.set_p3_syringe)
-		# warning to send the info to the controller
-		self.ui.p1_syringe_DROPDOWN.currentIndexChanged.connect(self.send_p1_warning)
-		self.ui.p2_syringe_DROPDOWN.currentIndexChanged.connect(self.send_p2_warning)
-		self.ui.p3_syringe_DROPDOWN.currentIndexChanged.connect(self.send_p3_warning)
-
-		# Px units
-		self.ui.p1_units_DROPDOWN.currentIndexChanged.connect(self.set_p1_units)
-		self.ui.p2_units_DROPDOWN.currentIndexChanged.connect(self.set_p2_units)
-		self.ui.p3_units_DROPDOWN.currentIndexChanged.connect(self.set_p3_units)
-		# warning to send the info to the controller
-		self.ui.p1_units_DROPDOWN.currentIndexChanged.connect(self.send_p1_warning)
-		self.ui.p2_units_DROPDOWN.currentIndexChanged.connect(self.send_p2_warning)
-		self.ui.p3_units_DROPDOWN.currentIndexChanged.connect(self.send_p3_warning)
-
-		# Px speed
-		self.ui.p1_speed_INPUT.valueChanged.connect(self.set_p1_speed)
-		self.ui.p2_speed_INPUT.valueChanged.connect(self.set_p2_speed)
-		self.ui.p3_speed_INPUT.valueChanged.connect(self.set_p3_speed)
-		# warning to send the info to the controller
-		self.ui.p1_speed_INPUT.valueChanged.connect(self.send_p1_warning)
-		self.ui.p2_speed_INPUT.valueChanged.connect(self.send_p2_warning)
-		self.ui.p3_speed_INPUT.valueChanged.connect(self.send_p3_warning)
-
-		# Px accel
-		self.ui.p1_accel_INPUT.valueChanged.connect(self.set_p1_accel)
-		self.ui.p2_accel_INPUT.valueChanged.connect(self.set_p2_accel)
-		self.ui.p3_accel_INPUT.valueChanged.connect(self.set_p3_accel)
-		# warning to send the info to the controller
-		self.ui.p1_accel_INPUT.valueChanged.connect(self.send_p1_warning)
-		self.ui.p2_accel_INPUT.valueChanged.connect(self.send_p2_warning)
-		self.ui.p3_accel_INPUT.valueChanged.connect(self.send_p3_warning)
-
-		# Px jog delta (setup)
-		self.ui.p1_setup_jog_delta_INPUT.currentIndexChanged.connect(self.set_p1_setup_jog_delta)
-		self.ui.p2_setup_jog_delta_INPUT.currentIndexChanged.connect(self.set_p2_setup_jog_delta)
-		self.ui.p3_setup_jog_delta_INPUT.currentIndexChanged.connect(self.set_p3_setup_jog_delta)
-		# warning to send the info to the contorller
-		self.ui.p1_setup_jog_delta_INPUT.currentIndexChanged.connect(self.send_p1_warning)
-		self.ui.p2_setup_jog_delta_INPUT.currentIndexChanged.connect(self.send_p2_warning)
-		self.ui.p3_setup_jog_delta_INPUT.currentIndexChanged.connect(self.send_p3_warning)
-
-
-		# Px send settings
-		self.ui.p1_setup_send_BTN.clicked.connect(self.send_p1_settings)
-		self.ui.p2_setup_send_BTN.clicked.connect(self.send_p2_settings)
-		self.ui.p3_setup_send_BTN.clicked.connect(self.send_p3_settings)
-		# remove warning to send settings
-		self.ui.p1_setup_send_BTN.clicked.connect(self.send_p1_success)
-		self.ui.p2_setup_send_BTN.clicked.connect(self.send_p2_success)
-		self.ui.p3_setup_send_BTN.clicked.connect(self.send_p3_success)
+		# Px syringe, units, speed, accel and jog delta (setup), see connect_pump_widgets()
 
 		# Connect to arduino
 		self.ui.connect_BTN.clicked.connect(self.connect)
@@ -320,23 +370,24 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 		# Send all the settings at once
 		self.ui.send_all_BTN.clicked.connect(self.send_all)
 
-	def send_p1_warning(self):
-		self.ui.p1_setup_send_BTN.setStyleSheet("background-color: green; color: black")
-
-	def send_p2_warning(self):
-		self.ui.p2_setup_send_BTN.setStyleSheet("background-color: green; color: black")
-
-	def send_p3_warning(self):
-		self.ui.p3_setup_send_BTN.setStyleSheet("background-color: green; color: black")
-
-	def send_p1_success(self):
-		self.ui.p1_setup_send_BTN.setStyleSheet("background-color: none")
-
-	def send_p2_success(self):
-		self.ui.p2_setup_send_BTN.setStyleSheet("background-color: none")
-
-	def send_p3_success(self):
-		self.ui.p3_setup_send_BTN.setStyleSheet("background-color: none")
+	# Hook up pump n's widgets. Every input goes to set_pump_input(), all but
+	# the amount also turn its send button green until the settings are sent
+	def connect_pump_widgets(self, n):
+		self.pump_widget(n, 'activate_CHECKBOX').stateChanged.connect(lambda state, n=n: self.toggle_pump_activation(n))
+		for field, (widget, signal, read, needs_sending) in PUMP_INPUT_WIDGETS.items():
+			changed = getattr(self.pump_widget(n, widget), signal)
+			changed.connect(lambda *args, n=n, field=field: self.set_pump_input(n, field))
+			if needs_sending:
+				changed.connect(lambda *args, n=n: self.send_pump_warning(n))
+		send = self.pump_widget(n, 'setup_send_BTN')
+		send.clicked.connect(lambda checked=False, n=n: self.send_pump_settings(n))
+		send.clicked.connect(lambda checked=False, n=n: self.send_pump_success(n))
+
+	def send_pump_warning(self, n):
+		self.pump_widget(n, 'setup_send_BTN').setStyleSheet("background-color: green; color: black")
+
+	def send_pump_success(self, n):
+		self.pump_widget(n, 'setup_send_BTN').setStyleSheet("background-color: none")
 
 	def grey_out_components(self):
 		# ~~~~~~~~~~~~~~~~
@@ -352,9 +403,8 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 		# ~~~~~~~~~~~~~~~~
 		# TAB : Setup
 		# ~~~~~~~~~~~~~~~~
-		self.ui.p1_setup_send_BTN.setEnabled(False)
-		self.ui.p2_setup_send_BTN.setEnabled(False)
-		self.ui.p3_setup_send_BTN.setEnabled(False)
+		for n in self.pump_numbers():
+			self.pump_widget(n, 'setup_send_BTN').setEnabled(False)
 		self.ui.send_all_BTN.setEnabled(False)
 
 	def ungrey_out_components(self):
@@ -375,59 +425,19 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 		# ~~~~~~~~~~~~~~~~
 		# TAB : Setup
 		# ~~~~~~~~~~~~~~~~
-		self.ui.p1_setup_send_BTN.setEnabled(True)
-		self.ui.p2_setup_send_BTN.setEnabled(True)
-		self.ui.p3_setup_send_BTN.setEnabled(True)
+		for n in self.pump_numbers():
+			self.pump_widget(n, 'setup_send_BTN').setEnabled(True)
 		self.ui.send_all_BTN.setEnabled(True)
 	# ======================
 	# FUNCTIONS : Controller
 	# ======================
 
-	def toggle_p1_activation(self):
-		if self.ui.p1_activate_CHECKBOX.isChecked():
-			self.is_p1_active = True
-		else:
-			self.is_p1_active = False
-
-	def toggle_p2_activation(self):
-		if self.ui.p2_activate_CHECKBOX.isChecked():
-			self.is_p2_active = True
-		else:
-			self.is_p2_active = False
+	def toggle_pump_activation(self, n):
+		self.pumps[n - 1].active = self.pump_widget(n, 'activate_CHECKBOX').isChecked()
 
-	def toggle_p3_activation(self):
-		if self.ui.p3_activate_CHECKBOX.isChecked():
-			self.is_p3_active = True
-		else:
-			self.is_p3_active = False
-
-	# Get a list of active pumps (IDK if this is the best way to do this)
+	# Motor ids of the active pumps
 	def get_active_pumps(self):
-		pumps_list = [self.is_p1_active, self.is_p2_active, self.is_p3_active]
-		active_pumps = [i+1 for i in range(len(pumps_list)) if pumps_list[i]]
-		return active_pumps
-
-	def display_p1_syringe(self):
-		self.ui.p1_syringe_LABEL.setText(self.ui.p1_syringe_DROPDOWN.currentText())
-	def display_p2_syringe(self):
-		self.ui.p2_syringe_LABEL.setText(self.ui.p2_syringe_DROPDOWN.currentText())
-	def display_p3_syringe(self):
-		self.ui.p3_syringe_LABEL.setText(self.ui.p3_syringe_DROPDOWN.currentText())
-
-	def display_p1_speed(self):
-		self.ui.p1_units_LABEL.setText(str(self.p1_speed) + " " + self.ui.p1_units_DROPDOWN.currentText())
-	def display_p2_speed(self):
-		self.ui.p2_units_LABEL.setText(str(self.p2_speed) + " " + self.ui.p2_units_DROPDOWN.currentText())
-	def display_p3_speed(self):
-		self.ui.p3_units_LABEL.setText(str(self.p3_speed) + " " + self.ui.p3_units_DROPDOWN.currentText())
-
-	# Set Px distance to move
-	def set_p1_amount(self):
-		self.p1_amount = self.ui.p1_amount_INPUT.value()
-	def set_p2_amount(self):
-		self.p2_amount = self.ui.p2_amount_INPUT.value()
-	def set_p3_amount(self):
-		self.p3_amount = self.ui.p3_amount_INPUT.value()
+		return self.pumps.active_ids()
 
 	# Set Px jog delta
 	#def set_p1_jog_delta(self):
@@ -448,119 +458,65 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 
 	def run(self):
 		self.statusBar().showMessage("You clicked RUN")
-		testData = []
-
-		active_pumps = self.get_active_pumps()
-		if len(active_pumps) > 0:
-
-			p1_input_displacement = str(self.convert_displacement(self.p1_amount, self.p1_units, self.p1_syringe_area))
-			p2_input_displacement = str(self.convert_displacement(self.p2_amount, self.p2_units, self.p2_syringe_area))
-			p3_input_displacement = str(self.convert_displacement(self.p3_amount, self.p3_units, self.p3_syringe_area))
 
-			pumps_2_run = ''.join(map(str,active_pumps))
-			
-			cmd = "<RUN,DIST,"+pumps_2_run+",0.0,F," + p1_input_displacement + "," + p2_input_displacement + "," + p3_input_displacement + ">"
-
-			testData.append(cmd)
-
-			print("Sending RUN command..")
-			thread = Thread(self.runTest, testData)
-			thread.finished.connect(lambda:self.thread_finished(thread))
-			thread.start()
-			print("RUN command sent.")
+		if len(self.get_active_pumps()) > 0:
+			gui_log.info("Sending RUN command..")
+			self.send_command(self.controller.run)
+			gui_log.info("RUN command sent.")
 		else:
 			self.statusBar().showMessage("No pumps enabled.")
 
-	# Clean up this text
+	# PAUSE and RESUME go out right away but leave the queue alone
 	def pause(self):
-		active_pumps = self.get_active_pumps()
-		pumps_2_run = ''.join(map(str,active_pumps))
-
 		if self.ui.pause_BTN.text() == "Pause":
 			self.statusBar().showMessage("You clicked PAUSE")
-			testData = []
-			cmd = "<PAUSE,BLAH," + pumps_2_run + ",BLAH,F,0.0,0.0,0.0>"
-			testData.append(cmd)
 
-			print("Sending PAUSE command..")
-			thread = Thread(self.runTest, testData)
-			thread.finished.connect(lambda:self.thread_finished(thread))
-			thread.start()
-			print("PAUSE command sent.")
+			gui_log.info("Sending PAUSE command..")
+			self.send_command(self.controller.pause)
+			gui_log.info("PAUSE command sent.")
 
 			self.ui.pause_BTN.setText("Resume")
 
 		elif self.ui.pause_BTN.text() == "Resume":
 			self.statusBar().showMessage("You clicked RESUME")
-			testData = []
-			cmd = "<RESUME,BLAH," + pumps_2_run + ",BLAH,F,0.0,0.0,0.0>"
-			testData.append(cmd)
 
-			print("Sending RESUME command..")
-			thread = Thread(self.runTest, testData)
-			thread.finished.connect(lambda:self.thread_finished(thread))
-			thread.start()
-			print("RESUME command sent.")
+			gui_log.info("Sending RESUME command..")
+			self.send_command(self.controller.resume)
+			gui_log.info("RESUME command sent.")
 
 			self.ui.pause_BTN.setText("Pause")
 
-	# fix
 	def zero(self):
 		self.statusBar().showMessage("You clicked ZERO")
-		testData = []
 
-		cmd = "<ZERO,BLAH,BLAH,BLAH,F,0.0,0.0,0.0>"
-		
-		print("Sending ZERO command..")
-		thread = Thread(self.runTest, testData)
-		thread.finished.connect(lambda:self.thread_finished(thread))
-		thread.start()
-		print("ZERO command sent.")
+		gui_log.info("Sending ZERO command..")
+		self.send_command(self.controller.zero)
+		gui_log.info("ZERO command sent.")
 
 
 	def stop(self):
 		self.statusBar().showMessage("You clicked STOP")
-		cmd = "<STOP,BLAH,BLAH,BLAH,F,0.0,0.0,0.0>"
 
-		print("Sending STOP command..")
-		thread = Thread(self.send_single_command, cmd)
-		thread.finished.connect(lambda:self.thread_finished(thread))
-		thread.start()
-		print("STOP command sent.")
+		gui_log.info("Sending STOP command..")
+		# STOP is written right away, ahead of (and dropping) whatever is still queued
+		self.send_command(self.controller.stop)
+		gui_log.info("STOP command sent.")
 
 	def jog(self, btn):
 		self.statusBar().showMessage("You clicked JOG")
-		#self.serial.flushInput()
-		testData = []
-		active_pumps = self.get_active_pumps()
-		if len(active_pumps) > 0:
-			pumps_2_run = ''.join(map(str,active_pumps))
-
-			one_jog = str(self.p1_setup_jog_delta_to_send)
-			two_jog = str(self.p2_setup_jog_delta_to_send)
-			three_jog = str(self.p3_setup_jog_delta_to_send)
-				 
+		if len(self.get_active_pumps()) > 0:
 			if btn.text() == "Jog +":
-				self.statusBar().showMessage("You clicked JOG -")
-				f_cmd = "<RUN,DIST," + pumps_2_run +",0,F," + one_jog + "," + two_jog + "," + three_jog + ">"
-				testData.append(f_cmd)
-
-				print("Sending JOG command..")
-				thread = Thread(self.runTest, testData)
-				thread.finished.connect(lambda:self.thread_finished(thread))
-				thread.start()
-				print("JOG command sent.")
-
+				self.statusBar().showMessage("You clicked JOG +")
+				direction = "F"
 			elif btn.text() == "Jog -":
 				self.statusBar().showMessage("You clicked JOG -")
-				b_cmd = "<RUN,DIST," + pumps_2_run +",0,B," + one_jog + "," + two_jog + "," + three_jog + ">"
-				testData.append(b_cmd)
-
-				print("Sending JOG command..")
-				thread = Thread(self.runTest, testData)
-				thread.finished.connect(lambda:self.thread_finished(thread))
-				thread.start()
-				print("JOG command sent.")
+				direction = "B"
+			else:
+				return
+
+			gui_log.info("Sending JOG command..")
+			self.send_command(self.controller.jog, direction)
+			gui_log.info("JOG command sent.")
 		else:
 			self.statusBar().showMessage("No pumps enabled.")
 
@@ -569,98 +525,162 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 	# ======================
 
 	# Initialize the camera
+	# The first click is what imports OpenCV
 	def start_camera(self):
 		self.statusBar().showMessage("You clicked START CAMERA")
 		camera_port = 0
-		self.capture = cv2.VideoCapture(camera_port)
-		#TODO check the native resolution of the camera and scale the size down here
-		self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 800)
-		self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, 400)
-
-		self.timer = QtCore.QTimer(self)
-		self.timer.timeout.connect(self.update_frame)
-		self.timer.start(5)
-
-	# Update frame function
+		if self.capture_thread is not None:
+			return
+
+		# The camera is read on its own thread at its own rate, frames are
+		# shown at most once per screen refresh, whichever is slower wins
+		refresh_rate = QtWidgets.QApplication.primaryScreen().refreshRate() or 60.0
+		self.display_timer = QtCore.QTimer(self)
+		self.display_timer.setSingleShot(True)
+		self.display_timer.setInterval(int(1000 / refresh_rate))
+		self.display_timer.timeout.connect(self.update_frame)
+
+		# frames stay as the camera delivers them, the display and save_image mirror them
+		self.capture_thread = camera.CaptureThread(camera.Camera(camera_port, width=400, height=800, mirror=False),
+			self.camera_signals.frame_ready.emit)
+		self.capture_thread.start()
+
+	# A new frame is waiting, show it unless one went up less than a refresh ago
+	# (the display timer then shows the newest one when it runs out)
+	def frame_ready(self):
+		if not self.display_timer.isActive():
+			self.update_frame()
+
+	# Show the newest frame, if there is one we have not shown yet
 	def update_frame(self):
-		ret, self.image = self.capture.read()
-		self.image = cv2.flip(self.image, 1)
+		if self.capture_thread is None:
+			return
+		frame = self.capture_thread.frames.take()
+		if frame is None:
+			return
+		self.image = frame.image
 		self.display_image(self.image, 1)
+		self.display_timer.start()
 
 	# Display image in frame
+	# Scaled to the label and mirrored on the way, see FrameDisplay
 	def display_image(self, image, window=1):
-		qformat = QtGui.QImage.Format_Indexed8
-		if len(image.shape) == 3: #
-			if image.shape[2] == 4:
-				qformat = QtGui.QImage.Format_RGBA8888
-				
-			else:
-				qformat = QtGui.QImage.Format_RGB888
-				#print(image.shape[0], image.shape[1], image.shape[2])
-		self.img_2_display = QtGui.QImage(image, image.shape[1], image.shape[0], image.strides[0], qformat)
-		self.img_2_display = QtGui.QImage.rgbSwapped(self.img_2_display)
-
 		if window == 1:
-			self.ui.imgLabel.setPixmap(QtGui.QPixmap.fromImage(self.img_2_display))
-			self.ui.imgLabel.setScaledContents(False)
+			if self.frame_display is None:
+				self.frame_display = FrameDisplay(self.ui.imgLabel)
+				self.ui.imgLabel.setScaledContents(False)
+			self.ui.imgLabel.setPixmap(self.frame_display.pixmap(image))
 
 	# Save image to set location
+	# Only queued here, the image writer's threads encode and write it and
+	# image_saved() reports back. If they are that far behind the capture is
+	# dropped rather than freezing the window
 	def save_image(self):
-		if not os.path.exists("./images"):
-			os.mkdir("images")
-
-		self.date_string =  datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-		# Replace semicolons with underscores
-		self.date_string = self.date_string.replace(":","_")
-		self.write_image_loc = './images/'+self.date_string + '.png'
-		cv2.imwrite(self.write_image_loc, self.image)
-		self.statusBar().showMessage("Captured Image, saved to: " + self.write_image_loc)
-
+		if self.image is None:
+			self.statusBar().showMessage("No image to save, start the camera first.")
+			return
+		if self.image_writer is None:
+			self.image_writer = images.ImageWriter(IMAGE_DIRECTORY, IMAGE_FORMAT, IMAGE_LEVEL)
+		try:
+			job = self.image_writer.submit(self.image, mirror=True, timeout=0)
+		except images.QueueFull as e:
+			self.statusBar().showMessage("Image not captured, still writing: " + str(e))
+			return
+		self.write_image_loc = job.path
+		job.add_done_callback(self.image_written)
+
+	# Runs on an image writer thread
+	def image_written(self, job):
+		error = job.exception()
+		self.camera_signals.image_saved.emit(job.path, "" if error is None else str(error))
+
+	def image_saved(self, path, error):
+		if error:
+			self.statusBar().showMessage("Could not save " + path + ": " + error)
+			return
+		waiting = self.image_writer.queued
+		self.statusBar().showMessage("Captured Image, saved to: " + path +
+			(" (%d more being written)" % waiting if waiting else ""))
+
+
+	# Timelapse
+	# Saves frames every interval seconds (0 for never) and/or when the pumps
+	# start, pass a milestone and finish a move, see poseidon/timelapse.py.
+	# It has its own writer, which waits for the disk rather than dropping
+	# images like save_image does
+	def toggle_timelapse(self, checked):
+		if checked:
+			self.start_timelapse()
+		else:
+			self.stop_timelapse()
+
+	def start_timelapse(self):
+		if self.timelapse is not None:
+			return
+		interval = self.ui.camera_interval_INPUT.value() or None
+		events = timelapse.EVENTS if self.ui.camera_pump_events_CHECKBOX.isChecked() else ()
+		if self.capture_thread is None or (interval is None and not events):
+			self.statusBar().showMessage("Start the camera and pick an interval or pump events first.")
+			self.ui.camera_timelapse_BTN.setChecked(False)
+			return
+		directory = os.path.join(IMAGE_DIRECTORY, datetime.now().strftime("timelapse %Y-%m-%d %H_%M_%S"))
+		os.makedirs(directory, exist_ok=True)
+		self.controller.positions.milestones = TIMELAPSE_MILESTONES
+		self.timelapse = timelapse.Timelapse(self.capture_thread.frames,
+			images.ImageWriter(directory, IMAGE_FORMAT, IMAGE_LEVEL), self.controller.positions,
+			self.pumps, interval, events, os.path.join(directory, "positions.csv"), mirror=True)
+		self.timelapse.start()
+		self.statusBar().showMessage("Timelapse saving to " + directory)
+
+	def stop_timelapse(self):
+		if self.timelapse is None:
+			return
+		lapse, self.timelapse = self.timelapse, None
+		# a capture waiting on a busy disk gives up within timelapse.SUBMIT_WAIT,
+		# never hold the window up for longer than TIMELAPSE_STOP_TIMEOUT
+		lapse.stop(TIMELAPSE_STOP_TIMEOUT)
+		lapse.writer.close(wait=False)
+		self.ui.camera_timelapse_BTN.setChecked(False)
+		self.statusBar().showMessage("Timelapse stopped, %d images in %s" % (lapse.captured, lapse.writer.directory))
 
 	# Stop camera
 	def stop_camera(self):
-		self.timer.stop()
+		self.stop_timelapse()
+		if self.capture_thread is None:
+			return
+		self.capture_thread.stop()
+		self.display_timer.stop()
+		self.capture_thread = None
 
 	# ======================
 	# FUNCTIONS : Setup
 	# ======================
 
 	# Populate the available ports
+	# The scan runs on the poseidon.ports watcher thread, ports_changed then
+	# adds and removes dropdown entries as boards are plugged in or pulled out
 	def populate_ports(self):
-	    """
-	        :raises EnvironmentError:
-	            On unsupported or unknown platforms
-	        :returns:
-	            A list of the serial ports available on the system
-	    """
-	    print("Populating ports..")
-	    if sys.platform.startswith('win'):
-	        ports = ['COM%s' % (i + 1) for i in range(256)]
-	    elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
-	        # this excludes your current terminal "/dev/tty"
-	        ports = glob.glob('/dev/tty[A-Za-z]*')
-	    elif sys.platform.startswith('darwin'):
-	        ports = glob.glob('/dev/tty.*')
-	    else:
-	        raise EnvironmentError('Unsupported platform')
-
-	    result = []
-	    for port in ports:
-	        try:
-	            s = serial.Serial(port)
-	            s.close()
-	            result.append(port)
-	        except (OSError, serial.SerialException):
-	            pass
-	    self.ui.port_DROPDOWN.addItems(result)
-	    print("Ports have been populated.")
+		gui_log.info("Populating ports..")
+		self.port_signals = PortSignals()
+		self.port_signals.ports_changed.connect(self.update_ports)
+		self.port_watcher = ports.PortWatcher(self.port_signals.ports_changed.emit)
+		self.port_watcher.start()
+
+	# Runs on the GUI thread with what changed since the last scan
+	def update_ports(self, added, removed):
+		for port in removed:
+			index = self.ui.port_DROPDOWN.findText(port)
+			if index >= 0:
+				self.ui.port_DROPDOWN.removeItem(index)
+		for port in added:
+			if self.ui.port_DROPDOWN.findText(port) < 0:
+				self.ui.port_DROPDOWN.addItem(port)
+		gui_log.info("Ports have been populated.")
 
 	# Refresh the list of ports
 	def refresh_ports(self):
 		self.statusBar().showMessage("You clicked REFRESH PORTS")
-		self.ui.port_DROPDOWN.clear()
-		self.populate_ports()
+		self.port_watcher.rescan()
 
 	# Set the port that is selected from the dropdown menu
 	def set_port(self):
@@ -687,318 +707,142 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 		self.date_string = self.date_string.replace(":","_")
 		self.log_file_name = self.ui.log_file_name_INPUT.text() + "_" + self.date_string + ".png"
 
+	# Settings files are JSON, see poseidon/settings.py. Files saved by older
+	# versions (one line per setting) still load
 	def save_settings(self):
-		# TODO: if you cancel then it gives error, fix this
-		# TODO: add comment
-		name, _ = QFileDialog.getSaveFileName(self,'Save File', options=QFileDialog.DontUseNativeDialog)
-
-		# Create a date string
-		self.date_string =  datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-		# Replace semicolons with underscores
-		self.date_string = self.date_string.replace(":","_")
-
-		date_string = self.date_string
-
-		# write all of the settings here
-		## Settings for pump 1
-		p1_syringe 			= str(self.p1_syringe)
-		p1_units 			= str(self.p1_units)
-		p1_speed 			= str(self.p1_speed)
-		p1_accel 			= str(self.p1_accel)
-		p1_setup_jog_delta 	= str(self.p1_setup_jog_delta)
-
-		## Settings for pump 2
-		p2_syringe 			= str(self.p2_syringe)
-		p2_units 			= str(self.p2_units)
-		p2_speed 			= str(self.p2_speed)
-		p2_accel 			= str(self.p2_accel)
-		p2_setup_jog_delta 	= str(self.p2_setup_jog_delta)
-
-		## Settings for pump 3
-		p3_syringe 			= str(self.p3_syringe)
-		p3_units 			= str(self.p3_units)
-		p3_speed 			= str(self.p3_speed)
-		p3_accel 			= str(self.p3_accel)
-		p3_setup_jog_delta 	= str(self.p3_setup_jog_delta)
-
-		## Experiment Notes
-		experiment_notes = self.experiment_notes
-
-		text = []
-		text.append("File name: " + name + "\n") 				# line 0
-		text.append("Date time: " + date_string + "\n") 		# line 1
-
-		text.append(":================================ \n") 	# line 2
-		text.append("P1 Syrin: " + p1_syringe + "\n") 			# line 3
-		text.append("P1 Units: " + p1_units + "\n") 			# line 4
-		text.append("P1 Speed: " + p1_speed + "\n") 			# line 5
-		text.append("P1 Accel: " + p1_accel + "\n") 			# line 6
-		text.append("P1 Jog D: " + p1_setup_jog_delta + "\n") 	# line 7
-		text.append(":================================ \n")		# line 8
-		text.append("P2 Syrin: " + p2_syringe + "\n") 			# line 9
-		text.append("P2 Units: " + p2_units + "\n") 			# line 10
-		text.append("P2 Speed: " + p2_speed + "\n") 			# line 11
-		text.append("P2 Accel: " + p2_accel + "\n") 			# line 12
-		text.append("P2 Jog D: " + p2_setup_jog_delta + "\n") 	# line 13
-		text.append(":================================ \n") 	# line 14
-		text.append("P3 Syrin: " + p3_syringe + "\n") 			# line 15
-		text.append("P3 Units: " + p3_units + "\n") 			# line 16
-		text.append("P3 Speed: " + p3_speed + "\n") 			# line 17
-		text.append("P3 Accel: " + p3_accel + "\n") 			# line 18
-		text.append("P3 Jog D: " + p3_setup_jog_delta + "\n") 	# line 19
-		text.append("Exp Note: " + experiment_notes)			# line 20
-
-		with open(name, 'w') as f:
-			f.writelines(text)
+		name, _ = QFileDialog.getSaveFileName(self, 'Save File', options=QFileDialog.DontUseNativeDialog)
+		if not name:
+			return
+		try:
+			settings.save(name, self.pumps, self.experiment_notes)
+		except OSError as e:
+			self.statusBar().showMessage("Could not save the settings: " + str(e))
+			return
+		self.statusBar().showMessage("Settings saved to: " + name)
 
 	def load_settings(self):
 		# need to make name an tuple otherwise i had an error and app crashed
 		name, _ = QFileDialog.getOpenFileName(self, 'Open File', options=QFileDialog.DontUseNativeDialog)
-
-		with open(name, 'r') as f:
-			text = f.readlines()
-			# here is where you load all of your variables
-			# reformatting the text
-			text = [line.split(':')[-1].strip('\n')[1:] for line in text]
-			fname = text[0]
-			date_string = text[1]
-
-			p1_syringe 			= text[3]
-			p1_units 			= text[4]
-			p1_speed 			= text[5]
-			p1_accel 			= text[6]
-			p1_setup_jog_delta 	= text[7]
-
-			p2_syringe 			= text[9]
-			p2_units 			= text[10]
-			p2_speed 			= text[11]
-			p2_accel 			= text[12]
-			p2_setup_jog_delta 	= text[13]
-
-			p3_syringe 			= text[15]
-			p3_units 			= text[16]
-			p3_speed 			= text[17]
-			p3_accel 			= text[18]
-			p3_setup_jog_delta 	= text[19]
-
-			experiment_notes 	= text[20]
-
-			#print(fname, date_string, p1_syringe, p1_units, p1_speed, p1_accel, p1_setup_jog_delta)
-
-		# Here we are setting all of the values as given by the settings file
-		p1_syringe_index = self.ui.p1_syringe_DROPDOWN.findText(p1_syringe, QtCore.Qt.MatchFixedString)
-		self.ui.p1_syringe_DROPDOWN.setCurrentIndex(p1_syringe_index)
-		p1_units_index = self.ui.p1_units_DROPDOWN.findText(p1_units, QtCore.Qt.MatchFixedString)
-		self.ui.p1_units_DROPDOWN.setCurrentIndex(p1_units_index)
-		self.ui.p1_speed_INPUT.setValue(float(p1_speed))
-		self.ui.p1_accel_INPUT.setValue(float(p1_accel))
-
-		AllItems = [self.ui.p1_setup_jog_delta_INPUT.itemText(i) for i in range(self.ui.p1_setup_jog_delta_INPUT.count())]
-
-		p1_setup_jog_delta_index = self.ui.p1_setup_jog_delta_INPUT.findText(p1_setup_jog_delta, QtCore.Qt.MatchFixedString)
-		self.ui.p1_setup_jog_delta_INPUT.setCurrentIndex(p1_setup_jog_delta_index)
-
-
-		p2_syringe_index = self.ui.p2_syringe_DROPDOWN.findText(p2_syringe, QtCore.Qt.MatchFixedString)
-		self.ui.p2_syringe_DROPDOWN.setCurrentIndex(p2_syringe_index)
-		p2_units_index = self.ui.p2_units_DROPDOWN.findText(p2_units, QtCore.Qt.MatchFixedString)
-		self.ui.p2_units_DROPDOWN.setCurrentIndex(p2_units_index)
-		self.ui.p2_speed_INPUT.setValue(float(p2_speed))
-		self.ui.p2_accel_INPUT.setValue(float(p2_accel))
-
-		p2_setup_jog_delta_index = self.ui.p2_setup_jog_delta_INPUT.findText(p2_setup_jog_delta, QtCore.Qt.MatchFixedString)
-		self.ui.p2_setup_jog_delta_INPUT.setCurrentIndex(p2_setup_jog_delta_index)
-
-		p3_syringe_index = self.ui.p3_syringe_DROPDOWN.findText(p3_syringe, QtCore.Qt.MatchFixedString)
-		self.ui.p3_syringe_DROPDOWN.setCurrentIndex(p3_syringe_index)
-		p3_units_index = self.ui.p3_units_DROPDOWN.findText(p3_units, QtCore.Qt.MatchFixedString)
-		self.ui.p3_units_DROPDOWN.setCurrentIndex(p3_units_index)
-		self.ui.p3_speed_INPUT.setValue(float(p3_speed))
-		self.ui.p3_accel_INPUT.setValue(float(p3_accel))
-
-		p3_setup_jog_delta_index = self.ui.p3_setup_jog_delta_INPUT.findText(p3_setup_jog_delta, QtCore.Qt.MatchFixedString)
-		self.ui.p3_setup_jog_delta_INPUT.setCurrentIndex(p3_setup_jog_delta_index)
-
-		self.ui.experiment_notes.setText(experiment_notes)
-
-		self.statusBar().showMessage("Settings loaded from: " + text[1])
+		if not name:
+			return
+		try:
+			document = settings.load(name)
+		except settings.SettingsError as e:
+			self.statusBar().showMessage("Settings not loaded: " + str(e))
+			return
+
+		# The pumps take every value in one go, the widgets are then only
+		# brought in line with them, with their signals blocked so none of
+		# the input handlers run again (see benchmarks/bench_load_settings.py).
+		# The labels are redrawn and the send buttons turned green once per pump
+		for n in settings.apply(self.pumps, document):
+			self.show_pump_inputs(n)
+			self.send_pump_warning(n)
+			self.dirty_pumps.add(n)
+		self.refresh_pumps()
+
+		self.experiment_notes = document['notes']
+		self.ui.experiment_notes.setText(self.experiment_notes)
+
+		self.statusBar().showMessage("Settings loaded from: " + name + (" (saved " + document['saved'] + ")" if document.get('saved') else ""))
+
+	# Put pump n's inputs back on its widgets without telling anyone
+	def show_pump_inputs(self, n):
+		pump = self.pumps[n - 1]
+		widgets = [self.pump_widget(n, widget) for widget, signal, read, needs_sending in PUMP_INPUT_WIDGETS.values()]
+		blocked = [widget.blockSignals(True) for widget in widgets]
+		try:
+			for dropdown, value in [('syringe_DROPDOWN', pump.syringe), ('units_DROPDOWN', pump.units),
+					('setup_jog_delta_INPUT', str(pump.jog_delta))]:
+				widget = self.pump_widget(n, dropdown)
+				index = widget.findText(value, QtCore.Qt.MatchFixedString)
+				if index < 0:
+					widget.addItem(value)
+					index = widget.count() - 1
+				widget.setCurrentIndex(index)
+			self.pump_widget(n, 'speed_INPUT').setValue(pump.speed)
+			self.pump_widget(n, 'accel_INPUT').setValue(pump.accel)
+			self.pump_widget(n, 'amount_INPUT').setValue(pump.amount)
+		finally:
+			for widget, was_blocked in zip(widgets, blocked):
+				widget.blockSignals(was_blocked)
+		# a spin box may have rounded or clamped a value, the pump goes by the widget
+		self.read_pump_inputs(n)
 
 
 	# Populate the list of possible syringes to the dropdown menus
 	def populate_syringe_sizes(self):
-		self.syringe_options = ["BD 1 mL", "BD 3 mL", "BD 5 mL", "BD 10 mL", "BD 20 mL", "BD 30 mL", "BD 60 mL"]
-		self.syringe_volumes = [1, 3, 5, 10, 20, 30, 60]
-		self.syringe_areas = [17.34206347, 57.88559215, 112.9089185, 163.539454, 285.022957, 366.0961536, 554.0462538]
-
-		self.ui.p1_syringe_DROPDOWN.addItems(self.syringe_options)
-		self.ui.p2_syringe_DROPDOWN.addItems(self.syringe_options)
-		self.ui.p3_syringe_DROPDOWN.addItems(self.syringe_options)
-
-	# Set Px syringe
-	def set_p1_syringe(self):
-		self.p1_syringe = self.ui.p1_syringe_DROPDOWN.currentText()
-		self.p1_syringe_area = self.syringe_areas[self.syringe_options.index(self.p1_syringe)]
-		self.display_p1_syringe()
-
-		self.set_p1_units()
-		self.set_p1_speed()
-		self.set_p1_accel()
-		self.set_p1_setup_jog_delta()
-		self.set_p1_amount()
-
-	def set_p2_syringe(self):
-		self.p2_syringe = self.ui.p2_syringe_DROPDOWN.currentText()
-		self.p2_syringe_area = self.syringe_areas[self.syringe_options.index(self.p2_syringe)]
-		self.display_p2_syringe()
-
-		self.set_p2_units()
-		self.set_p2_speed()
-		self.set_p2_accel()
-		self.set_p2_setup_jog_delta()
-		self.set_p2_amount()
-
-	def set_p3_syringe(self):
-		self.p3_syringe = self.ui.p3_syringe_DROPDOWN.currentText()
-		self.p3_syringe_area = self.syringe_areas[self.syringe_options.index(self.p3_syringe)]
-		self.display_p3_syringe()
-
-		self.set_p3_units()
-		self.set_p3_speed()
-		self.set_p3_accel()
-		self.set_p3_setup_jog_delta()
-		self.set_p3_amount()
-
-	# Set Px units 
-	def set_p1_units(self):
-		self.p1_units = self.ui.p1_units_DROPDOWN.currentText()
-
-		length = self.p1_units.split("/")[0]
-		self.ui.p1_units_LABEL_2.setText(length)
-
-		self.set_p1_speed()
-		self.set_p1_accel()
-		self.set_p1_setup_jog_delta()
-		self.set_p1_amount()
-
-	def set_p2_units(self):
-		self.p2_units = self.ui.p2_units_DROPDOWN.currentText()
-		
-		length = self.p2_units.split("/")[0]
-		self.ui.p2_units_LABEL_2.setText(length)
-
-		self.set_p2_speed()
-		self.set_p2_accel()
-		self.set_p2_setup_jog_delta()
-		self.set_p2_amount()
-
-	def set_p3_units(self):
-		self.p3_units = self.ui.p3_units_DROPDOWN.currentText()
-		
-		length = self.p3_units.split("/")[0]
-		self.ui.p3_units_LABEL_2.setText(length)
-
-		self.set_p3_speed()
-		self.set_p3_accel()
-		self.set_p3_setup_jog_delta()
-		self.set_p3_amount()
-
+		self.syringe_options = units.SYRINGE_OPTIONS
+		self.syringe_volumes = units.SYRINGE_VOLUMES
+		self.syringe_areas = units.SYRINGE_AREAS
+
+		for n in self.pump_numbers():
+			self.pump_widget(n, 'syringe_DROPDOWN').addItems(self.syringe_options)
+
+	# How many pumps the .ui file has widgets for (p1_..., p2_..., ...)
+	def count_pump_widgets(self):
+		count = 0
+		while hasattr(self.ui, 'p%d_speed_INPUT' % (count + 1)):
+			count += 1
+		return count
+
+	def pump_numbers(self):
+		return range(1, self.pump_count + 1)
+
+	# pump_widget(2, 'speed_INPUT') is self.ui.p2_speed_INPUT
+	def pump_widget(self, n, name):
+		return getattr(self.ui, 'p%d_%s' % (n, name))
+
+	# Set one input of pump n from its widget
+	def set_pump_input(self, n, field):
+		widget, signal, read, needs_sending = PUMP_INPUT_WIDGETS[field]
+		self.pump_changed(n, **{field: read(self.pump_widget(n, widget))})
+
+	# Read every input of pump n off its widgets
+	def read_pump_inputs(self, n):
+		self.pump_changed(n, **dict((field, read(self.pump_widget(n, widget)))
+			for field, (widget, signal, read, needs_sending) in PUMP_INPUT_WIDGETS.items()))
+
+	# One input of pump n changed. Only the step values depending on it are
+	# dropped (they are worked out again when next used), and the labels are
+	# redrawn once the current event is done, however many inputs changed in it
+	def pump_changed(self, n, **inputs):
+		if not self.pumps[n - 1].update(**inputs):
+			return
+		self.dirty_pumps.add(n)
+		if not self.pump_refresh_pending:
+			self.pump_refresh_pending = True
+			QtCore.QTimer.singleShot(0, self.refresh_pumps)
+
+	def refresh_pumps(self):
+		self.pump_refresh_pending = False
+		for n in sorted(self.dirty_pumps):
+			pump = self.pumps[n - 1]
+			self.pump_widget(n, 'syringe_LABEL').setText(pump.syringe)
+			self.pump_widget(n, 'units_LABEL').setText(str(pump.speed) + " " + pump.units)
+			self.pump_widget(n, 'units_LABEL_2').setText(pump.units.split("/")[0])
+		self.dirty_pumps.clear()
 
 	def populate_pump_units(self):
-		self.units = ['mm/s', 'mL/s', 'mL/hr', 'µL/hr']
-		self.ui.p1_units_DROPDOWN.addItems(self.units)
-		self.ui.p2_units_DROPDOWN.addItems(self.units)
-		self.ui.p3_units_DROPDOWN.addItems(self.units)
+		self.units = units.UNITS
+		for n in self.pump_numbers():
+			self.pump_widget(n, 'units_DROPDOWN').addItems(self.units)
 
 	def populate_pump_jog_delta(self):
 		self.jog_delta = ['0.01', '0.1', '1.0', '10.0']
-		self.ui.p1_setup_jog_delta_INPUT.addItems(self.jog_delta)
-		self.ui.p2_setup_jog_delta_INPUT.addItems(self.jog_delta)
-		self.ui.p3_setup_jog_delta_INPUT.addItems(self.jog_delta)
-
-	# Set Px speed 
-	def set_p1_speed(self):
-		self.p1_speed = self.ui.p1_speed_INPUT.value()
-		self.ui.p1_units_LABEL.setText(str(self.p1_speed) + " " + self.ui.p1_units_DROPDOWN.currentText())
-		self.p1_speed_to_send = self.convert_speed(self.p1_speed, self.p1_units, self.p1_syringe_area)
-
-	def set_p2_speed(self):
-		self.p2_speed = self.ui.p2_speed_INPUT.value()
-		self.ui.p2_units_LABEL.setText(str(self.p2_speed) + " " + self.ui.p2_units_DROPDOWN.currentText())
-		self.p2_speed_to_send = self.convert_speed(self.p2_speed, self.p2_units, self.p2_syringe_area)
-
-	def set_p3_speed(self):
-		self.p3_speed = self.ui.p3_speed_INPUT.value()
-		self.ui.p3_units_LABEL.setText(str(self.p3_speed) + " " + self.ui.p3_units_DROPDOWN.currentText())
-		self.p3_speed_to_send = self.convert_speed(self.p3_speed, self.p3_units, self.p3_syringe_area)
-
-	# Set Px accel 
-	def set_p1_accel(self):
-		self.p1_accel = self.ui.p1_accel_INPUT.value()
-		self.p1_accel_to_send = self.convert_accel(self.p1_accel, self.p1_units, self.p1_syringe_area)
-
-	def set_p2_accel(self):
-		self.p2_accel = self.ui.p2_accel_INPUT.value()
-		self.p2_accel_to_send = self.convert_accel(self.p2_accel, self.p2_units, self.p2_syringe_area)
-
-	def set_p3_accel(self):
-		self.p3_accel = self.ui.p3_accel_INPUT.value()
-		self.p3_accel_to_send = self.convert_accel(self.p3_accel, self.p3_units, self.p3_syringe_area)
-
-	# Set Px jog delta (setup) 
-	def set_p1_setup_jog_delta(self):
-		self.p1_setup_jog_delta = self.ui.p1_setup_jog_delta_INPUT.currentText()
-		self.p1_setup_jog_delta = float(self.ui.p1_setup_jog_delta_INPUT.currentText())
-		self.p1_setup_jog_delta_to_send = self.convert_displacement(self.p1_setup_jog_delta, self.p1_units, self.p1_syringe_area)
-
-	def set_p2_setup_jog_delta(self):
-		self.p2_setup_jog_delta = float(self.ui.p2_setup_jog_delta_INPUT.currentText())
-		self.p2_setup_jog_delta_to_send = self.convert_displacement(self.p2_setup_jog_delta, self.p2_units, self.p2_syringe_area)
-
-	def set_p3_setup_jog_delta(self):
-		self.p3_setup_jog_delta = float(self.ui.p3_setup_jog_delta_INPUT.currentText())
-		self.p3_setup_jog_delta_to_send = self.convert_displacement(self.p3_setup_jog_delta, self.p3_units, self.p3_syringe_area)
+		for n in self.pump_numbers():
+			self.pump_widget(n, 'setup_jog_delta_INPUT').addItems(self.jog_delta)
 
 	# Send Px settings
-	def send_p1_settings(self):
-		self.statusBar().showMessage("You clicked SEND P1 SETTINGS")
-		self.p1_settings = []
-		self.p1_settings.append("<SETTING,SPEED,1," + str(self.p1_speed_to_send) + ",F,0.0,0.0,0.0>")
-		self.p1_settings.append("<SETTING,ACCEL,1," + str(self.p1_accel_to_send) + ",F,0.0,0.0,0.0>")
-		self.p1_settings.append("<SETTING,DELTA,1," + str(self.p1_setup_jog_delta_to_send) + ",F,0.0,0.0,0.0>")
-
-		print("Sending P1 SETTINGS..")
-		thread = Thread(self.runTest, self.p1_settings)
-		thread.finished.connect(lambda:self.thread_finished(thread))
-		thread.start()
-		print("P1 SETTINGS sent.")
-		
-	def send_p2_settings(self):
-		self.statusBar().showMessage("You clicked SEND P2 SETTINGS")
-		self.p2_settings = []
-		self.p2_settings.append("<SETTING,SPEED,2," + str(self.p2_speed_to_send) + ",F,0.0,0.0,0.0>")
-		self.p2_settings.append("<SETTING,ACCEL,2," + str(self.p2_accel_to_send) + ",F,0.0,0.0,0.0>")
-		self.p2_settings.append("<SETTING,DELTA,2," + str(self.p2_setup_jog_delta_to_send) + ",F,0.0,0.0,0.0>")
-
-		print("Sending P2 SETTINGS..")
-		thread = Thread(self.runTest, self.p2_settings)
-		thread.finished.connect(lambda:self.thread_finished(thread))
-		thread.start()
-		print("P2 SETTINGS sent.")
-
-	def send_p3_settings(self):
-		self.statusBar().showMessage("You clicked SEND P3 SETTINGS")
-		self.p3_settings = []
-		self.p3_settings.append("<SETTING,SPEED,3," + str(self.p3_speed_to_send) + ",F,0.0,0.0,0.0>")
-		self.p3_settings.append("<SETTING,ACCEL,3," + str(self.p3_accel_to_send) + ",F,0.0,0.0,0.0>")
-		self.p3_settings.append("<SETTING,DELTA,3," + str(self.p3_setup_jog_delta_to_send) + ",F,0.0,0.0,0.0>")
-
-		print("Sending P3 SETTINGS..")
-		thread = Thread(self.runTest, self.p3_settings)
-		thread.finished.connect(lambda:self.thread_finished(thread))
-		thread.start()
-		print("P3 SETTINGS sent.")
+	def send_pump_settings(self, n):
+		self.statusBar().showMessage("You clicked SEND P%d SETTINGS" % n)
+		gui_log.info("Sending P%d SETTINGS..", n)
+		self.send_command(self.controller.send_settings, [n])
+		gui_log.info("P%d SETTINGS sent.", n)
 
 	# Connect to the Arduino board
+	# Opening the port resets the board, connect() only starts the reader and
+	# returns, board_connected() finishes up once the board says it is ready
 	def connect(self):
 		#self.port_nano = '/dev/cu.usbserial-A9M11B77'
 		#self.port_uno = "/dev/cu.usbmodem1411"
@@ -1007,50 +851,94 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 		try:
 			port_declared = self.port in vars()
 			try:
-				self.serial = serial.Serial()
-				self.serial.port = self.port
-				self.serial.baudrate = 230400
-				self.serial.parity = serial.PARITY_NONE
-				self.serial.stopbits = serial.STOPBITS_ONE
-				self.serial.bytesize = serial.EIGHTBITS
-				self.serial.timeout = 1
-				self.serial.open()
-				#self.serial.flushInput()
-
-				# This is a thread that always runs and listens to commands from the Arduino
-				self.global_listener_thread = Thread(self.listening)
-				self.global_listener_thread.finished.connect(lambda:self.self.thread_finished(self.global_listener_thread))
-				self.global_listener_thread.start()
-
-				# ~~~~~~~~~~~~~~~~
-				# TAB : Setup
-				# ~~~~~~~~~~~~~~~~
-				self.ui.disconnect_BTN.setEnabled(True)
-				self.ui.p1_setup_send_BTN.setEnabled(True)
-				self.ui.p2_setup_send_BTN.setEnabled(True)
-				self.ui.p3_setup_send_BTN.setEnabled(True)
-				self.ui.send_all_BTN.setEnabled(True)
+				# Record from the very first byte, the ready banner included
+				self.start_run_log()
+				# Opens the port and starts the reader and command threads
+				self.controller.open(self.port)
+
+				# Wait for <Arduino is ready> without blocking the window
+				self.connector = BoardConnector(self.controller.transport)
+				self.connector.progress.connect(self.connect_progress)
+				self.connector.connected.connect(self.board_connected)
+				self.connector.failed.connect(self.board_connect_failed)
+				self.connector.start()
 
 				self.ui.connect_BTN.setEnabled(False)
-				time.sleep(3)
-				self.statusBar().showMessage("Successfully connected to board.")
 			except:
+				self.controller.close()
+				self.stop_run_log()
 				self.statusBar().showMessage("Cannot connect to board. Try again..")
 				raise CannotConnectException
 		except AttributeError:
 			self.statusBar().showMessage("Please plug in the board and select a proper port, then press connect.")
 
-		
+	def connect_progress(self, percent):
+		self.statusBar().showMessage("Waiting for the board to reset.. %d%%" % percent)
+
+	# The board printed <Arduino is ready>
+	def board_connected(self):
+		# ~~~~~~~~~~~~~~~~
+		# TAB : Setup
+		# ~~~~~~~~~~~~~~~~
+		self.ui.disconnect_BTN.setEnabled(True)
+		for n in self.pump_numbers():
+			self.pump_widget(n, 'setup_send_BTN').setEnabled(True)
+		self.ui.send_all_BTN.setEnabled(True)
+		if self.connector.banner_missing:
+			gui_log.warning("No <%s> from the board, carrying on", protocol.READY_BANNER)
+			self.statusBar().showMessage("Connected, but the board never said it was ready (it may not reset when the port opens).")
+		else:
+			self.statusBar().showMessage("Successfully connected to board.")
+
+		# Switch to the binary command encoding if the firmware knows it,
+		# commands keep going out as text until it has answered
+		self.controller.negotiate().add_done_callback(self.protocol_negotiated)
+
+	def protocol_negotiated(self, negotiation):
+		if negotiation.exception() is None:
+			gui_log.info("Command encoding: %s", "binary" if negotiation.result() else "text")
+
+	def board_connect_failed(self, reason):
+		self.close_serial()
+		self.ui.connect_BTN.setEnabled(True)
+		self.statusBar().showMessage("Cannot connect to board: " + reason + ". Try again..")
+
+	# Stop the worker and the reader, then close the port. Nothing here waits
+	# on the board, the reader thread wakes up through cancel_read()
+	def close_serial(self):
+		if self.connector is not None:
+			self.connector.cancel()
+		try:
+			self.controller.close()
+		finally:
+			self.stop_run_log()
+
+	def start_run_log(self):
+		self.stop_run_log()
+		if RUN_LOG_DIRECTORY is None:
+			return
+		now = datetime.now()
+		path = os.path.join(RUN_LOG_DIRECTORY, now.strftime("%Y-%m-%d %H_%M_%S") + ".%03d.plog" % (now.microsecond // 1000))
+		try:
+			self.run_log = runlog.Recorder(path)
+		except OSError as e:
+			gui_log.warning("Not recording this run: %s", e)
+			return
+		self.run_log.mark("port %s" % self.port)
+		self.run_log.attach(self.controller)
+
+	def stop_run_log(self):
+		if self.run_log is not None:
+			self.run_log.close()
+			self.run_log = None
 
 	# Disconnect from the Arduino board
 	# TODO: figure out how to handle error..
 	def disconnect(self):
 		self.statusBar().showMessage("You clicked DISCONNECT FROM BOARD")
-		print("Disconnecting from board..")
-		self.global_listener_thread.stop()
-		time.sleep(3)
-		self.serial.close()
-		print("Board has been disconnected")
+		gui_log.info("Disconnecting from board..")
+		self.close_serial()
+		gui_log.info("Board has been disconnected")
 
 		self.grey_out_components()
 		self.ui.connect_BTN.setEnabled(True)
@@ -1060,27 +948,12 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 	def send_all(self):
 		self.statusBar().showMessage("You clicked SEND ALL SETTINGS")
 
-		self.settings = []
-		self.settings.append("<SETTING,SPEED,1,"+str(self.p1_speed_to_send)+",F,0.0,0.0,0.0>")
-		self.settings.append("<SETTING,ACCEL,1,"+str(self.p1_accel_to_send)+",F,0.0,0.0,0.0>")
-		self.settings.append("<SETTING,DELTA,1,"+str(self.p1_setup_jog_delta_to_send)+",F,0.0,0.0,0.0>")
-
-		self.settings.append("<SETTING,SPEED,2,"+str(self.p2_speed_to_send)+",F,0.0,0.0,0.0>")
-		self.settings.append("<SETTING,ACCEL,2,"+str(self.p2_accel_to_send)+",F,0.0,0.0,0.0>")
-		self.settings.append("<SETTING,DELTA,2,"+str(self.p2_setup_jog_delta_to_send)+",F,0.0,0.0,0.0>")
-
-		self.settings.append("<SETTING,SPEED,3,"+str(self.p3_speed_to_send)+",F,0.0,0.0,0.0>")
-		self.settings.append("<SETTING,ACCEL,3,"+str(self.p3_accel_to_send)+",F,0.0,0.0,0.0>")
-		self.settings.append("<SETTING,DELTA,3,"+str(self.p3_setup_jog_delta_to_send)+",F,0.0,0.0,0.0>")
+		# every pump's settings, converted in one go
+		gui_log.info("Sending all settings..")
+		self.send_command(self.controller.send_settings)
 
-		print("Sending all settings..")
-		thread = Thread(self.runTest, self.settings)
-		thread.finished.connect(lambda:self.thread_finished(thread))
-		thread.start()
-
-		self.ui.p1_setup_send_BTN.setStyleSheet("background-color: none")
-		self.ui.p2_setup_send_BTN.setStyleSheet("background-color: none")
-		self.ui.p3_setup_send_BTN.setStyleSheet("background-color: none")
+		for n in self.pump_numbers():
+			self.send_pump_success(n)
 
 		self.ungrey_out_components()
 
@@ -1165,79 +1038,8 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 		value_per_sec = value_per_hour/60.0/60.0
 		return value_per_sec
 
-	def convert_displacement(self, displacement, units, syringe_area):
-		length = units.split("/")[0]
-		time = units.split("/")[1]
-		inp_displacement = displacement
-		# convert length first
-		if length == "mm":
-			displacement = self.mm2steps(displacement)
-		elif length == "mL":
-			displacement = self.mL2steps(displacement, syringe_area)
-		elif length == "µL":
-			displacement = self.uL2steps(displacement, syringe_area)
-
-		print('______________________________')
-		print("INPUT  DISPLACEMENT: " + str(inp_displacement) + ' ' + length)
-		print("OUTPUT DISPLACEMENT: " + str(displacement) + ' steps')
-		print('\n############################################################\n')
-		return displacement
-
-	def convert_speed(self, inp_speed, units, syringe_area):
-		length = units.split("/")[0]
-		time = units.split("/")[1]
-
-
-		# convert length first
-		if length == "mm":
-			speed = self.mm2steps(inp_speed)
-		elif length == "mL":
-			speed = self.mL2steps(inp_speed, syringe_area)
-		elif length == "µL":
-			speed = self.uL2steps(inp_speed, syringe_area)
-
-
-		# convert time next
-		if time == "s":
-			pass
-		elif time == "min":
-			speed = self.permin2persec(speed)
-		elif time == "hr":
-			speed = self.perhour2persec(speed)
-
-		
-
-		print("INPUT  SPEED: " + str(inp_speed) + ' ' + units)
-		print("OUTPUT SPEED: " + str(speed) + ' steps/s')
-		return speed
-
-	def convert_accel(self, accel, units, syringe_area):
-		length = units.split("/")[0]
-		time = units.split("/")[1]
-		inp_accel = accel
-		accel = accel
-
-		# convert length first
-		if length == "mm":
-			accel = self.mm2steps(accel)
-		elif length == "mL":
-			accel = self.mL2steps(accel, syringe_area)
-		elif length == "µL":
-			accel = self.uL2steps(accel, syringe_area)
-
-		# convert time next
-		if time == "s":
-			pass
-		elif time == "min":
-			accel = self.permin2persec(self.permin2persec(accel))
-		elif time == "hr":
-			accel = self.perhour2persec(self.perhour2persec(accel))
-
-		print('______________________________')
-		print("INPUT  ACCEL: " + str(inp_accel) + ' ' + units + '/' + time)
-		print("OUTPUT ACCEL: " + str(accel) + ' steps/s/s')
-		return accel
-
+	# convert_displacement/speed/accel live in poseidon/units.py now, as a
+	# (syringe, unit) factor table that also takes numpy arrays
 
 	'''
 		Syringe Volume (mL)	|		Syringe Area (mm^2)
@@ -1255,136 +1057,31 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 
 
 
-	#====================================== Reading and Writing to Arduino
-
-	def sendToArduino(self, sendStr):
-		self.serial.write(sendStr.encode())
-		self.serial.flushInput()
-
-
-	def recvPositionArduino(self):
-		startMarker = self.startMarker
-		midMarker = self.midMarker
-		endMarker = self.endMarker
-
-		ck = ""
-		x = "z" # any value that is not an end- or startMarker
-	  
-		# wait for the start character
-		while  ord(x) != startMarker: 
-			x = self.serial.read()
-		  
-		# save data until the end marker is found
-		while ord(x) != endMarker:
-			if ord(x) == midMarker:
-				print(ck)
-				self.ui.p1_absolute_DISP.display(ck)
-				ck = ""
-				x = self.serial.read()
-
-			if ord(x) != startMarker:
-		    #print(x)
-				ck = ck + x.decode()
-
-			x = self.serial.read()
-
-		return(ck)
-
-	#============================
-
-
-	def runTest(self, td):
-		numLoops = len(td)
-		waitingForReply = False
-		n = 0
-
-		while n < numLoops:
-			teststr = td[n]
-
-			if waitingForReply == False:
-				self.sendToArduino(teststr)
-				print("Sent from PC -- " + teststr)
-				waitingForReply = True
-
-			if waitingForReply == True:
-
-				while self.serial.inWaiting() == 0:
-					pass
-
-				#dataRecvd = self.recvFromArduino2()
-				print("Reply Received -- ")
-				n += 1
-				waitingForReply = False
-
-
-			time.sleep(0.1)
-		print("Send and receive complete\n\n")
-
-	def send_single_command(self, command):
-		waiting_for_reply = False
-		if waiting_for_reply == False:
-			self.sendToArduino(command)
-			print("Sent from PC -- STR " + command)
-			waiting_for_reply = True
-		if waiting_for_reply == True:
-			while self.serial.inWaiting() == 0:
-				pass
-			#data_received = self.recvFromArduino2()
-			data_received = "from other func"
-			print("Reply Received -- " + data_received)
-			waiting_for_reply = False
-			print("=============================\n\n")
-			print("Sent a single command")
-
-
-	def listening(self):
-		startMarker = self.startMarker
-		midMarker = self.midMarker
-		endMarker = self.endMarker
-		posMarker = ord('?')
-		i = 0
-
-		while (True):
-			self.serial.flushInput()
-			x = "z"
-			ck = ""
-			isDisplay = "asdf"
-			while self.serial.inWaiting() == 0:
-				pass
-			while  not x or ord(x) != startMarker: 
-				x = self.serial.read()
-				#if ord(x) == posMarker:
-				#	return self.get_position()
-			while ord(x) != endMarker:
-				if ord(x) == midMarker:
-					i += 1
-					print(ck)
-					#isDisplay = ck
-					#if i % 100 == 0:
-					#	self.ui.p1_absolute_DISP.display(ck)
-					ck = ""
-					x = self.serial.read()
-
-				if ord(x) != startMarker:
-					ck = ck + x.decode()
-
-				x = self.serial.read()
-				# TODO
-			#if isDisplay == "START":
-			#	print("This is ck: " + ck)
-				#motorID = int(ck)
-				#self.is_p1_running = True
-				#run thread(self.display_position, motorID)
-
-				#toDisp = self.steps2mm(float(ck))
-				#print("Pump num " + toDisp + " is now running.")i
-				#self.ui.p1_absolute_DISP.display(toDisp)
-				#isDisplay = ""
-
-			#self.serial.flushInput()
-			#print(self.serial.read(self.serial.inWaiting()).decode('ascii'))
-			print(ck)
-			print("\n")
+	# Call one of the controller's commands, which hands them to its command worker.
+	# Returns right away, the replies are logged by commands_done. Urgent commands
+	# skip the queue and are written from here, see CommandWorker.submit
+	def send_command(self, command, *args):
+		try:
+			job = command(*args)
+		except controller.NotConnected:
+			self.statusBar().showMessage("Please connect to the board first.")
+			return None
+		except transport.QueueFull:
+			self.statusBar().showMessage("Controller is busy, command dropped.")
+			return None
+		job.add_done_callback(self.commands_done)
+		return job
+
+	# Runs on whichever thread resolved the last reply, so only log here
+	def commands_done(self, job):
+		if job.cancelled():
+			commands_log.info("Dropped -- %s", ", ".join(job.commands))
+			return
+		if job.exception() is not None:
+			commands_log.warning("Board disconnected before all replies were received")
+			return
+		for teststr, reply in zip(job.commands, job.result()):
+			commands_log.info("Sent from PC -- %s -- Reply Received -- %s", teststr, reply)
 
 	# TODO
 	# def display_position(self, motorID):
@@ -1401,36 +1098,25 @@ class MainWindow(QtWidgets.QMainWindow, poseidon_controller_gui.Ui_MainWindow):
 
 
 
-	def get_position(self):
-		ck = ""
-		x = self.serial.read()
-
-		while ord(x) != self.endMarker:
-			if ord(x) == self.midMarker:
-				print(ck)
-				ck = ""
-				x = self.serial.read()
-			ck = ck + x.decode()
-			x = self.serial.read()
-		print(ck)
-		return (ck)
-
-
-
 	def closeEvent(self, event):
+		self.port_watcher.stop()
+		self.stop_camera()
+		if self.image_writer is not None:
+			# write out what was captured before going
+			self.image_writer.close(wait=True)
 		try:
-			self.global_listener_thread.stop()
-			self.serial.close()
-			#self.threadpool.end()
-			
+			self.close_serial()
 		except AttributeError:
 			pass
+		log.shutdown()
 		sys.exit()
 
 # I feel better having one of these
 def main():
 	# a new app instance
 	app = QtWidgets.QApplication(sys.argv)
+	# POSEIDON_LOG=debug shows every frame from the board as well
+	log.setup()
 	window = MainWindow()
 	window.setWindowTitle("Poseidon Pumps Controller - Pachter Lab Caltech 2018")
 	window.show()
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+'''
+Poseidon pumps host side library.
+
+Everything in here is free of PyQt5, and OpenCV is only imported when a
+camera is opened (poseidon/camera.py), so it can be imported by gui.py, by
+scripts and by the benchmarks without dragging the GUI along.
+'''
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+'''python -m poseidon, see poseidon/cli.py'''
+
+import sys
+
+from poseidon import cli
+
+sys.exit(cli.main())
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+'''
+Compact binary encoding of the <MODE,SETTING,ID,VALUE,DIR,p1,p2,p3> commands.
+
+A text command is about 40 bytes, which is most of the firmware's 64 byte
+receive buffer, and costs the board a strtok/strcpy/atof pass per field.
+The binary frame carries the same information in 6 to 18 bytes:
+
+	A5 | opcode | seq | motors | payload | crc16
+
+- opcode: one byte per (MODE, SETTING) pair, see OPCODES
+- seq: low byte of the host's sequence id, echoed back in <ACK|seq>
+- motors: bitmask, bit 0 is pump 1 (motorID 13 -> 0b101)
+- payload, little endian and fixed by the opcode:
+  SETTING value float32 | RUN/JOG steps per pump 3 x int32, signed, so
+  every pump can have its own direction | JOG ALL direction int8 | nothing
+- crc16: CRC-16/CCITT-FALSE over opcode..payload, little endian
+
+Binary mode is negotiated. The host sends the text command HELLO; a board
+that speaks this encoding answers <PROTO|BIN|1> ahead of the usual echo and
+from then on accepts binary frames as well as text. serialCOM_v0.1 just
+echoes HELLO, so the host keeps sending text. Board to host traffic stays
+<...> text, binary commands are answered with a short <ACK|seq> frame
+instead of the replyToPC() echo.
+'''
+
+import binascii
+import struct
+
+from poseidon import protocol
+
+VERSION = 1
+SYNC = 0xA5
+
+# Sent as text, in whatever mode the link is in
+HELLO = "<PROTO,BIN,0,%d,F,0.0,0.0,0.0>" % VERSION
+OFFER = "PROTO|BIN|%d" % VERSION
+
+OPCODES = {
+	('SETTING', 'SPEED'): 0x01,
+	('SETTING', 'ACCEL'): 0x02,
+	('SETTING', 'DELTA'): 0x03,
+	('RUN', 'DIST'): 0x10,
+	('JOG', 'ONE'): 0x11,
+	('JOG', 'FEW'): 0x12,
+	('JOG', 'ALL'): 0x13,
+	('PAUSE', None): 0x20,
+	('RESUME', None): 0x21,
+	('STOP', None): 0x22,
+	('ZERO', None): 0x23,
+}
+NAMES = dict((opcode, name) for name, opcode in OPCODES.items())
+
+HEADER = struct.Struct('<BBBB')
+CRC = struct.Struct('<H')
+VALUE = struct.Struct('<f')
+STEPS = struct.Struct('<3i')
+DIRECTION = struct.Struct('<b')
+
+
+class NoOpcode(ValueError):
+	'''A command the binary encoding has no opcode for, it goes out as text'''
+	pass
+
+
+def payload_struct(opcode):
+	kind = opcode & 0xF0
+	if kind == 0x00:
+		return VALUE
+	if opcode == OPCODES[('JOG', 'ALL')]:
+		return DIRECTION
+	if kind == 0x10:
+		return STEPS
+	return None
+
+
+def frame_size(opcode):
+	'''Bytes in a frame with this opcode, None if the opcode is unknown'''
+	if opcode not in NAMES:
+		return None
+	payload = payload_struct(opcode)
+	return HEADER.size + (payload.size if payload else 0) + CRC.size
+
+
+def motor_mask(motor_id):
+	'''motorID as the firmware reads it (123, 13, 2, ...) -> bitmask'''
+	mask = 0
+	for digit in str(motor_id):
+		if digit in '123':
+			mask |= 1 << (int(digit) - 1)
+	return mask
+
+
+def motor_id(mask):
+	'''bitmask -> motorID, 0b101 -> 13'''
+	return protocol.atoi(''.join(str(i + 1) for i in range(3) if mask & (1 << i)))
+
+
+def crc16(data):
+	return binascii.crc_hqx(data, 0xFFFF)
+
+
+def pack(opcode, seq, motors, *payload):
+	body = HEADER.pack(SYNC, opcode, seq & 0xFF, motors)
+	layout = payload_struct(opcode)
+	if layout is not None:
+		body += layout.pack(*payload)
+	return body + CRC.pack(crc16(body[1:]))
+
+
+def encode_command(command, seq=0):
+	'''
+	Text command -> binary frame. Raises NoOpcode for anything without an
+	opcode, which is then sent as text, and ValueError for values the frame
+	cannot carry (steps beyond int32, a value beyond float32).
+	'''
+	fields = command_fields(command)
+	mode, setting = fields[0], fields[1]
+	opcode = OPCODES.get((mode, setting), OPCODES.get((mode, None)))
+	if opcode is None:
+		raise NoOpcode("No opcode for %s,%s" % (mode, setting))
+	motors = motor_mask(protocol.atoi(fields[2]))
+	layout = payload_struct(opcode)
+	sign = -1 if fields[4] == 'B' else 1
+	try:
+		if layout is VALUE:
+			return pack(opcode, seq, motors, protocol.atof(fields[3]))
+		if layout is DIRECTION:
+			return pack(opcode, seq, motors, sign)
+		if layout is STEPS:
+			return pack(opcode, seq, motors, *[sign * int(round(protocol.atof(p))) for p in fields[5:8]])
+	except (struct.error, OverflowError, ValueError) as e:
+		raise ValueError("%s does not fit a binary frame: %s" % (command, e))
+	return pack(opcode, seq, motors)
+
+
+def command_fields(command):
+	fields = protocol.command_fields(command)
+	return fields + [''] * (8 - len(fields))
+
+
+def encoded_size(command):
+	'''Bytes command takes on the wire in binary mode'''
+	fields = command_fields(command)
+	opcode = OPCODES.get((fields[0], fields[1]), OPCODES.get((fields[0], None)))
+	if opcode is None:
+		return len(command)
+	return frame_size(opcode)
+
+
+def decode(frame):
+	'''
+	Binary frame -> fields dict shaped like the firmware's parsed command
+	(mode, setting, motorID, value, dir, p1, p2, p3) plus seq. Steps come back
+	signed with dir F. Raises ValueError on a bad CRC or unknown opcode.
+	'''
+	frame = bytes(frame)
+	if len(frame) < HEADER.size + CRC.size or frame[0] != SYNC:
+		raise ValueError("Not a binary frame")
+	sync, opcode, seq, motors = HEADER.unpack_from(frame)
+	if frame_size(opcode) != len(frame):
+		raise ValueError("Bad length for opcode 0x%02x" % opcode)
+	crc, = CRC.unpack_from(frame, len(frame) - CRC.size)
+	if crc != crc16(frame[1:-CRC.size]):
+		raise ValueError("CRC mismatch")
+	mode, setting = NAMES[opcode]
+	fields = {'mode': mode, 'setting': setting or 'BLAH', 'motorID': motor_id(motors),
+		'value': 0.0, 'dir': 'F', 'p1': 0.0, 'p2': 0.0, 'p3': 0.0, 'seq': seq}
+	layout = payload_struct(opcode)
+	if layout is VALUE:
+		fields['value'], = VALUE.unpack_from(frame, HEADER.size)
+	elif layout is DIRECTION:
+		sign, = DIRECTION.unpack_from(frame, HEADER.size)
+		fields['dir'] = 'B' if sign < 0 else 'F'
+	elif layout is STEPS:
+		fields['p1'], fields['p2'], fields['p3'] = [float(s) for s in STEPS.unpack_from(frame, HEADER.size)]
+	return fields
+
+
+def to_command(fields):
+	'''decode() result -> the text command it stands for (without markers)'''
+	return "%s,%s,%d,%s,%s,%s,%s,%s" % (fields['mode'], fields['setting'], fields['motorID'],
+		fields['value'], fields['dir'], fields['p1'], fields['p2'], fields['p3'])
+
+
+def parse_ack(frame):
+	'''ACK|12 -> 12, None for any other frame'''
+	if not isinstance(frame, str):
+		frame = protocol.decode(frame)
+	if not frame.startswith('ACK|'):
+		return None
+	return protocol.atoi(frame[4:])
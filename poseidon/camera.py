@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+'''
+The microscope camera, through OpenCV.
+
+OpenCV is only imported when a camera is first opened or an image saved
+(importing it takes seconds and tens of MB on a Pi), so importing this
+module, and gui.py with it, costs nothing for sessions that never use the
+Camera tab.
+
+CaptureThread reads the camera on its own thread, at whatever rate the
+camera delivers, into a LatestFrame slot. Whoever displays the frames takes
+the newest one when it is ready for it; frames it was too slow for are
+simply replaced, never queued.
+'''
+
+import collections
+import threading
+import time
+
+_cv2 = None
+
+
+def cv2():
+	'''The cv2 module, imported on first use'''
+	global _cv2
+	if _cv2 is None:
+		import cv2 as _module
+		# note, had to use version 3.2.0.8 otherwise it had its own
+		# pyqt packages that conflicted with mine
+		_cv2 = _module
+	return _cv2
+
+
+def loaded():
+	'''True once something has needed OpenCV'''
+	return _cv2 is not None
+
+
+# ###############
+# CAMERA : CAMERA
+# ###############
+class Camera(object):
+	'''
+	One cv2.VideoCapture. read() returns the next frame mirrored the way the
+	microscope image is shown (BGR, like everything from OpenCV), or None if
+	the camera did not deliver one.
+	'''
+
+	def __init__(self, index=0, width=400, height=800, mirror=True):
+		self.index = index
+		self.mirror = mirror
+		cv = cv2()
+		self.capture = cv.VideoCapture(index)
+		#TODO check the native resolution of the camera and scale the size down here
+		self.capture.set(cv.CAP_PROP_FRAME_HEIGHT, height)
+		self.capture.set(cv.CAP_PROP_FRAME_WIDTH, width)
+
+	def read(self):
+		ok, image = self.capture.read()
+		if not ok:
+			return None
+		if self.mirror:
+			image = cv2().flip(image, 1)
+		return image
+
+	def close(self):
+		self.capture.release()
+
+
+def save(path, image, mirror=False):
+	'''Write image (BGR) to path, the format comes from the extension'''
+	if mirror:
+		image = cv2().flip(image, 1)
+	return cv2().imwrite(path, image)
+
+
+# image is the BGR frame, seq counts frames from 1, time is time.monotonic() when it was read
+Frame = collections.namedtuple('Frame', 'seq time image')
+
+
+# ####################
+# CAMERA : LATEST FRAME
+# ####################
+class LatestFrame(object):
+	'''
+	Single slot for one writer and one reader, without a lock: put() just
+	replaces the reference to the newest Frame, take() hands it out once.
+	put() returns True when the reader had taken everything before it, which
+	is when the reader needs telling; otherwise a notification is already on
+	its way and the reader will find this newer frame when it looks.
+	'''
+
+	def __init__(self):
+		self.latest = None
+		self.seq = 0
+		self.taken = 0
+		self.frames_taken = 0
+
+	def put(self, image, when=None):
+		caught_up = self.taken == self.seq
+		self.seq += 1
+		self.latest = Frame(self.seq, time.monotonic() if when is None else when, image)
+		return caught_up
+
+	def take(self):
+		'''The newest frame if it has not been taken yet, else None'''
+		frame = self.latest
+		if frame is None or frame.seq == self.taken:
+			return None
+		self.taken = frame.seq
+		self.frames_taken += 1
+		return frame
+
+	@property
+	def dropped(self):
+		'''Frames that were replaced before anyone took them'''
+		return self.taken - self.frames_taken
+
+
+# #####################
+# CAMERA : CAPTURE THREAD
+# #####################
+class CaptureThread(object):
+	'''
+	Reads camera on a thread of its own into frames (a LatestFrame) and calls
+	on_frame() from that thread when a frame comes in and the reader is not
+	already behind. The camera is released when the thread finishes.
+
+	The reader has to look at frames again a little after taking one (the
+	GUI does, once per screen refresh): a frame put while it was taking the
+	previous one does not notify.
+	'''
+
+	def __init__(self, camera, on_frame=None):
+		self.camera = camera
+		self.on_frame = on_frame
+		self.frames = LatestFrame()
+		self.running = True
+		self.thread = threading.Thread(target=self.run, name='poseidon-camera')
+		self.thread.daemon = True
+
+	def start(self):
+		self.thread.start()
+
+	def run(self):
+		try:
+			while self.running:
+				# blocks until the camera has a frame
+				image = self.camera.read()
+				if image is None:
+					# unplugged or no camera at all, do not spin
+					time.sleep(0.1)
+					continue
+				if self.frames.put(image) and self.on_frame is not None and self.running:
+					self.on_frame()
+		finally:
+			self.camera.close()
+
+	def stop(self, timeout=1.0):
+		self.running = False
+		self.thread.join(timeout)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+'''
+Command line client of poseidon.controller, for scripted experiments and
+headless Pis.
+
+	python -m poseidon ports
+	python -m poseidon --port /dev/ttyUSB0 run --pump 1 --syringe "BD 10 mL" --units mL/hr --speed 2 --accel 1 --amount 0.5
+	python -m poseidon --port /dev/ttyUSB0 jog + --pump 1 --pump 2 --jog-delta 0.1
+	python -m poseidon --port /dev/ttyUSB0 stop
+	python -m poseidon --port /dev/ttyUSB0 --record runs/test.plog run --amount 0.5
+	python -m poseidon log runs/test.plog
+	python -m poseidon replay runs/test.plog --simulator --speed 4
+
+Opening the port resets most boards, so every invocation waits for the
+board to be ready and sends the selected pumps' settings before it moves
+them. run and jog return once the motors have stopped, Ctrl-C stops them
+early.
+'''
+
+import argparse
+import concurrent.futures
+import sys
+
+from poseidon import controller, log, ports, replay, runlog, units
+
+
+def positive(text):
+	'''argparse type for amounts, the direction is given separately'''
+	value = float(text)
+	if not 0 < value < float('inf'):
+		raise argparse.ArgumentTypeError("%s is not a number > 0" % text)
+	return value
+
+
+def pump_options(parser):
+	parser.add_argument('--pump', type=int, action='append', dest='pumps', metavar='N',
+		help='pump to use, can be given more than once (default: 1)')
+	parser.add_argument('--syringe', choices=units.SYRINGE_OPTIONS)
+	parser.add_argument('--units', choices=units.UNITS)
+	parser.add_argument('--speed', type=float)
+	parser.add_argument('--accel', type=float)
+	parser.add_argument('--jog-delta', type=float, dest='jog_delta')
+
+
+def make_parser():
+	parser = argparse.ArgumentParser(prog='python -m poseidon', description="Poseidon pumps without the GUI")
+	parser.add_argument('--port', help='serial port of the board, see the ports command')
+	parser.add_argument('--baudrate', type=int, default=controller.BAUD_RATE)
+	parser.add_argument('--timeout', type=float, default=controller.READY_TIMEOUT,
+		help='seconds to wait for the board to come out of reset')
+	parser.add_argument('--text', action='store_true', help='do not offer the binary command encoding')
+	parser.add_argument('--no-reset', action='store_true',
+		help='the board does not reset when the port is opened, do not wait for it')
+	parser.add_argument('--record', metavar='PATH', help='write a run log of everything sent and received, see the log command')
+	parser.add_argument('-v', '--verbose', action='store_true', help='log every command and frame to stderr')
+	commands = parser.add_subparsers(dest='command', metavar='command')
+	commands.required = True
+
+	commands.add_parser('ports', help='list the serial ports a board could be on')
+
+	show = commands.add_parser('log', help='show a run log written with --record')
+	show.add_argument('path')
+	show.add_argument('--all', action='store_true', help='every record, DISP samples included')
+
+	again = commands.add_parser('replay', help='send the commands of a run log again, timed like the first time')
+	again.add_argument('path')
+	again.add_argument('--speed', type=float, default=1.0, help='2 is twice as fast, 0 as fast as possible (default: 1)')
+	again.add_argument('--simulator', action='store_true', help='replay against poseidon.simulator instead of --port')
+	again.add_argument('--wait', type=float, default=30.0, help='seconds to wait for the last replies')
+
+	settings = commands.add_parser('settings', help="send the pumps' speed, accel and jog delta")
+	pump_options(settings)
+
+	run = commands.add_parser('run', help='move the pumps by an amount')
+	pump_options(run)
+	run.add_argument('--amount', type=positive, required=True, help='in the length unit of --units, > 0')
+
+	jog = commands.add_parser('jog', help='move the pumps by their jog delta')
+	jog.add_argument('direction', choices=['+', '-'])
+	pump_options(jog)
+
+	for name, help in [('pause', 'pause the pumps'), ('resume', 'resume paused pumps')]:
+		command = commands.add_parser(name, help=help)
+		command.add_argument('--pump', type=int, action='append', dest='pumps', metavar='N')
+	commands.add_parser('stop', help='stop every pump')
+	commands.add_parser('zero', help='zero the positions')
+	return parser
+
+
+def configure(board, args):
+	'''Apply the pump options to every selected pump, returns their ids'''
+	ids = sorted(set(args.pumps or [1]))
+	for n in ids:
+		if not 1 <= n <= len(board.pumps):
+			raise SystemExit("There is no pump %d" % n)
+	inputs = dict((name, getattr(args, name, None)) for name in ('syringe', 'units', 'speed', 'accel', 'jog_delta', 'amount'))
+	inputs = dict((name, value) for name, value in inputs.items() if value is not None)
+	for n in ids:
+		board.configure(n, active=True, **inputs)
+	return ids
+
+
+def print_replies(job):
+	for command, reply in zip(job.commands, job.result()):
+		print("Sent from PC -- " + command)
+		print("Reply Received -- " + str(reply))
+
+
+def show_log(args):
+	try:
+		run = runlog.RunLog(args.path)
+	except (OSError, ValueError) as e:
+		raise SystemExit(str(e))
+	print("%d records over %.3f s, %s" % (len(run), run.duration,
+		", ".join("%d %s" % (count, kind) for kind, count in sorted(run.summary().items()))))
+	kinds = None if args.all else [kind for kind in runlog.KINDS if kind != runlog.DISP]
+	for t, kind, pump, value in run.events(kinds):
+		if kind == runlog.DISP:
+			value = "DISP%d|%d" % (pump, value)
+		print("%10.4f %-5s %s" % (t, runlog.KINDS[kind], value))
+	run.close()
+
+
+def main(argv=None):
+	args = make_parser().parse_args(argv)
+	if args.command == 'ports':
+		for port in ports.PortScanner().scan():
+			print(port)
+		return 0
+	if args.command == 'log':
+		show_log(args)
+		return 0
+	run = simulated = None
+	if args.command == 'replay':
+		try:
+			run = runlog.RunLog(args.path)
+		except (OSError, ValueError) as e:
+			raise SystemExit(str(e))
+		if args.simulator:
+			from poseidon import simulator
+			simulated = simulator.FirmwareSimulator(args.baudrate, boot_time=0.2)
+			args.port = simulated.start()
+			args.no_reset = False
+	if not args.port:
+		raise SystemExit("--port is needed for %s, see python -m poseidon ports" % args.command)
+
+	recorder = None
+	if args.record:
+		try:
+			recorder = runlog.Recorder(args.record)
+		except OSError as e:
+			raise SystemExit("Cannot record to %s: %s" % (args.record, e))
+		recorder.mark(" ".join(sys.argv[1:] if argv is None else argv))
+	log.setup('DEBUG' if args.verbose else 'WARNING')
+	board = controller.Controller(baudrate=args.baudrate)
+	if recorder is not None:
+		recorder.attach(board)
+	try:
+		board.connect(args.port, args.timeout, negotiate=not args.text, reset=not args.no_reset)
+	# negotiate() times out with concurrent.futures.TimeoutError, which is
+	# only the builtin TimeoutError from Python 3.11 on
+	except (OSError, TimeoutError, concurrent.futures.TimeoutError) as e:
+		log.shutdown()
+		if recorder is not None:
+			recorder.close()
+		if simulated is not None:
+			simulated.stop()
+		raise SystemExit("Cannot connect to board: %s" % (str(e) or "no answer after %.1f s" % args.timeout))
+	try:
+		if args.command in ('settings', 'run', 'jog'):
+			ids = configure(board, args)
+			print_replies(board.send_settings(ids))
+			if args.command == 'run':
+				job = board.run(ids)
+			elif args.command == 'jog':
+				job = board.jog('F' if args.direction == '+' else 'B', ids)
+			else:
+				return 0
+			print_replies(job)
+		elif args.command == 'replay':
+			session = replay.Replay(run, board, args.speed, args.wait)
+			session.run()
+			for line in session.report():
+				print(line)
+		elif args.command in ('pause', 'resume'):
+			ids = sorted(set(args.pumps or range(1, len(board.pumps) + 1)))
+			print_replies(getattr(board, args.command)(ids))
+		else:
+			print_replies(getattr(board, args.command)())
+	except KeyboardInterrupt:
+		# leave nothing moving behind
+		board.stop()
+		return 1
+	finally:
+		board.close()
+		if recorder is not None:
+			recorder.close()
+		if simulated is not None:
+			simulated.stop()
+		log.shutdown()
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
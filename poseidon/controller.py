@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+'''
+Driving the pumps without the GUI.
+
+Controller is everything MainWindow used to do between its buttons and the
+serial port: it opens the board, waits for it to come out of reset, offers
+the binary encoding, keeps the per pump settings (pumps.PumpBank) and turns
+connect / configure / run / pause / resume / stop / jog into the same
+<MODE,SETTING,ID,VALUE,DIR,p1,p2,p3> commands the GUI has always sent.
+
+	from poseidon.controller import Controller
+
+	board = Controller()
+	board.connect('/dev/ttyUSB0')
+	board.configure(1, syringe="BD 10 mL", units="mL/hr", speed=2.0, accel=1.0, amount=0.5, active=True)
+	board.send_settings().result()
+	board.run().result()		# the RUN echo comes back when the motors stop
+	board.close()
+
+Like the rest of the package it never imports PyQt5 or OpenCV, so it starts
+quickly and runs on a headless Pi. gui.py is a client of this class, see
+python -m poseidon --help for the command line one.
+
+Every command method returns the CommandWorker job, a Future for the list of
+replies. Frames the board sends on its own (DISP positions, ...) go to the
+callables in listeners, on the reader thread, and every command that goes
+out to the ones in command_listeners; both are logged at DEBUG too, see
+poseidon.log. self.positions (pumps.Positions) follows the pumps as they
+move.
+'''
+
+import threading
+
+import serial
+
+from poseidon import log, protocol, pumps, transport
+
+frames_log = log.get(log.FRAMES)
+commands_log = log.get(log.COMMANDS)
+
+BAUD_RATE = 230400
+# serialCOM_v0.1 takes about 2 s to print <Arduino is ready> after the reset
+READY_TIMEOUT = 5.0
+
+
+class NotConnected(Exception):
+	pass
+
+
+def open_port(port, baudrate=BAUD_RATE, timeout=1):
+	'''The board's serial settings, 8N1'''
+	s = serial.Serial()
+	s.port = port
+	s.baudrate = baudrate
+	s.parity = serial.PARITY_NONE
+	s.stopbits = serial.STOPBITS_ONE
+	s.bytesize = serial.EIGHTBITS
+	s.timeout = timeout
+	s.open()
+	return s
+
+
+def motor_ids(ids):
+	'''[1, 3] -> "13", the motorID field the firmware reads one digit per pump from'''
+	return "".join(map(str, ids))
+
+
+# ####################
+# CONTROLLER : COMMANDS
+# ####################
+def pause_command(ids):
+	return "<PAUSE,BLAH," + motor_ids(ids) + ",BLAH,F,0.0,0.0,0.0>"
+
+
+def resume_command(ids):
+	return "<RESUME,BLAH," + motor_ids(ids) + ",BLAH,F,0.0,0.0,0.0>"
+
+
+def zero_command():
+	return "<ZERO,BLAH,BLAH,BLAH,F,0.0,0.0,0.0>"
+
+
+def stop_command():
+	return "<STOP,BLAH,BLAH,BLAH,F,0.0,0.0,0.0>"
+
+
+# ######################
+# CONTROLLER : CONTROLLER
+# ######################
+class Controller(object):
+	'''
+	One board and its pumps. open() starts talking to the board and returns
+	straight away (transport.ready tells when it is up), connect() is the
+	blocking version for scripts. Settings live in self.pumps whether or not
+	a board is connected, commands raise NotConnected until one is.
+	'''
+
+	def __init__(self, pump_count=3, baudrate=BAUD_RATE):
+		self.pumps = pumps.PumpBank(pump_count)
+		self.positions = pumps.Positions(pump_count)
+		self.baudrate = baudrate
+		self.serial = None
+		self.transport = None
+		self.worker = None
+		self.reader = None
+		self.listeners = [self.positions.frame_received]
+		self.command_listeners = [self.positions.command_sent]
+
+	@property
+	def connected(self):
+		return self.transport is not None and self.transport.running
+
+	# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	# connecting
+	# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	def open(self, port):
+		'''
+		Open port and start the reader and command threads. Opening resets
+		most Arduinos, the returned transport.ready Future resolves once the
+		board says it is ready. Anything sent before that is likely to be
+		lost in the reset.
+		'''
+		if self.transport is not None:
+			self.close()
+		self.serial = open_port(port, self.baudrate)
+
+		# Commands go out through the transport, which matches them with the replies
+		self.transport = transport.Transport(self.serial)
+		self.transport.write_listeners.append(self.command_sent)
+
+		# This thread always runs and listens to what the board sends
+		self.reader = threading.Thread(target=self.transport.read_forever, args=(self.frame_received,),
+			name='poseidon-reader')
+		self.reader.daemon = True
+		self.reader.start()
+
+		# One long lived thread sends everything, in order, through the transport
+		self.worker = transport.CommandWorker(self.transport)
+		self.worker.start()
+		return self.transport.ready
+
+	def connect(self, port, timeout=READY_TIMEOUT, negotiate=True, reset=True):
+		'''
+		open() and wait for the board, then settle on text or binary commands.
+		reset=False is for boards that do not reset when the port is opened
+		(auto reset cut or disabled), those never print the banner again.
+		'''
+		self.open(port)
+		try:
+			if reset:
+				self.transport.wait_ready(timeout)
+			if negotiate:
+				self.negotiate().result(timeout)
+		except Exception:
+			self.close()
+			raise
+		return self
+
+	def negotiate(self):
+		'''Future for whether the board took up the binary encoding, see Transport.negotiate'''
+		return self._transport().negotiate()
+
+	def close(self):
+		'''Stop the worker and the reader and close the port, nothing here waits on the board'''
+		if self.transport is None:
+			return
+		self.worker.stop()
+		self.transport.close()
+		if self.reader is not threading.current_thread():
+			self.reader.join()
+		self.serial.close()
+		self.serial = self.transport = self.worker = self.reader = None
+
+	def frame_received(self, frame):
+		frames_log.debug("%s", frame)
+		for listener in list(self.listeners):
+			listener(frame)
+
+	def command_sent(self, command):
+		commands_log.debug("Sent %s", command)
+		for listener in list(self.command_listeners):
+			listener(command)
+
+	def _transport(self):
+		if self.transport is None:
+			raise NotConnected("Not connected to a board")
+		return self.transport
+
+	# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	# settings
+	# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	def configure(self, pump, active=None, **inputs):
+		'''
+		Set pump's (1 based) inputs: syringe, units, speed, accel, jog_delta,
+		amount, and whether it is active. Nothing is sent, see send_settings().
+		Returns the inputs that changed.
+		'''
+		p = self.pumps[pump - 1]
+		if active is not None:
+			p.active = active
+		return p.update(**inputs)
+
+	def ids(self, ids=None):
+		'''ids, or the active pumps if None'''
+		return list(ids) if ids is not None else self.pumps.active_ids()
+
+	def submit(self, commands, urgent=False, discard_queued=True):
+		'''Hand commands to the command worker, see CommandWorker.submit'''
+		if self.worker is None:
+			raise NotConnected("Not connected to a board")
+		job = self.worker.submit(commands, urgent, discard_queued)
+		job.add_done_callback(self.job_done)
+		return job
+
+	def job_done(self, job):
+		# a move is answered once the motors have stopped
+		if job.cancelled() or job.exception() is not None:
+			return
+		for command in job.commands:
+			if protocol.is_motion(command):
+				self.positions.command_done(command)
+
+	def send_settings(self, ids=None):
+		'''SPEED, ACCEL and DELTA for the given pumps, all of them by default'''
+		return self.submit(self.pumps.settings_commands(ids))
+
+	# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	# motion
+	# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	def run(self, ids=None):
+		'''Move the pumps (the active ones by default) by their amount'''
+		ids = self.ids(ids)
+		if not ids:
+			raise ValueError("No pumps enabled.")
+		# p1, p2, p3 are always pump 1, 2 and 3's distances, motorID picks who moves
+		return self.submit([self.pumps.move_command(ids, self.pumps.amount_steps)])
+
+	def jog(self, direction="F", ids=None):
+		'''Move the pumps by their jog delta, direction F (+) or B (-)'''
+		ids = self.ids(ids)
+		if not ids:
+			raise ValueError("No pumps enabled.")
+		return self.submit([self.pumps.move_command(ids, self.pumps.jog_delta_steps, direction)])
+
+	# PAUSE and RESUME go out ahead of the queue but leave it alone,
+	# STOP goes out ahead of it and throws it away
+	def pause(self, ids=None):
+		return self.submit([pause_command(self.ids(ids))], urgent=True, discard_queued=False)
+
+	def resume(self, ids=None):
+		return self.submit([resume_command(self.ids(ids))], urgent=True, discard_queued=False)
+
+	def stop(self):
+		return self.submit([stop_command()], urgent=True)
+
+	def zero(self):
+		return self.submit([zero_command()])
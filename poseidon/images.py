@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+'''
+Writing camera frames to disk off the GUI thread.
+
+PNG compression of a full frame takes hundreds of ms on a Pi. ImageWriter
+encodes and writes on a few worker threads instead (cv2.imencode lets go
+of the GIL, so they really run side by side), with a bounded number of
+images waiting so a burst of captures cannot eat all the memory. When that
+is full, submit() waits for room or raises QueueFull, whichever the caller
+asked for, and the counters say how often that happened.
+
+Every image gets its own name: the capture time to the millisecond plus a
+sequence number, so names sort in capture order and two captures in the
+same second no longer overwrite each other.
+'''
+
+import concurrent.futures
+import datetime
+import itertools
+import os
+import threading
+
+from poseidon import camera
+
+# format -> (extension, cv2 IMWRITE_* compression parameter, its range)
+FORMATS = {
+	'png': ('.png', 'IMWRITE_PNG_COMPRESSION', (0, 9)),		# zlib level, higher is smaller and slower
+	'jpg': ('.jpg', 'IMWRITE_JPEG_QUALITY', (0, 100)),		# higher is bigger and better
+	'webp': ('.webp', 'IMWRITE_WEBP_QUALITY', (1, 100)),
+	'tiff': ('.tif', None, None),
+	'bmp': ('.bmp', None, None),
+}
+
+
+class QueueFull(Exception):
+	pass
+
+
+def encode_params(format, level=None):
+	'''cv2.imencode params for format at compression level (None: OpenCV's default)'''
+	extension, param, bounds = FORMATS[format]
+	if level is None or param is None:
+		return []
+	low, high = bounds
+	if not low <= level <= high:
+		raise ValueError("%s compression level %s is not in %d..%d" % (format, level, low, high))
+	return [getattr(camera.cv2(), param), int(level)]
+
+
+# ####################
+# IMAGES : IMAGE WRITER
+# ####################
+class ImageWriter(object):
+	'''
+	Writes images into directory on worker threads. submit() returns a
+	Future for the path written. At most maxsize images are waiting or being
+	written at once.
+
+	Counters, readable from any thread: queued (waiting or being written
+	right now), written, failed, waited (submits that found the queue full)
+	and peak (the most ever queued).
+	'''
+
+	def __init__(self, directory='images', format='png', level=None, workers=2, maxsize=16):
+		if format not in FORMATS:
+			raise ValueError("Unknown image format %r, use one of %s" % (format, ", ".join(sorted(FORMATS))))
+		self.directory = directory
+		self.format = format
+		self.extension = FORMATS[format][0]
+		self.params = encode_params(format, level)
+		self.maxsize = maxsize
+		self.slots = threading.BoundedSemaphore(maxsize)
+		self.pool = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='poseidon-images')
+		self.seq = itertools.count(1)
+		self.lock = threading.Lock()
+		self.queued = 0
+		self.written = 0
+		self.failed = 0
+		self.waited = 0
+		self.peak = 0
+
+	def name(self, when=None):
+		'''Next unique file name, when is the capture time (a datetime, default now)'''
+		when = when or datetime.datetime.now()
+		stamp = when.strftime("%Y-%m-%d %H_%M_%S") + ".%03d" % (when.microsecond // 1000)
+		return "%s_%06d%s" % (stamp, next(self.seq), self.extension)
+
+	def submit(self, image, name=None, mirror=False, timeout=None):
+		'''
+		Queue image (BGR numpy array) to be written as name, a unique name by
+		default. With the queue full this waits up to timeout seconds (None:
+		as long as it takes, 0: not at all) and then raises QueueFull. The
+		caller must not write to image afterwards.
+		'''
+		if not self.slots.acquire(blocking=False):
+			with self.lock:
+				self.waited += 1
+			if timeout == 0 or not self.slots.acquire(timeout=timeout):
+				raise QueueFull("%d images waiting to be written" % self.queued)
+		with self.lock:
+			self.queued += 1
+			self.peak = max(self.peak, self.queued)
+		path = os.path.join(self.directory, name or self.name())
+		try:
+			future = self.pool.submit(self.write, path, image, mirror)
+		except RuntimeError:
+			# closed
+			self.done(None)
+			raise
+		future.path = path
+		future.add_done_callback(self.done)
+		return future
+
+	def write(self, path, image, mirror=False):
+		cv2 = camera.cv2()
+		if mirror:
+			image = cv2.flip(image, 1)
+		ok, data = cv2.imencode(self.extension, image, self.params)
+		if not ok:
+			raise IOError("Could not encode %s" % path)
+		if not os.path.isdir(self.directory):
+			os.makedirs(self.directory, exist_ok=True)
+		# a half written file never has the real name
+		partial = path + ".part"
+		with open(partial, 'wb') as f:
+			f.write(data)
+		os.replace(partial, path)
+		return path
+
+	def done(self, future):
+		with self.lock:
+			self.queued -= 1
+			if future is not None:
+				if not future.cancelled() and future.exception() is None:
+					self.written += 1
+				else:
+					self.failed += 1
+		self.slots.release()
+
+	def close(self, wait=True):
+		'''Stop taking images, with wait write out the ones already queued first'''
+		self.pool.shutdown(wait=wait)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+'''
+Logging for the host side, on top of the standard logging module.
+
+Everything logs to a category, a logger under 'poseidon':
+
+- poseidon.frames: every frame the board sends on its own (DISP, ...), DEBUG
+- poseidon.commands: commands going out (DEBUG) and their replies (INFO)
+- poseidon.gui: what the buttons do
+
+setup() is for programs (gui.py, python -m poseidon), never for library
+code. It puts one AsyncHandler on the 'poseidon' logger: the calling thread
+only checks the level, the category's rate limit and drops the record into
+a bounded queue, a listener thread does the formatting and the writing.
+A console at 230400 baud worth of DISP frames then costs the reader thread
+next to nothing, and with the level above DEBUG the frames are not even
+formatted (pass arguments, log.debug("%s", frame), not a built string).
+
+RATES is messages per second and burst per category. A record over its
+category's rate is dropped and counted, the next one let through says how
+many went missing. The level can also come from the POSEIDON_LOG
+environment variable (debug, info, warning, ...).
+'''
+
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+FRAMES = 'poseidon.frames'
+COMMANDS = 'poseidon.commands'
+GUI = 'poseidon.gui'
+
+# category -> (messages per second, burst)
+RATES = {
+	FRAMES: (20.0, 50),
+	COMMANDS: (100.0, 200),
+}
+FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+QUEUE_SIZE = 10000
+
+_listener = None
+
+
+def get(category):
+	return logging.getLogger(category)
+
+
+# ####################
+# LOG : RATE LIMIT
+# ####################
+class RateLimit(logging.Filter):
+	'''
+	Token bucket per category: rates maps a logger name (or a parent of it)
+	to (messages per second, burst). Names without a rate pass untouched.
+	suppressed counts every record dropped so far.
+	'''
+
+	def __init__(self, rates):
+		super(RateLimit, self).__init__()
+		self.rates = dict(rates)
+		self.buckets = {}
+		self.lock = threading.Lock()
+		self.suppressed = 0
+
+	def rate(self, name):
+		while name:
+			if name in self.rates:
+				return self.rates[name]
+			name = name.rpartition('.')[0]
+		return None
+
+	def filter(self, record):
+		with self.lock:
+			bucket = self.buckets.get(record.name)
+			if bucket is None:
+				limit = self.rate(record.name)
+				if limit is None:
+					self.buckets[record.name] = bucket = False
+				else:
+					# [rate, burst, tokens, last refill, dropped since the last one through]
+					bucket = self.buckets[record.name] = [limit[0], limit[1], float(limit[1]), time.monotonic(), 0]
+			if not bucket:
+				return True
+			now = time.monotonic()
+			bucket[2] = min(bucket[1], bucket[2] + (now - bucket[3]) * bucket[0])
+			bucket[3] = now
+			if bucket[2] < 1.0:
+				bucket[4] += 1
+				self.suppressed += 1
+				return False
+			bucket[2] -= 1.0
+			dropped, bucket[4] = bucket[4], 0
+		if dropped:
+			record.msg = str(record.msg) + " [%d earlier messages suppressed]" % dropped
+		return True
+
+
+# ####################
+# LOG : ASYNC HANDLER
+# ####################
+class AsyncHandler(logging.handlers.QueueHandler):
+	'''
+	QueueHandler that leaves the formatting to the listener thread and drops
+	records (counting them in dropped) instead of blocking when the queue is
+	full.
+	'''
+
+	def __init__(self, queue):
+		super(AsyncHandler, self).__init__(queue)
+		self.dropped = 0
+
+	def prepare(self, record):
+		# the listener formats it, only a traceback has to be rendered here
+		if record.exc_info and not record.exc_text:
+			record.exc_text = logging.Formatter().formatException(record.exc_info)
+			record.exc_info = None
+		return record
+
+	def enqueue(self, record):
+		try:
+			self.queue.put_nowait(record)
+		except queue.Full:
+			self.dropped += 1
+
+
+def setup(level=None, rates=RATES, stream=None, format=FORMAT):
+	'''
+	Send the poseidon loggers to stream (stderr by default) from a thread of
+	their own, at level (a name or number, default $POSEIDON_LOG or INFO).
+	A name logging does not know means INFO, and a warning saying so.
+	Returns the AsyncHandler. Calling it again replaces the previous setup.
+	'''
+	global _listener
+	shutdown()
+	if level is None:
+		level = os.environ.get('POSEIDON_LOG') or 'INFO'
+	unknown = None
+	if isinstance(level, str):
+		# getLevelName() goes both ways, a known name gives its number
+		number = logging.getLevelName(level.strip().upper())
+		if isinstance(number, int):
+			level = number
+		else:
+			unknown, level = level, logging.INFO
+	# what FORMAT does not show is not looked up for every record either,
+	# see "Optimization" in the logging HOWTO
+	if not any(field in format for field in ('%(pathname', '%(filename', '%(module', '%(lineno', '%(funcName')):
+		logging._srcfile = None
+	logging.logThreads = '%(thread' in format
+	logging.logProcesses = '%(process' in format
+	logging.logMultiprocessing = '%(processName' in format
+	writer = logging.StreamHandler(stream or sys.stderr)
+	writer.setFormatter(logging.Formatter(format))
+	handler = AsyncHandler(queue.Queue(QUEUE_SIZE))
+	handler.addFilter(RateLimit(rates))
+	logger = logging.getLogger('poseidon')
+	logger.setLevel(level)
+	logger.propagate = False
+	logger.addHandler(handler)
+	_listener = logging.handlers.QueueListener(handler.queue, writer)
+	_listener.handler = handler
+	_listener.start()
+	if unknown is not None:
+		logger.warning("Log level %r is not one of debug, info, warning, error, critical, using info", unknown)
+	return handler
+
+
+def shutdown():
+	'''Write out whatever is still queued and stop the listener thread'''
+	global _listener
+	if _listener is None:
+		return
+	logging.getLogger('poseidon').removeHandler(_listener.handler)
+	_listener.stop()
+	_listener = None
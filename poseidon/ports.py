@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+'''
+Finding the serial port the pump controller is plugged into.
+
+Instead of opening every /dev/tty* node one after the other, candidates come
+from pyserial's list_ports (sysfs metadata on Linux, IOKit/SetupAPI on
+macOS/Windows) and only USB serial devices are kept. New candidates are
+probed concurrently with a short timeout and the result is cached on
+(device node, USB serial number), so a board that stays plugged in is only
+ever opened once. PortWatcher polls that cheap metadata in the background
+and reports what was plugged in or pulled out since the last look.
+'''
+
+import concurrent.futures
+import threading
+
+import serial
+import serial.tools.list_ports
+
+
+def candidates(usb_only=True):
+	'''ListPortInfo for every serial device worth probing'''
+	return [info for info in serial.tools.list_ports.comports()
+		if not usb_only or info.vid is not None]
+
+
+def probe(device, timeout=0.2):
+	'''True if the port can be opened'''
+	try:
+		s = serial.Serial(device, timeout=timeout, write_timeout=timeout)
+		s.close()
+		return True
+	except (OSError, serial.SerialException, ValueError):
+		return False
+
+
+# ###################
+# PORTS : PORT SCANNER
+# ###################
+class PortScanner(object):
+	'''
+	Probes candidate ports concurrently and remembers the result per
+	(device, serial_number). A board that was seen once is not opened again,
+	which also spares it the reset an open() causes on most Arduinos.
+	'''
+
+	def __init__(self, usb_only=True, probe_timeout=0.2, max_workers=8):
+		self.usb_only = usb_only
+		self.probe_timeout = probe_timeout
+		self.max_workers = max_workers
+		self.cache = {}
+		self.lock = threading.Lock()
+
+	def scan(self):
+		'''Sorted list of usable device names'''
+		infos = candidates(self.usb_only)
+		keys = [(info.device, info.serial_number) for info in infos]
+		with self.lock:
+			unknown = [key for key in keys if key not in self.cache]
+		if unknown:
+			with concurrent.futures.ThreadPoolExecutor(min(self.max_workers, len(unknown))) as pool:
+				results = pool.map(lambda key: probe(key[0], self.probe_timeout), unknown)
+				probed = dict(zip(unknown, results))
+			with self.lock:
+				self.cache.update(probed)
+		with self.lock:
+			# forget boards that are gone so a replug gets probed again
+			for key in list(self.cache):
+				if key not in keys:
+					del self.cache[key]
+			return sorted(device for device, serial_number in keys if self.cache.get((device, serial_number)))
+
+	def forget_failures(self):
+		'''Probe ports that could not be opened last time again on the next scan'''
+		with self.lock:
+			for key in [key for key, ok in self.cache.items() if not ok]:
+				del self.cache[key]
+
+
+# ##################
+# PORTS : PORT WATCHER
+# ##################
+class PortWatcher(object):
+	'''
+	Rescans every interval seconds on its own thread and calls
+	on_change(added, removed) with the device names that changed, the first
+	scan reporting everything as added. rescan() wakes it up early.
+	'''
+
+	def __init__(self, on_change, interval=1.0, scanner=None):
+		self.on_change = on_change
+		self.interval = interval
+		self.scanner = scanner or PortScanner()
+		self.ports = []
+		self.condition = threading.Condition()
+		self.rescan_requested = False
+		self.running = True
+		self.thread = threading.Thread(target=self.run, name='poseidon-ports')
+		self.thread.daemon = True
+
+	def start(self):
+		self.thread.start()
+
+	def rescan(self):
+		self.scanner.forget_failures()
+		with self.condition:
+			self.rescan_requested = True
+			self.condition.notify()
+
+	def run(self):
+		while self.running:
+			# a rescan() asked for from here on gets a scan of its own
+			with self.condition:
+				self.rescan_requested = False
+			ports = self.scanner.scan()
+			added = [port for port in ports if port not in self.ports]
+			removed = [port for port in self.ports if port not in ports]
+			self.ports = ports
+			if (added or removed) and self.running:
+				self.on_change(added, removed)
+			with self.condition:
+				if self.running and not self.rescan_requested:
+					self.condition.wait(self.interval)
+
+	def stop(self):
+		with self.condition:
+			self.running = False
+			self.condition.notify()
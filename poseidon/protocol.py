@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+'''
+The <...> framing used between the host and the serialCOM firmware.
+
+Every message in either direction is wrapped in a start marker '<' and an
+end marker '>'. Some firmware messages also split their payload with a mid
+marker, '|' for the <DISP1|n> position frames and ',' for the replyToPC echo.
+'''
+
+# Declaring start, mid, and end marker for talking to the Arduino
+START_MARKER = b'<'
+END_MARKER = b'>'
+MID_MARKER = b'|'
+
+# Anything longer than this without an end marker is line noise, not a frame.
+# replyToPC is the longest thing the firmware prints (about 150 bytes).
+MAX_FRAME_SIZE = 512
+
+# What setup() prints once the board is done resetting
+READY_BANNER = 'Arduino is ready'
+
+
+# ##########################
+# PROTOCOL : FRAME DECODER
+# ##########################
+class FrameDecoder(object):
+	'''
+	Incremental decoder for the <...> framing.
+
+	Bytes go in through feed() in whatever chunk sizes the port hands out,
+	complete frames come out of frames(). The frames are memoryview slices of
+	the internal bytearray so nothing is copied until the caller asks for it,
+	which also means a frame is only valid until the generator moves on.
+	Call bytes(frame) or decode(frame) to keep it.
+	'''
+
+	def __init__(self, start_marker=START_MARKER, end_marker=END_MARKER, max_frame_size=MAX_FRAME_SIZE):
+		self.start_marker = start_marker
+		self.end_marker = end_marker
+		self.max_frame_size = max_frame_size
+		self.buffer = bytearray()
+
+	def feed(self, data):
+		self.buffer += data
+
+	def frames(self):
+		buf = self.buffer
+		pos = 0
+		try:
+			while True:
+				start = buf.find(self.start_marker, pos)
+				if start < 0:
+					# No frame started, nothing worth keeping
+					pos = len(buf)
+					return
+				end = buf.find(self.end_marker, start + 1)
+				if end < 0:
+					# Partial frame, keep it for the next feed() unless it is garbage
+					if len(buf) - start > self.max_frame_size:
+						pos = len(buf)
+					else:
+						pos = start
+					return
+				# A second start marker before the end means the first frame was cut off
+				restart = buf.rfind(self.start_marker, start + 1, end)
+				if restart >= 0:
+					start = restart
+				pos = end + 1
+				with memoryview(buf) as view:
+					frame = view[start + 1:end]
+					try:
+						yield frame
+					finally:
+						frame.release()
+		finally:
+			del buf[:pos]
+
+	def read(self, port):
+		'''Read everything the port has buffered in one call (blocking for at least one byte) and return the frames generator.'''
+		self.feed(port.read(port.in_waiting or 1))
+		return self.frames()
+
+	def read_frame(self, port):
+		'''Block until the next complete frame arrives and return it as bytes.'''
+		while True:
+			for frame in self.frames():
+				return bytes(frame)
+			self.feed(port.read(port.in_waiting or 1))
+
+	def clear(self):
+		del self.buffer[:]
+
+
+def decode(frame):
+	return str(frame, 'ascii', 'replace')
+
+
+def split(frame, mid_marker=MID_MARKER):
+	'''Split a frame on its mid marker, e.g. DISP1|-1234 -> [DISP1, -1234]'''
+	return [decode(field) for field in bytes(frame).split(mid_marker)]
+
+
+# ##########################
+# PROTOCOL : COMMANDS/REPLIES
+# ##########################
+# Commands that move the steppers. The firmware keeps reading bytes while the
+# motors turn (getDataFromPC() runs inside the motion loops) but replyToPC()
+# only runs again once the motion is over, so their echo comes late.
+MOTION_MODES = ('RUN', 'RESUME', 'JOG')
+
+
+def command_fields(command):
+	'''<SETTING,SPEED,1,800.0,F,0.0,0.0,0.0> -> [SETTING, SPEED, 1, 800.0, F, 0.0, 0.0, 0.0]'''
+	return command.strip().lstrip('<').rstrip('>').split(',')
+
+
+def parse_reply(frame):
+	'''
+	Parse the echo replyToPC() prints after every command it executes:
+
+	<mode: SETTING ,setting: SPEED ,motorID: 1 ,value: 800.00 ,direction: F ,
+	 p1 optional: 0.00 ,p2 optional: 0.00 ,p3 optional: 0.00 ,Time 12>
+
+	Returns a dict keyed by the field names or None if the frame is something
+	else (DISP frames, the ready banner, ...).
+	'''
+	if not isinstance(frame, str):
+		frame = decode(frame)
+	if not frame.startswith('mode:'):
+		return None
+	reply = {}
+	for field in frame.split(' ,'):
+		if ':' in field:
+			key, value = field.split(':', 1)
+		else:
+			key, _, value = field.partition(' ')
+		reply[key.strip()] = value.strip()
+	return reply
+
+
+def atoi(text):
+	'''What the firmware's atoi() turns a motorID field into, e.g. BLAH -> 0, 12 -> 12'''
+	digits = ''
+	for c in text.strip():
+		if not c.isdigit():
+			break
+		digits += c
+	return int(digits) if digits else 0
+
+
+def atof(text):
+	'''What the firmware's atof() makes of a value field, e.g. BLAH -> 0.0, 12.5abc -> 12.5'''
+	text = text.strip()
+	for end in range(len(text), 0, -1):
+		try:
+			return float(text[:end])
+		except ValueError:
+			pass
+	return 0.0
+
+
+def reply_matches(command, reply):
+	'''True if reply is the firmware's echo of command'''
+	fields = command_fields(command)
+	if len(fields) < 3:
+		return False
+	return (reply.get('mode') == fields[0]
+		and reply.get('setting') == fields[1]
+		and atoi(reply.get('motorID', '')) == atoi(fields[2]))
+
+
+def is_motion(command):
+	return command_fields(command)[0] in MOTION_MODES
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+'''
+Pump state: what the user set (syringe, units, speed, ...) for every pump
+and what that comes to in steps for the firmware.
+
+PumpBank keeps the numbers for all N pumps in numpy arrays, one entry per
+pump, so settings for every pump convert in one multiplication. bank[i] is
+a Pump, a small view on entry i for code that deals with one pump at a time.
+
+The step values are worked out the first time they are asked for and kept
+until one of the inputs they depend on changes, so changing pump 2's speed
+only redoes pump 2's steps/s, and a syringe change followed by a units
+change in the same click is converted once, when the values are next used.
+
+Positions follows where the plungers are while they move, from the commands
+that go out and the frames that come back.
+'''
+
+import threading
+import time
+
+import numpy
+
+from poseidon import protocol, units
+
+# derived value -> (the input it scales, which units.factors() entry)
+# every one of them also depends on the pump's syringe and units
+DERIVED = {
+	'jog_delta_steps': ('jog_delta', 0),
+	'amount_steps': ('amount', 0),
+	'speed_steps': ('speed', 1),
+	'accel_steps': ('accel', 2),
+}
+NUMERIC_INPUTS = ('speed', 'accel', 'jog_delta', 'amount')
+INPUTS = ('syringe', 'units') + NUMERIC_INPUTS
+
+
+# ####################
+# PUMPS : PUMP BANK
+# ####################
+class PumpBank(object):
+	'''
+	Settings for count pumps. Numeric inputs are float arrays (bank.speed[i]),
+	syringe and units are lists of names. Change inputs through update(), the
+	*_steps properties are the cached derived arrays (do not write to them).
+	conversions counts the entries actually worked out.
+	'''
+
+	def __init__(self, count=3, syringe=units.SYRINGE_OPTIONS[0], unit=units.UNITS[0],
+			speed=0.0, accel=0.0, jog_delta=0.01, amount=0.0):
+		self.count = count
+		self.syringe = [syringe] * count
+		self.units = [unit] * count
+		self.speed = numpy.full(count, speed, dtype=float)
+		self.accel = numpy.full(count, accel, dtype=float)
+		self.jog_delta = numpy.full(count, jog_delta, dtype=float)
+		self.amount = numpy.full(count, amount, dtype=float)
+		self.active = numpy.zeros(count, dtype=bool)
+
+		# (displacement, speed, accel) factors to steps, per pump
+		self.factors = numpy.array([units.factors(syringe, unit)] * count, dtype=float).reshape(count, 3)
+		self.steps = dict((name, numpy.zeros(count)) for name in DERIVED)
+		self.stale = dict((name, numpy.ones(count, dtype=bool)) for name in DERIVED)
+		self.conversions = 0
+		self.pumps = [Pump(self, i) for i in range(count)]
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, index):
+		return self.pumps[index]
+
+	def __iter__(self):
+		return iter(self.pumps)
+
+	def update(self, index, **inputs):
+		'''Set pump index's inputs, mark what depends on the ones that changed, return those inputs'''
+		changes = {}
+		for name, value in inputs.items():
+			if name not in INPUTS:
+				raise AttributeError("Pumps have no input %r" % name)
+			if getattr(self, name)[index] != value:
+				changes[name] = value
+		changed = set(changes)
+		if not changed:
+			return changed
+		# looked up before anything is set, so an unknown syringe or unit
+		# (KeyError) leaves the pump as it was
+		factors = None
+		if 'syringe' in changed or 'units' in changed:
+			factors = units.factors(changes.get('syringe', self.syringe[index]), changes.get('units', self.units[index]))
+		for name, value in changes.items():
+			getattr(self, name)[index] = value
+		if factors is not None:
+			self.factors[index] = factors
+			for stale in self.stale.values():
+				stale[index] = True
+		else:
+			for name, (source, _) in DERIVED.items():
+				if source in changed:
+					self.stale[name][index] = True
+		return changed
+
+	def derived(self, name):
+		stale = self.stale[name]
+		if stale.any():
+			source, column = DERIVED[name]
+			steps = self.steps[name]
+			steps[stale] = getattr(self, source)[stale] * self.factors[stale, column]
+			self.conversions += int(stale.sum())
+			stale[:] = False
+		return self.steps[name]
+
+	speed_steps = property(lambda self: self.derived('speed_steps'))
+	accel_steps = property(lambda self: self.derived('accel_steps'))
+	jog_delta_steps = property(lambda self: self.derived('jog_delta_steps'))
+	amount_steps = property(lambda self: self.derived('amount_steps'))
+
+	def active_ids(self):
+		'''Motor ids (1 based) of the active pumps'''
+		return [int(i) + 1 for i in numpy.flatnonzero(self.active)]
+
+	# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	# commands for the firmware
+	# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+	def settings_commands(self, ids=None):
+		'''SPEED, ACCEL and DELTA settings for the given motor ids (all pumps by default)'''
+		if ids is None:
+			ids = range(1, self.count + 1)
+		speed, accel, delta = self.speed_steps, self.accel_steps, self.jog_delta_steps
+		commands = []
+		for motor in ids:
+			i = motor - 1
+			commands.append("<SETTING,SPEED,%d,%s,F,0.0,0.0,0.0>" % (motor, float(speed[i])))
+			commands.append("<SETTING,ACCEL,%d,%s,F,0.0,0.0,0.0>" % (motor, float(accel[i])))
+			commands.append("<SETTING,DELTA,%d,%s,F,0.0,0.0,0.0>" % (motor, float(delta[i])))
+		return commands
+
+	def move_command(self, ids, steps, direction="F"):
+		'''
+		RUN,DIST for the motors in ids, steps is one value per pump. The
+		firmware takes three distances, pumps past the third are left out.
+		'''
+		steps = [float(s) for s in steps[:3]]
+		distances = ",".join(str(s) for s in steps + [0.0] * (3 - len(steps)))
+		return "<RUN,DIST," + "".join(map(str, ids)) + ",0.0," + direction + "," + distances + ">"
+
+
+# ####################
+# PUMPS : PUMP
+# ####################
+class Pump(object):
+	'''One pump of a PumpBank, everything reads and writes through to the bank's arrays'''
+
+	__slots__ = ('bank', 'index')
+
+	def __init__(self, bank, index):
+		self.bank = bank
+		self.index = index
+
+	@property
+	def number(self):
+		'''The motor id the firmware knows this pump by'''
+		return self.index + 1
+
+	def update(self, **inputs):
+		return self.bank.update(self.index, **inputs)
+
+	syringe = property(lambda self: self.bank.syringe[self.index])
+	units = property(lambda self: self.bank.units[self.index])
+	speed = property(lambda self: float(self.bank.speed[self.index]))
+	accel = property(lambda self: float(self.bank.accel[self.index]))
+	jog_delta = property(lambda self: float(self.bank.jog_delta[self.index]))
+	amount = property(lambda self: float(self.bank.amount[self.index]))
+
+	@property
+	def active(self):
+		return bool(self.bank.active[self.index])
+
+	@active.setter
+	def active(self, value):
+		self.bank.active[self.index] = value
+
+	@property
+	def syringe_area(self):
+		return units.SYRINGE_AREAS[units.SYRINGE_OPTIONS.index(self.syringe)]
+
+	speed_steps = property(lambda self: float(self.bank.speed_steps[self.index]))
+	accel_steps = property(lambda self: float(self.bank.accel_steps[self.index]))
+	jog_delta_steps = property(lambda self: float(self.bank.jog_delta_steps[self.index]))
+	amount_steps = property(lambda self: float(self.bank.amount_steps[self.index]))
+
+
+# ####################
+# PUMPS : POSITIONS
+# ####################
+class Positions(object):
+	'''
+	Where every pump is, in steps from where it was when the host started
+	counting, as far as the host can tell:
+
+	- command_sent() sees a RUN,DIST / JOG,ONE / JOG,FEW go out and notes
+	  each moving pump's target (JOG,ALL is not followed, nothing sends it)
+	- frame_received() takes the <DISPn|steps> distance to go the board
+	  reports while moving
+	- command_done() is the move's echo or ACK: the pumps got to their
+	  target, unless a STOP cut the move short, then the last DISP stands
+
+	Without DISP frames (serialCOM_v0.1 never sends them) positions jump from
+	start to target when the move ends. ZERO zeroes them.
+
+	listeners are called with (event, ids) on the thread that saw it:
+	'start' when a move goes out, 'milestone' when a pump has done another
+	1/milestones of its move (0 for none) and 'end' when it is over.
+	Everything here is thread safe, snapshot() is one consistent copy.
+	'''
+
+	def __init__(self, count=3, milestones=0):
+		self.count = count
+		self.milestones = milestones
+		self.positions = [0.0] * count
+		self.starts = [0.0] * count
+		self.targets = [0.0] * count
+		self.reached = [0] * count
+		self.moving = set()
+		self.stopped = False
+		self.updated = time.monotonic()
+		self.listeners = []
+		self.lock = threading.Lock()
+
+	def motors(self, motor_id):
+		'''motorID field -> pump numbers, "13" -> [1, 3]'''
+		return [int(d) for d in motor_id.strip() if d.isdigit() and 1 <= int(d) <= self.count]
+
+	def command_sent(self, command):
+		fields = protocol.command_fields(command)
+		if len(fields) < 3:
+			return
+		mode, setting = fields[0], fields[1]
+		events = []
+		with self.lock:
+			if mode in ('RUN', 'JOG') and setting in ('DIST', 'ONE', 'FEW') and len(fields) >= 8:
+				ids = self.motors(fields[2])
+				sign = -1 if fields[4] == 'B' else 1
+				for n in ids:
+					i = n - 1
+					self.starts[i] = self.positions[i]
+					self.targets[i] = self.positions[i] + sign * protocol.atof(fields[4 + n])
+					self.reached[i] = 0
+				self.moving.update(ids)
+				self.stopped = False
+				events.append(('start', ids))
+			elif mode == 'STOP':
+				self.stopped = True
+			elif mode == 'ZERO':
+				self.positions = [0.0] * self.count
+				self.starts = [0.0] * self.count
+				self.targets = [0.0] * self.count
+			self.updated = time.monotonic()
+		self.notify(events)
+
+	def frame_received(self, frame):
+		if not frame.startswith('DISP'):
+			return
+		name, _, steps = frame.partition('|')
+		n = protocol.atoi(name[4:])
+		if not 1 <= n <= self.count:
+			return
+		events = []
+		with self.lock:
+			i = n - 1
+			# AccelStepper distanceToGo() is target - position, signed
+			self.positions[i] = self.targets[i] - protocol.atof(steps)
+			self.updated = time.monotonic()
+			if self.milestones and n in self.moving:
+				length = abs(self.targets[i] - self.starts[i])
+				done = abs(self.positions[i] - self.starts[i]) / length if length else 1.0
+				reached = min(self.milestones, int(done * self.milestones))
+				if reached > self.reached[i]:
+					self.reached[i] = reached
+					events.append(('milestone', [n]))
+		self.notify(events)
+
+	def command_done(self, command):
+		'''A move command's echo (or ACK) came back, the motors have stopped'''
+		fields = protocol.command_fields(command)
+		if len(fields) < 3 or fields[0] not in protocol.MOTION_MODES:
+			return
+		with self.lock:
+			ids = sorted(self.moving)
+			if not self.stopped:
+				for n in ids:
+					self.positions[n - 1] = self.targets[n - 1]
+			self.moving.clear()
+			self.updated = time.monotonic()
+		if ids:
+			self.notify([('end', ids)])
+
+	def snapshot(self):
+		'''(time.monotonic() of the last update, positions in steps, moving pump numbers)'''
+		with self.lock:
+			return self.updated, list(self.positions), sorted(self.moving)
+
+	def notify(self, events):
+		for event, ids in events:
+			for listener in list(self.listeners):
+				listener(event, ids)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+'''
+Replaying a run log (poseidon.runlog) against a board or the simulator.
+
+Replay sends the commands of a recorded run through a connected
+Controller's transport at the times they originally went out, divided by
+speed (2.0 is twice as fast, 0 as fast as the transport takes them), and
+times the replies the same way the original ones are timed. Commands the
+controller sends urgently (PAUSE, RESUME, STOP) jump the send window like
+they did the first time. HELLO is left out, connecting negotiates anyway.
+
+stats() compares the two runs:
+
+- send lag: how late each command went out against its (scaled) slot,
+  what the host side and the send window cost
+- latency: command to reply, original and replayed, and their difference
+
+The controller's listeners see the replay like any other traffic, so a
+runlog.Recorder attached to it records the replay for a closer look.
+
+	python -m poseidon replay runs/test.plog --simulator --speed 4
+'''
+
+import collections
+import concurrent.futures
+import threading
+import time
+
+import numpy
+
+from poseidon import binary, protocol, runlog, transport
+
+URGENT_MODES = ('PAUSE', 'RESUME', 'STOP')
+
+# one command of the replay, times in seconds from the first replayed
+# command; original_* are the recorded times, replied is None without a reply
+Replayed = collections.namedtuple('Replayed', 'command original_sent original_replied scheduled sent replied')
+
+
+def command_times(run):
+	'''
+	[command, sent, replied] for every command in run (a runlog.RunLog),
+	seconds since its start, replied None if no reply came. Replies are
+	matched by feeding the log through a transport.PipelinedSender, exactly
+	as the transport matched them when it was recorded.
+	'''
+	now = [0.0]
+	commands = []
+	sender = transport.PipelinedSender(lambda command, seq: None)
+
+	def answered(entry):
+		return lambda future: entry.__setitem__(2, None if future.exception() else now[0])
+
+	for t, kind, _, text in run.events([runlog.SENT, runlog.REPLY]):
+		now[0] = t
+		if kind == runlog.SENT:
+			entry = [text, t, None]
+			commands.append(entry)
+			# in wire order, so the seq an ACK refers to comes out right
+			sender.send_urgent(text).add_done_callback(answered(entry))
+		else:
+			seq = binary.parse_ack(text)
+			if seq is not None:
+				sender.ack_received(seq)
+			else:
+				sender.reply_received(text)
+	sender.cancel()
+	return commands
+
+
+def summary(values):
+	'''(count, mean, median, p95, max) of values in ms, None for no values'''
+	values = numpy.asarray([v for v in values if v is not None], dtype=float) * 1e3
+	if not len(values):
+		return None
+	return (len(values), float(values.mean()), float(numpy.median(values)),
+		float(numpy.percentile(values, 95)), float(values.max()))
+
+
+# ####################
+# REPLAY : REPLAY
+# ####################
+class Replay(object):
+	'''
+	Replays run (a runlog.RunLog) through controller, which has to be
+	connected. run() blocks until every command is out and has had its reply
+	or timeout seconds have passed after the last one. results is a list of
+	Replayed, in order.
+	'''
+
+	def __init__(self, run, controller, speed=1.0, timeout=30.0):
+		if speed < 0:
+			raise ValueError("Replay speed can not be negative")
+		self.controller = controller
+		self.speed = speed
+		self.timeout = timeout
+		self.original = [c for c in command_times(run) if c[0] != binary.HELLO]
+		self.original_disp = int(numpy.count_nonzero(run.records['kind'] == runlog.DISP))
+		self.disp = 0
+		self.results = []
+		self.lock = threading.Lock()
+
+	def frame_received(self, frame):
+		if frame.startswith('DISP'):
+			self.disp += 1
+
+	def run(self):
+		link = self.controller._transport()
+		self.controller.listeners.append(self.frame_received)
+		start = time.monotonic()
+		first = self.original[0][1] if self.original else 0.0
+		futures = []
+		try:
+			for command, sent, replied in self.original:
+				scheduled = (sent - first) / self.speed if self.speed else 0.0
+				delay = start + scheduled - time.monotonic()
+				if delay > 0:
+					time.sleep(delay)
+				urgent = protocol.command_fields(command)[0] in URGENT_MODES
+				future = link.send_urgent(command) if urgent else link.send(command, self.timeout)
+				now = time.monotonic() - start
+				entry = [command, sent - first, None if replied is None else replied - first, scheduled, now, None]
+				self.results.append(entry)
+				future.add_done_callback(self.answered(entry, start))
+				futures.append(future)
+			concurrent.futures.wait(futures, self.timeout)
+		finally:
+			self.controller.listeners.remove(self.frame_received)
+		with self.lock:
+			self.results = [Replayed(*entry) for entry in self.results]
+		return self.results
+
+	def answered(self, entry, start):
+		def done(future):
+			with self.lock:
+				if not future.cancelled() and future.exception() is None:
+					entry[5] = time.monotonic() - start
+		return done
+
+	def stats(self):
+		'''{name: summary()} of the send lag, both latencies and their difference'''
+		original, replayed, difference = [], [], []
+		for r in self.results:
+			before = None if r.original_replied is None else r.original_replied - r.original_sent
+			after = None if r.replied is None else r.replied - r.sent
+			original.append(before)
+			replayed.append(after)
+			difference.append(None if before is None or after is None else after - before)
+		return collections.OrderedDict([
+			('send lag', summary(r.sent - r.scheduled for r in self.results)),
+			('latency, original', summary(original)),
+			('latency, replayed', summary(replayed)),
+			('latency difference', summary(difference)),
+		])
+
+	def report(self):
+		'''stats() and the counts as printable lines'''
+		replied = sum(1 for r in self.results if r.replied is not None)
+		originally = sum(1 for r in self.results if r.original_replied is not None)
+		lines = ["%d commands at %s, %d replies (%d originally), %d DISP frames (%d originally)" % (
+			len(self.results), "%gx" % self.speed if self.speed else "full speed", replied, originally,
+			self.disp, self.original_disp)]
+		lines.append("%-20s %6s %9s %9s %9s %9s" % ('ms', 'count', 'mean', 'median', 'p95', 'max'))
+		for name, values in self.stats().items():
+			if values is None:
+				lines.append("%-20s %6d" % (name, 0))
+			else:
+				lines.append("%-20s %6d %9.2f %9.2f %9.2f %9.2f" % ((name,) + values))
+		return lines
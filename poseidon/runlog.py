@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+'''
+Run logs: everything that went to the board and came back, with monotonic
+timestamps, in a compact binary file that is read back memory mapped.
+
+A run log is two files:
+
+- NAME.plog: a 32 byte HEADER (magic, wall clock and monotonic start time,
+  version, record size) and then fixed 16 byte RECORDs: nanoseconds since
+  the start, kind, pump, and a 32 bit value
+- NAME.plog.txt: the text of SENT/REPLY/FRAME/MARK records, one per line,
+  the record's value is its line number
+
+DISP records carry the distance to go as the value and have no text, so a
+position sample costs 16 bytes however long the run. Every run gets a
+new file and records are only ever appended to it in time order. A thread
+writes the buffered records out every FLUSH_INTERVAL, busy or idle, so a
+crash loses at most the last FLUSH_INTERVAL of them (a torn record at the
+end is ignored).
+
+	recorder = runlog.Recorder("runs/today.plog")
+	recorder.attach(board)		# a poseidon.controller.Controller
+	...
+	recorder.close()
+
+	run = runlog.RunLog("runs/today.plog")
+	t, distance = run.disp(1)	# numpy arrays, straight off the mmap
+'''
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy
+
+from poseidon import binary, protocol
+
+MAGIC = b'PSDNRUN1'
+VERSION = 1
+HEADER = struct.Struct('<8sdQII')	# magic, wall start (time.time()), monotonic start (ns), version, record size
+RECORD = struct.Struct('<QBBHi')	# ns since start, kind, pump, unused, value
+DTYPE = numpy.dtype([('t', '<u8'), ('kind', 'u1'), ('pump', 'u1'), ('unused', '<u2'), ('value', '<i4')])
+TEXT_SUFFIX = '.txt'
+
+# record kinds
+SENT = 1		# a command written to the board
+REPLY = 2		# an echo or <ACK|seq> answering one
+FRAME = 3		# any other frame from the board (the ready banner, PROTO, ...)
+DISP = 4		# <DISPn|steps>, pump n, value is the distance to go in steps
+MARK = 5		# a note from the program, recorder.mark()
+KINDS = {SENT: 'sent', REPLY: 'reply', FRAME: 'frame', DISP: 'disp', MARK: 'mark'}
+
+FLUSH_INTERVAL = 1.0
+
+
+def classify(frame):
+	'''(kind, pump, distance) of a frame from the board'''
+	if frame.startswith('DISP'):
+		name, _, steps = frame.partition('|')
+		# distanceToGo() is signed, negative on every backward move
+		return DISP, protocol.atoi(name[4:]), int(protocol.atof(steps))
+	if frame.startswith('mode:') or binary.parse_ack(frame) is not None:
+		return REPLY, 0, 0
+	return FRAME, 0, 0
+
+
+# ####################
+# RUN LOG : RECORDER
+# ####################
+class Recorder(object):
+	'''
+	Starts a new run log at path, which must not exist yet. Every method
+	is thread safe and only copies a few bytes into a buffer; a thread of
+	its own writes the buffers to disk every FLUSH_INTERVAL seconds if
+	anything came in, so an SD card sees a few large writes instead of one
+	per frame.
+	'''
+
+	def __init__(self, path):
+		self.path = path
+		directory = os.path.dirname(path)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		self.lock = threading.Lock()
+		self.start_ns = time.monotonic_ns()
+		# the monotonic clock starts again at every boot, so runs never share a file
+		self.records = open(path, 'xb', buffering=1 << 16)
+		self.records.write(HEADER.pack(MAGIC, time.time(), self.start_ns, VERSION, RECORD.size))
+		self.texts = open(path + TEXT_SUFFIX, 'wb', buffering=1 << 16)
+		self.lines = 0
+		self.count = 0
+		self.flushed = 0
+		self.controller = None
+		self.closed = threading.Event()
+		self.flusher = threading.Thread(target=self.flush_forever, name='poseidon-runlog')
+		self.flusher.daemon = True
+		self.flusher.start()
+
+	def write(self, kind, pump=0, value=0, text=None):
+		with self.lock:
+			if self.records is None:
+				return
+			t = time.monotonic_ns() - self.start_ns
+			if text is not None:
+				value = self.lines
+				self.lines += 1
+				self.texts.write(text.replace('\n', ' ').encode('utf-8', 'replace') + b'\n')
+			self.records.write(RECORD.pack(t, kind, pump, 0, value))
+			self.count += 1
+
+	def command_sent(self, command):
+		self.write(SENT, text=command)
+
+	def frame_received(self, frame):
+		kind, pump, distance = classify(frame)
+		if kind == DISP:
+			self.write(DISP, pump, distance)
+		else:
+			self.write(kind, text=frame)
+
+	def mark(self, text):
+		'''Note something in the log, "camera started", "syringe changed", ...'''
+		self.write(MARK, text=text)
+
+	def attach(self, controller):
+		'''Record everything a poseidon.controller.Controller sends and receives'''
+		self.controller = controller
+		controller.command_listeners.append(self.command_sent)
+		controller.listeners.append(self.frame_received)
+
+	def detach(self):
+		if self.controller is None:
+			return
+		for listeners, listener in [(self.controller.command_listeners, self.command_sent),
+				(self.controller.listeners, self.frame_received)]:
+			if listener in listeners:
+				listeners.remove(listener)
+		self.controller = None
+
+	def _flush(self):
+		# the text before the records, so no record points past the end of it
+		self.texts.flush()
+		self.records.flush()
+		self.flushed = self.count
+
+	def flush(self):
+		with self.lock:
+			if self.records is not None and self.flushed != self.count:
+				self._flush()
+
+	def flush_forever(self):
+		while not self.closed.wait(FLUSH_INTERVAL):
+			self.flush()
+
+	def close(self):
+		self.detach()
+		self.closed.set()
+		self.flusher.join()
+		with self.lock:
+			if self.records is None:
+				return
+			self._flush()
+			self.records.close()
+			self.texts.close()
+			self.records = self.texts = None
+
+
+def read_header(data, path=''):
+	if len(data) < HEADER.size:
+		raise ValueError("%s is not a run log, it is too short" % path)
+	magic, wall, start_ns, version, record_size = HEADER.unpack(data[:HEADER.size])
+	if magic != MAGIC:
+		raise ValueError("%s is not a run log" % path)
+	if version != VERSION or record_size != RECORD.size:
+		raise ValueError("%s is a version %d run log, this reads version %d" % (path, version, VERSION))
+	return wall, start_ns
+
+
+# ####################
+# RUN LOG : READER
+# ####################
+class RunLog(object):
+	'''
+	A run log, memory mapped. records is a numpy structured array over the
+	file (fields t, kind, pump, value), nothing is read until it is used.
+	The text lines are only indexed the first time one is asked for.
+	'''
+
+	def __init__(self, path):
+		self.path = path
+		with open(path, 'rb') as f:
+			self.wall_start, self.start_ns = read_header(f.read(HEADER.size), path)
+		count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+		if count:
+			self.records = numpy.memmap(path, dtype=DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+		else:
+			self.records = numpy.zeros(0, dtype=DTYPE)
+		self.text_data = None
+		self.line_starts = None
+
+	def __len__(self):
+		return len(self.records)
+
+	@property
+	def times(self):
+		'''Seconds since the start of the run, one per record'''
+		return self.records['t'] / 1e9
+
+	@property
+	def duration(self):
+		return float(self.records['t'][-1]) / 1e9 if len(self.records) else 0.0
+
+	def of_kind(self, kind):
+		return self.records[self.records['kind'] == kind]
+
+	def disp(self, pump):
+		'''(seconds, distance to go in steps) of every DISP sample of pump'''
+		mask = (self.records['kind'] == DISP) & (self.records['pump'] == pump)
+		return self.records['t'][mask] / 1e9, self.records['value'][mask]
+
+	def text(self, line):
+		if self.line_starts is None:
+			path = self.path + TEXT_SUFFIX
+			if os.path.getsize(path):
+				with open(path, 'rb') as f:
+					self.text_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+				ends = numpy.flatnonzero(numpy.frombuffer(self.text_data, dtype=numpy.uint8) == 10)
+			else:
+				self.text_data = b''
+				ends = numpy.zeros(0, dtype=numpy.int64)
+			self.line_starts = numpy.concatenate(([0], ends + 1))
+		start, end = self.line_starts[line], self.line_starts[line + 1] - 1
+		return self.text_data[start:end].decode('utf-8', 'replace')
+
+	def events(self, kinds=None):
+		'''(seconds, kind, pump, text or distance to go) for every record, in order'''
+		for t, kind, pump, _, value in self.records if kinds is None else self.records[numpy.isin(self.records['kind'], kinds)]:
+			yield (float(t) / 1e9, int(kind), int(pump), int(value) if kind == DISP else self.text(value))
+
+	def summary(self):
+		'''Record counts by kind name'''
+		kinds, counts = numpy.unique(self.records['kind'], return_counts=True)
+		return dict((KINDS.get(int(k), str(k)), int(c)) for k, c in zip(kinds, counts))
+
+	def close(self):
+		self.records = None
+		if self.text_data:
+			self.text_data.close()
+		self.text_data = None
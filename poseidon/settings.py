@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+'''
+Settings files: what the Setup tab saves and loads.
+
+They are JSON with a format name and a schema version, the notes, and one
+entry per pump, so files grow with the pump count and new fields:
+
+	{
+	  "format": "poseidon-settings",
+	  "version": 1,
+	  "saved": "2026-10-18 12_00_00",
+	  "notes": "anything, colons included",
+	  "pumps": [
+	    {"number": 1, "syringe": "BD 10 mL", "units": "mL/hr", "speed": 2.0,
+	     "accel": 1.0, "jog_delta": 0.1, "amount": 0.5},
+	    ...
+	  ]
+	}
+
+load() also reads the line based files older versions wrote (settings/
+testing.txt is one) and migrates them, by their field names rather than
+line numbers. Everything is checked against PUMP_SCHEMA before anything is
+applied, so a bad file changes nothing.
+'''
+
+import datetime
+import json
+import math
+import re
+
+from poseidon import units
+
+FORMAT = 'poseidon-settings'
+VERSION = 1
+
+# field -> (check, what it must be, required). Optional fields a file does
+# not have are left as they are when it is loaded
+PUMP_SCHEMA = {
+	'syringe': (lambda v: v in units.SYRINGE_OPTIONS, "one of " + ", ".join(units.SYRINGE_OPTIONS), True),
+	'units': (lambda v: v in units.UNITS, "one of " + ", ".join(units.UNITS), True),
+	'speed': (lambda v: _number(v) and v >= 0, "a number >= 0", True),
+	'accel': (lambda v: _number(v) and v >= 0, "a number >= 0", True),
+	'jog_delta': (lambda v: _number(v) and v > 0, "a number > 0", True),
+	'amount': (lambda v: _number(v), "a number", False),
+}
+PUMP_FIELDS = ('syringe', 'units', 'speed', 'accel', 'jog_delta', 'amount')
+
+# "P2 Jog D: 1.0" in the line based files
+LEGACY_FIELDS = {'Syrin': 'syringe', 'Units': 'units', 'Speed': 'speed', 'Accel': 'accel', 'Jog D': 'jog_delta'}
+LEGACY_LINE = re.compile(r'^P(\d+) (%s): ?(.*)$' % "|".join(re.escape(name) for name in LEGACY_FIELDS))
+
+
+class SettingsError(ValueError):
+	pass
+
+
+def _number(value):
+	# json reads 1e400 as inf (and NaN as nan), the board must not get those
+	return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def from_bank(bank, notes=""):
+	'''The settings document for a pumps.PumpBank'''
+	return {
+		'format': FORMAT,
+		'version': VERSION,
+		'saved': datetime.datetime.now().strftime("%Y-%m-%d %H_%M_%S"),
+		'notes': notes,
+		'pumps': [dict([('number', pump.number)] + [(field, getattr(pump, field)) for field in PUMP_FIELDS])
+			for pump in bank],
+	}
+
+
+def save(path, bank, notes=""):
+	with open(path, 'w') as f:
+		json.dump(from_bank(bank, notes), f, indent=2, ensure_ascii=False)
+		f.write("\n")
+
+
+def load(path):
+	'''The validated settings document in path, migrated to VERSION, raises SettingsError'''
+	try:
+		with open(path, encoding='utf-8') as f:
+			text = f.read()
+	except (OSError, UnicodeDecodeError) as e:
+		raise SettingsError("Cannot read %s: %s" % (path, e))
+	return parse(text)
+
+
+def parse(text):
+	if text.lstrip().startswith('{'):
+		try:
+			document = json.loads(text)
+		except ValueError as e:
+			raise SettingsError("Not a settings file: %s" % e)
+	else:
+		document = migrate_legacy(text)
+	return validate(migrate(document))
+
+
+def migrate_legacy(text):
+	'''The version 0 line based format (six lines per pump, the notes last) as a document'''
+	document = {'format': FORMAT, 'version': VERSION, 'saved': '', 'notes': '', 'pumps': []}
+	pumps = {}
+	lines = text.splitlines()
+	for i, line in enumerate(lines):
+		match = LEGACY_LINE.match(line)
+		if match:
+			number, name, value = int(match.group(1)), match.group(2), match.group(3).strip()
+			field = LEGACY_FIELDS[name]
+			if field not in ('syringe', 'units'):
+				try:
+					value = float(value)
+				except ValueError:
+					pass
+			pumps.setdefault(number, {'number': number})[field] = value
+		elif line.startswith('Date time:'):
+			document['saved'] = line.partition(':')[2].strip()
+		elif line.startswith('Exp Note:'):
+			# the notes run to the end of the file, colons and all
+			document['notes'] = "\n".join([line.partition(':')[2][1:]] + lines[i + 1:])
+			break
+	if not pumps:
+		raise SettingsError("Not a settings file, no pump settings in it")
+	document['pumps'] = [pumps[n] for n in sorted(pumps)]
+	return document
+
+
+def migrate(document):
+	'''Bring a document of an older version up to VERSION (there is only one so far)'''
+	if not isinstance(document, dict) or document.get('format') != FORMAT:
+		raise SettingsError("Not a settings file")
+	version = document.get('version')
+	if not isinstance(version, int) or isinstance(version, bool) or not 1 <= version <= VERSION:
+		raise SettingsError("Settings version %r, this program reads 1 to %d" % (version, VERSION))
+	return document
+
+
+def validate(document):
+	'''Check document against PUMP_SCHEMA, raise SettingsError listing every problem'''
+	errors = []
+	if not isinstance(document.get('notes', ''), str):
+		errors.append("notes: must be text")
+	pumps = document.get('pumps')
+	if not isinstance(pumps, list) or not pumps:
+		raise SettingsError("pumps: must be a list with an entry per pump")
+	numbers = set()
+	for i, pump in enumerate(pumps):
+		where = "pumps[%d]" % i
+		if not isinstance(pump, dict):
+			errors.append("%s: must be an object" % where)
+			continue
+		number = pump.get('number', i + 1)
+		if not isinstance(number, int) or isinstance(number, bool) or number < 1 or number in numbers:
+			errors.append("%s.number: must be a pump number >= 1, used once" % where)
+		else:
+			numbers.add(number)
+			pump['number'] = number
+		for field, (check, expected, required) in PUMP_SCHEMA.items():
+			if field not in pump:
+				if required:
+					errors.append("%s.%s: missing" % (where, field))
+			elif not check(pump[field]):
+				errors.append("%s.%s: %r is not %s" % (where, field, pump[field], expected))
+	if errors:
+		raise SettingsError("; ".join(errors))
+	document.setdefault('notes', '')
+	return document
+
+
+def apply(bank, document):
+	'''
+	Set bank (a pumps.PumpBank) from a validated document, one update per
+	pump. Pumps the bank does not have are left out, returns the numbers of
+	the pumps that were set.
+	'''
+	applied = []
+	for pump in document['pumps']:
+		if pump['number'] > len(bank):
+			continue
+		bank.update(pump['number'] - 1, **dict((field, pump[field]) for field in PUMP_FIELDS if field in pump))
+		applied.append(pump['number'])
+	return applied
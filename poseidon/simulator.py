@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+'''
+Stand-in for an Arduino running firmware/serialCOM_v0.1 on a Linux pseudo
+terminal, so the host side can be exercised and benchmarked without a board.
+
+	python -m poseidon.simulator [--baudrate 230400]
+
+prints the pty path to give to gui.py (or serial.Serial) and runs until
+interrupted. What it copies from the firmware:
+
+- the <MODE,SETTING,ID,VALUE,DIR,p1,p2,p3> grammar, parsed the way
+  parseData() does it (64 byte inputBuffer, strtok on ',', atoi/atof) and
+  dispatched like executeThisFunction()
+- the replyToPC() echo, which only goes out once a RUN/JOG/RESUME is over
+  (PAUSE answers straight away, it spins on replyToPC() until RESUME)
+- <DISPn|steps> distance-to-go frames like sendDistanceToPC(), whenever a
+  moving motor's distance changes. The v0.1 sketch defines that function but
+  never calls it, pass report_distance=False to match it exactly
+- on top of v0.1, the binary command encoding from poseidon.binary once the
+  host has sent binary.HELLO (pass binary=False for a plain v0.1 board)
+- serial timing: bytes take 10 bit times each way at the configured baud
+  rate, and like the Arduino's 64 byte TX buffer DISP frames are dropped
+  rather than queued when the link back to the host is full
+
+Motion is modelled on AccelStepper run(): every motor accelerates at its
+setAcceleration() rate up to setMaxSpeed() and decelerates into the target.
+'''
+
+import argparse
+import collections
+import math
+import os
+import select
+import threading
+import time
+import tty
+
+from poseidon import binary, protocol
+
+BAUD_RATE = 230400
+BUFF_SIZE = 64			# inputBuffer in the sketch
+TX_BUFFER_SIZE = 64		# Arduino HardwareSerial transmit buffer
+MOTOR_IDS = {1: (1,), 2: (2,), 3: (3,), 12: (1, 2), 13: (1, 3), 23: (2, 3), 123: (1, 2, 3)}
+
+
+# ##############################
+# SIMULATOR : ACCELSTEPPER MOTOR
+# ##############################
+class SimulatedStepper(object):
+	'''Trapezoidal motion of one AccelStepper, positions in steps'''
+
+	def __init__(self):
+		self.position = 0.0
+		self.target = 0.0
+		self.speed = 0.0
+		# AccelStepper constructor defaults
+		self.max_speed = 1.0
+		self.acceleration = 1.0
+
+	def distance_to_go(self):
+		return int(round(self.target - self.position))
+
+	def is_running(self):
+		return self.speed != 0.0 or self.distance_to_go() != 0
+
+	def move(self, relative):
+		self.target = self.position + relative
+
+	def set_current_position(self, position):
+		self.position = self.target = float(position)
+		self.speed = 0.0
+
+	def stop(self):
+		'''AccelStepper::stop(), set the target to where a full deceleration ends'''
+		if self.speed == 0.0 or self.acceleration <= 0:
+			self.target = self.position
+			return
+		stopping = self.speed * self.speed / (2.0 * self.acceleration)
+		self.target = self.position + math.copysign(stopping, self.speed)
+
+	def update(self, dt):
+		distance = self.target - self.position
+		if abs(distance) < 0.5 and abs(self.speed) < 1e-9:
+			self.speed = 0.0
+			return
+		direction = math.copysign(1.0, distance)
+		if self.acceleration <= 0:
+			self.speed = direction * self.max_speed
+		else:
+			stopping = self.speed * self.speed / (2.0 * self.acceleration)
+			if self.speed * direction > 0 and stopping >= abs(distance):
+				# decelerate into the target
+				self.speed -= direction * self.acceleration * dt
+				if self.speed * direction < 0:
+					self.speed = 0.0
+			else:
+				self.speed += direction * self.acceleration * dt
+				self.speed = max(-self.max_speed, min(self.max_speed, self.speed))
+		step = self.speed * dt
+		if abs(step) >= abs(distance) or (self.speed == 0.0 and abs(distance) < 1.0):
+			self.position = self.target
+			self.speed = 0.0
+		else:
+			self.position += step
+
+
+# ##############################
+# SIMULATOR : SERIALCOM FIRMWARE
+# ##############################
+class FirmwareSimulator(object):
+	'''
+	Runs the firmware model on its own thread behind a pty. port is the path
+	to open from the host side once start() has returned.
+	'''
+
+	def __init__(self, baudrate=BAUD_RATE, tick=0.001, boot_time=1.0, report_distance=True, binary=True):
+		self.baudrate = baudrate
+		self.byte_time = 10.0 / baudrate
+		self.tick = tick
+		self.boot_time = boot_time
+		self.report_distance = report_distance
+		self.supports_binary = binary
+
+		self.motors = [SimulatedStepper() for _ in range(3)]
+		self.jog_delta = [0.0, 0.0, 0.0]
+		self.last_disp = [None, None, None]
+
+		# parser state, same names as the sketch
+		self.input_buffer = bytearray()
+		self.read_in_progress = False
+		self.binary = False			# binary frames accepted (after HELLO)
+		self.binary_frame = None	# binary frame being received
+		self.reply_seq = None		# seq to ACK if the last command came in binary
+		self.fields = {'mode': '', 'setting': '', 'motorID': 0, 'value': 0.0,
+			'dir': '', 'p1': 0.0, 'p2': 0.0, 'p3': 0.0}
+		self.moving = ()		# motors a RUN/JOG/RESUME is waiting on
+		self.paused = False
+		self.reply_pending = False
+
+		self.rx = collections.deque()	# (time the byte has fully arrived, byte)
+		self.rx_clock = 0.0
+		self.tx = bytearray()
+		self.tx_clock = 0.0
+		self.commands = []				# every command parsed, for tests and benchmarks
+
+		self.master = None
+		self.slave = None
+		self.port = None
+		self.started = time.monotonic()
+		self.running = False
+		self.thread = None
+
+	def start(self):
+		self.master, self.slave = os.openpty()
+		tty.setraw(self.master)
+		tty.setraw(self.slave)
+		self.port = os.ttyname(self.slave)
+		self.running = True
+		self.thread = threading.Thread(target=self.run, name='poseidon-simulator')
+		self.thread.daemon = True
+		self.thread.start()
+		return self.port
+
+	def stop(self):
+		self.running = False
+		if self.thread is not None:
+			self.thread.join()
+		for fd in (self.master, self.slave):
+			if fd is not None:
+				os.close(fd)
+		self.master = self.slave = None
+
+	# ~~~~~~~~~~~~~~~~~~~~~
+	# serial line timing
+	# ~~~~~~~~~~~~~~~~~~~~~
+	def _receive(self, now):
+		try:
+			data = os.read(self.master, 4096)
+		except OSError:
+			return
+		self.rx_clock = max(self.rx_clock, now)
+		for byte in data:
+			self.rx_clock += self.byte_time
+			self.rx.append((self.rx_clock, byte))
+
+	def _transmit(self, now):
+		if not self.tx:
+			self.tx_clock = now
+			return
+		n = int((now - self.tx_clock) / self.byte_time)
+		if n <= 0:
+			return
+		chunk = bytes(self.tx[:n])
+		try:
+			os.write(self.master, chunk)
+		except OSError:
+			return
+		del self.tx[:len(chunk)]
+		self.tx_clock += len(chunk) * self.byte_time
+
+	def serial_print(self, text, droppable=False):
+		if droppable and len(self.tx) + len(text) > TX_BUFFER_SIZE:
+			return
+		self.tx += text.encode()
+
+	# ~~~~~~~~~~~~~~~~~~~~~
+	# main loop
+	# ~~~~~~~~~~~~~~~~~~~~~
+	def run(self):
+		self.started = time.monotonic()
+		booted = False
+		last = self.started
+		while self.running:
+			now = time.monotonic()
+			if not booted and now - self.started >= self.boot_time:
+				booted = True
+				self.serial_print("<Arduino is ready>\r\n")
+
+			timeout = self.tick if (self.tx or self.rx or self.moving or not booted) else 0.05
+			readable, _, _ = select.select([self.master], [], [], timeout)
+			now = time.monotonic()
+			if readable:
+				self._receive(now)
+
+			# bytes sent before setup() finished are lost, like on a resetting board
+			while self.rx and self.rx[0][0] <= now:
+				_, byte = self.rx.popleft()
+				if booted:
+					self.get_data_from_pc(byte)
+
+			self.update_motion(now - last)
+			last = now
+			self._transmit(now)
+
+	def get_data_from_pc(self, x):
+		if self.binary_frame is not None:
+			self.get_binary_from_pc(x)
+			return
+		if self.binary and x == binary.SYNC and not self.read_in_progress:
+			self.binary_frame = bytearray([x])
+			return
+		if x == ord('>'):
+			self.read_in_progress = False
+			self.parse_data(bytes(self.input_buffer))
+		if self.read_in_progress:
+			if len(self.input_buffer) == BUFF_SIZE - 1:
+				# bytesRecvd sticks at buffSize - 1, the last byte keeps being overwritten
+				self.input_buffer[-1] = x
+			else:
+				self.input_buffer.append(x)
+		if x == ord('<'):
+			self.input_buffer = bytearray()
+			self.read_in_progress = True
+
+	def get_binary_from_pc(self, x):
+		frame = self.binary_frame
+		frame.append(x)
+		size = binary.frame_size(frame[1])
+		if size is None:
+			# unknown opcode, drop it and look for the next frame
+			self.binary_frame = None
+		elif len(frame) == size:
+			self.binary_frame = None
+			self.parse_binary(bytes(frame))
+
+	def parse_binary(self, frame):
+		try:
+			self.fields = binary.decode(frame)
+		except ValueError:
+			# corrupted on the way, dropped like text garbage
+			return
+		self.reply_seq = self.fields.pop('seq')
+		self.commands.append(binary.to_command(self.fields))
+		self.dispatch()
+
+	def parse_data(self, data):
+		# strtok skips empty tokens, a missing token is NULL on the board
+		tokens = [t for t in data.decode('ascii', 'replace').split(',') if t]
+		tokens += [''] * (8 - len(tokens))
+		self.fields = {
+			'mode': tokens[0],
+			'setting': tokens[1],
+			'motorID': protocol.atoi(tokens[2]),
+			'value': protocol.atof(tokens[3]),
+			'dir': tokens[4],
+			'p1': protocol.atof(tokens[5]),
+			'p2': protocol.atof(tokens[6]),
+			'p3': protocol.atof(tokens[7]),
+		}
+		self.reply_seq = None
+		self.commands.append(data.decode('ascii', 'replace'))
+		self.dispatch()
+
+	def dispatch(self):
+		self.execute_this_function()
+		if self.moving and not self.paused:
+			# replyToPC() only runs again once the motion loop returns to loop()
+			self.reply_pending = True
+		else:
+			self.reply_to_pc()
+
+	def execute_this_function(self):
+		f = self.fields
+		mode, setting = f['mode'], f['setting']
+		if mode == "SETTING":
+			self.update_settings()
+		elif mode == "RUN":
+			if setting == "DIST":
+				self.run_few()
+		elif mode == "STOP":
+			for motor in self.motors:
+				motor.stop()
+		elif mode == "PAUSE":
+			if self.moving:
+				self.paused = True
+		elif mode == "RESUME":
+			self.paused = False
+		elif mode == "JOG":
+			if setting in ("ONE", "FEW"):
+				self.run_few()
+			elif setting == "ALL":
+				sign = -1 if f['dir'] == "B" else 1
+				for motor, delta in zip(self.motors, self.jog_delta):
+					motor.move(sign * delta)
+				self.moving = (1, 2, 3)
+		elif mode == "PROTO":
+			if setting == "BIN" and self.supports_binary and int(f['value']) == binary.VERSION:
+				self.serial_print("<%s>\r\n" % binary.OFFER)
+				self.binary = True
+
+	def update_settings(self):
+		f = self.fields
+		for motor in self.motors:
+			motor.set_current_position(0)
+		if f['motorID'] not in (1, 2, 3):
+			return
+		motor = self.motors[f['motorID'] - 1]
+		if f['setting'] == "SPEED":
+			motor.max_speed = f['value']
+		elif f['setting'] == "ACCEL":
+			motor.acceleration = f['value']
+		elif f['setting'] == "DELTA":
+			self.jog_delta[f['motorID'] - 1] = f['value']
+
+	def run_few(self):
+		f = self.fields
+		ids = MOTOR_IDS.get(f['motorID'])
+		if ids is None or f['dir'] not in ("F", "B"):
+			return
+		sign = -1 if f['dir'] == "B" else 1
+		# runFew() only steps while distanceToGo() has the sign dir asks for:
+		# a distance the other way (or none) does not move a motor, and with
+		# several motors one of them the wrong way stops the lot
+		steps = dict((i, f['p%d' % i]) for i in ids)
+		if len(ids) > 1 and any(steps[i] < 0 for i in ids):
+			return
+		ids = tuple(i for i in ids if steps[i] > 0)
+		for i in ids:
+			self.motors[i - 1].move(sign * steps[i])
+		self.moving = ids
+
+	def update_motion(self, dt):
+		if not self.moving or self.paused:
+			return
+		for i in self.moving:
+			motor = self.motors[i - 1]
+			motor.update(dt)
+			if self.report_distance:
+				self.send_distance_to_pc(i)
+		if not any(self.motors[i - 1].is_running() for i in self.moving):
+			if self.fields['mode'] == "JOG" and self.fields['setting'] == "ALL":
+				for motor in self.motors:
+					motor.set_current_position(0)
+			self.moving = ()
+			if self.reply_pending:
+				self.reply_pending = False
+				self.reply_to_pc()
+
+	def send_distance_to_pc(self, motor_id):
+		distance = self.motors[motor_id - 1].distance_to_go()
+		if distance != self.last_disp[motor_id - 1]:
+			self.serial_print("<DISP%d|%d>" % (motor_id, distance), droppable=True)
+		self.last_disp[motor_id - 1] = distance
+
+	def reply_to_pc(self):
+		if self.reply_seq is not None:
+			self.serial_print("<ACK|%d>\r\n" % self.reply_seq)
+			return
+		f = self.fields
+		millis = int((time.monotonic() - self.started) * 1000)
+		self.serial_print("<mode: %s ,setting: %s ,motorID: %d ,value: %.2f ,direction: %s ,"
+			"p1 optional: %.2f ,p2 optional: %.2f ,p3 optional: %.2f ,Time %d>\r\n" % (
+			f['mode'], f['setting'], f['motorID'], f['value'], f['dir'],
+			f['p1'], f['p2'], f['p3'], millis >> 9))
+
+
+def main():
+	parser = argparse.ArgumentParser(description="serialCOM_v0.1 firmware simulator on a pseudo terminal")
+	parser.add_argument('--baudrate', type=int, default=BAUD_RATE)
+	parser.add_argument('--boot-time', type=float, default=1.0, help='seconds before <Arduino is ready>')
+	parser.add_argument('--no-disp', action='store_true', help='do not send <DISPn|steps> frames')
+	parser.add_argument('--no-binary', action='store_true', help='text commands only, like serialCOM_v0.1')
+	args = parser.parse_args()
+
+	simulator = FirmwareSimulator(args.baudrate, boot_time=args.boot_time, report_distance=not args.no_disp,
+		binary=not args.no_binary)
+	print("Simulated board on " + simulator.start())
+	try:
+		while True:
+			time.sleep(1)
+	except KeyboardInterrupt:
+		simulator.stop()
+
+
+if __name__ == "__main__":
+	main()
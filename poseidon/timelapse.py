@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+'''
+Timelapse: camera frames saved at a fixed interval and/or whenever the
+pumps start a move, pass a milestone of it or finish it, each one stamped
+with where the pumps were when it was taken.
+
+Nothing here keeps anything per image. The frames come out of the
+CaptureThread's LatestFrame (read, not taken, so the live view does not
+lose them), go straight into an images.ImageWriter, and the stamps are one
+CSV line each, flushed as they are written. A run can go on for hours and
+use the same memory as one that lasted a minute; if the disk falls behind,
+the timelapse thread waits for the writer instead of queueing more (in
+SUBMIT_WAIT slices, so stop() gets through).
+'''
+
+import collections
+import csv
+import datetime
+import threading
+import time
+
+from poseidon import images
+
+EVENTS = ('start', 'milestone', 'end')
+SUBMIT_WAIT = 0.1
+
+
+# ####################
+# TIMELAPSE : TIMELAPSE
+# ####################
+class Timelapse(object):
+	'''
+	Saves frames.latest through writer, every interval seconds (None: not
+	on a clock) and on the positions events listed in events. bank, if
+	given, is the PumpBank the log converts steps to the user's units with.
+
+	The log (a CSV path, None for none) has a line per image: file, reason,
+	capture time, how old the frame was, its seq and, per pump, steps, the
+	same in the pump's units and whether it was moving.
+
+	Counters: captured, skipped (no frame from the camera yet, or stopped
+	while waiting for the writer), repeated (the camera had not delivered a
+	new frame since the last capture, the old one is not saved again) and
+	late (interval slots missed because a capture took longer than the
+	interval).
+	'''
+
+	def __init__(self, frames, writer, positions, bank=None, interval=None, events=EVENTS, log=None, mirror=False):
+		if interval is not None and interval <= 0:
+			raise ValueError("Timelapse interval must be positive, not %s" % interval)
+		self.frames = frames
+		self.writer = writer
+		self.positions = positions
+		self.bank = bank
+		self.interval = interval
+		self.events = tuple(events)
+		self.mirror = mirror
+		self.log_path = log
+		self.log = None
+		self.rows = None
+		self.triggers = collections.deque()
+		self.wakeup = threading.Event()
+		self.running = False
+		self.last_seq = 0
+		self.captured = 0
+		self.skipped = 0
+		self.repeated = 0
+		self.late = 0
+		self.thread = threading.Thread(target=self.run, name='poseidon-timelapse')
+		self.thread.daemon = True
+
+	def start(self):
+		if self.log_path is not None:
+			self.log = open(self.log_path, 'w', newline='')
+			self.rows = csv.writer(self.log)
+			self.rows.writerow(self.header())
+			self.log.flush()
+		self.running = True
+		if self.events:
+			self.positions.listeners.append(self.pump_event)
+		self.thread.start()
+
+	def stop(self, timeout=None):
+		'''
+		Stop capturing, waiting up to timeout seconds for the thread. It closes
+		the log on its way out. The images already handed to the writer are
+		its business
+		'''
+		self.running = False
+		if self.pump_event in self.positions.listeners:
+			self.positions.listeners.remove(self.pump_event)
+		self.wakeup.set()
+		if self.thread.is_alive():
+			self.thread.join(timeout)
+		if not self.thread.is_alive():
+			self.close_log()
+
+	def close_log(self):
+		log, self.log = self.log, None
+		if log is not None:
+			log.close()
+
+	def trigger(self, reason='manual'):
+		'''Capture as soon as possible, from any thread, never blocks'''
+		self.triggers.append(reason)
+		self.wakeup.set()
+
+	def pump_event(self, event, ids):
+		# called on the reader or sender thread, just hand it over
+		if event in self.events:
+			self.trigger("%s %s" % (event, "".join(map(str, ids))))
+
+	def run(self):
+		try:
+			self.capture_forever()
+		finally:
+			self.close_log()
+
+	def capture_forever(self):
+		due = time.monotonic() + self.interval if self.interval else None
+		while self.running:
+			timeout = None if due is None else max(0.0, due - time.monotonic())
+			self.wakeup.wait(timeout)
+			self.wakeup.clear()
+			while self.triggers and self.running:
+				self.capture(self.triggers.popleft())
+			if due is not None and self.running and time.monotonic() >= due:
+				self.capture('interval')
+				due += self.interval
+				now = time.monotonic()
+				if due <= now:
+					# do not try to catch up with a burst, skip to the next slot
+					missed = int((now - due) // self.interval) + 1
+					self.late += missed
+					due += missed * self.interval
+
+	def capture(self, reason):
+		frame = self.frames.latest
+		if frame is None:
+			self.skipped += 1
+			return None
+		if frame.seq == self.last_seq:
+			self.repeated += 1
+			return None
+		self.last_seq = frame.seq
+		# stamp before the writer can keep us waiting
+		now = time.monotonic()
+		updated, steps, moving = self.positions.snapshot()
+		wall = datetime.datetime.now()
+		name = self.writer.name(wall)
+		while True:
+			try:
+				future = self.writer.submit(frame.image, name, mirror=self.mirror, timeout=SUBMIT_WAIT)
+				break
+			except images.QueueFull:
+				if not self.running:
+					self.skipped += 1
+					return None
+			except RuntimeError:
+				# the writer was closed under us
+				self.skipped += 1
+				return None
+		self.captured += 1
+		if self.rows is not None:
+			self.rows.writerow(self.row(future.path, reason, wall, now - frame.time, frame.seq, steps, moving))
+			self.log.flush()
+		return future
+
+	def header(self):
+		header = ['image', 'reason', 'time', 'frame_age_s', 'frame_seq']
+		for n in range(1, self.positions.count + 1):
+			header += ['pump%d_steps' % n, 'pump%d_value' % n, 'pump%d_unit' % n, 'pump%d_moving' % n]
+		return header
+
+	def row(self, path, reason, wall, age, seq, steps, moving):
+		row = [path, reason, wall.isoformat(), "%.4f" % age, seq]
+		for i, value in enumerate(steps):
+			if self.bank is not None:
+				# bank.factors[i][0] is steps per unit of length
+				user = "%.6g" % (value / self.bank.factors[i][0])
+				unit = self.bank.units[i].split('/')[0]
+			else:
+				user, unit = '', ''
+			row += ["%.1f" % value, user, unit, int(i + 1 in moving)]
+		return row
@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+'''
+Talking to the serialCOM firmware.
+
+The firmware reads one byte per loop() out of the Arduino's 64 byte hardware
+receive buffer and answers every command it parses with a replyToPC() echo,
+in order. Instead of sending one command, waiting for any byte and sleeping,
+the sender keeps as many commands in flight as fit in that buffer and retires
+them as their echoes come back.
+
+Nothing in here ever flushes the input buffer. Every byte the board sends is
+read by the Transport reader and either resolves a pending command or is
+passed on as a frame (DISP positions, the ready banner, ...).
+
+Once the board has said it is ready, Transport.negotiate() offers the binary
+command encoding (poseidon.binary). Boards that do not know it keep getting
+text, nothing else changes for the callers, who always pass text commands.
+
+Opening the port resets most Arduinos. Transport.ready resolves when the
+<Arduino is ready> banner from setup() comes in, so callers wait exactly as
+long as the board needs instead of sleeping for a fixed time.
+'''
+
+import collections
+import concurrent.futures
+import itertools
+import threading
+import time
+
+import serial
+
+from poseidon import binary, protocol
+
+# Arduino HardwareSerial receive buffer (SERIAL_RX_BUFFER_SIZE)
+FIRMWARE_BUFFER_SIZE = 64
+
+
+class SenderCancelled(Exception):
+	pass
+
+
+# ##########################
+# TRANSPORT : PENDING COMMAND
+# ##########################
+class PendingCommand(object):
+	'''
+	One command on the wire. seq is a host side sequence id (the firmware echo
+	has no field to carry it, replies are matched by order and by the echoed
+	mode/setting/motorID). future resolves to the parsed reply dict. held is
+	set for commands sent while the board is paused, see PipelinedSender.
+	'''
+
+	def __init__(self, seq, command, size):
+		self.seq = seq
+		self.command = command
+		self.size = size
+		self.future = concurrent.futures.Future()
+		self.future.seq = seq
+		self.future.command = command
+		self.sent_at = None
+		self.held = False
+
+
+# ##########################
+# TRANSPORT : PIPELINED SENDER
+# ##########################
+class PipelinedSender(object):
+	'''
+	Keeps up to max_in_flight commands, and no more than window_bytes of
+	unacknowledged bytes, on the wire at once.
+
+	write is called with each command string and its sequence id, size(command)
+	is what it takes up in the firmware's buffer. Whoever reads the port must
+	pass every frame to reply_received() (echoes) or ack_received() (binary
+	mode <ACK|seq>) so the matching command can be retired. A command on its
+	own is always allowed out even if it is longer than the window.
+
+	Motion commands (protocol.MOTION_MODES) are consumed by the firmware right
+	away but only echoed when the motors stop, so they are tracked for reply
+	matching without holding on to window bytes, otherwise a PAUSE or STOP
+	could not get out until the run is over.
+
+	A paused board answers PAUSE, and anything sent before the RESUME or
+	STOP, straight away, while the moves it paused are still to finish. The
+	echo of such a (held) command leaves the older motion commands in flight,
+	they are answered by the echo that comes once the motors have stopped.
+	'''
+
+	def __init__(self, write, window_bytes=FIRMWARE_BUFFER_SIZE, max_in_flight=4, size=len):
+		self.write = write
+		self.size = size
+		self.window_bytes = window_bytes
+		self.max_in_flight = max_in_flight
+		self.in_flight = collections.deque()
+		self.bytes_in_flight = 0
+		self.seq = itertools.count(1)
+		self.cancelled = False
+		self.paused = False
+		self.condition = threading.Condition()
+
+	def _has_room(self, size):
+		if not self.in_flight:
+			return True
+		return (len(self.in_flight) < self.max_in_flight
+			and self.bytes_in_flight + size <= self.window_bytes)
+
+	def _wait(self, predicate, deadline):
+		while not predicate():
+			if self.cancelled:
+				raise SenderCancelled()
+			remaining = None if deadline is None else deadline - time.monotonic()
+			if remaining is not None and remaining <= 0:
+				raise TimeoutError("No room in the send window")
+			self.condition.wait(remaining)
+
+	def send(self, command, timeout=None):
+		'''Send one command as soon as the window has room for it, returns a Future for its reply'''
+		size = 0 if protocol.is_motion(command) else self.size(command)
+		deadline = None if timeout is None else time.monotonic() + timeout
+		with self.condition:
+			self._wait(lambda: self._has_room(size), deadline)
+			pending = PendingCommand(next(self.seq), command, size)
+			self.in_flight.append(pending)
+			self.bytes_in_flight += size
+			try:
+				self._write(pending)
+			except Exception:
+				self._discard(pending)
+				raise
+			return pending.future
+
+	def send_all(self, commands, timeout=None):
+		'''Pipeline commands and wait for all of their replies, returns the replies in order'''
+		futures = [self.send(command, timeout) for command in commands]
+		return [future.result(timeout) for future in futures]
+
+	def send_urgent(self, command):
+		'''
+		Write command right now, ahead of anything still waiting for window
+		room. The only thing it can wait for is a write already in progress.
+		Used for STOP and PAUSE, which the firmware parses even mid-run.
+		'''
+		with self.condition:
+			if self.cancelled:
+				raise SenderCancelled()
+			pending = PendingCommand(next(self.seq), command, 0)
+			self.in_flight.append(pending)
+			try:
+				self._write(pending)
+			except Exception:
+				self._discard(pending)
+				raise
+			return pending.future
+
+	def _write(self, pending):
+		# PAUSE holds whatever follows it until a RESUME, STOP or new move,
+		# once it is out
+		mode = protocol.command_fields(pending.command)[0]
+		paused = self.paused
+		if mode == 'PAUSE':
+			paused = True
+		elif mode == 'STOP' or mode in protocol.MOTION_MODES:
+			paused = False
+		pending.held = paused
+		pending.sent_at = time.monotonic()
+		self.write(pending.command, pending.seq)
+		self.paused = paused
+
+	def _discard(self, pending):
+		# its write failed, nothing is going to answer it
+		self.in_flight.remove(pending)
+		self.bytes_in_flight -= pending.size
+		self.condition.notify_all()
+
+	def reply_received(self, frame):
+		'''
+		Resolve the command frame is the echo of. The firmware only echoes the
+		last command it parsed while a RUN is moving, so anything older than
+		the matched command was answered by the same echo.
+		'''
+		reply = protocol.parse_reply(frame)
+		if reply is None:
+			return None
+		return self._retire(lambda pending: protocol.reply_matches(pending.command, reply), reply)
+
+	def ack_received(self, seq):
+		'''Same for the <ACK|seq> a binary command is answered with, seq is the low byte'''
+		return self._retire(lambda pending: pending.seq & 0xFF == seq, {'seq': seq})
+
+	def _retire(self, matches, reply):
+		with self.condition:
+			for i, pending in enumerate(self.in_flight):
+				if matches(pending):
+					for done in list(itertools.islice(self.in_flight, i + 1)):
+						if pending.held and done is not pending and protocol.is_motion(done.command):
+							# paused, not over
+							continue
+						self.in_flight.remove(done)
+						self.bytes_in_flight -= done.size
+						done.future.set_result(reply)
+					self.condition.notify_all()
+					return pending
+		return None
+
+	def cancel(self):
+		'''Give up on everything in flight, e.g. when the port is closed'''
+		with self.condition:
+			self.cancelled = True
+			for pending in self.in_flight:
+				pending.future.set_exception(SenderCancelled())
+			self.in_flight.clear()
+			self.bytes_in_flight = 0
+			self.condition.notify_all()
+
+
+# ##########################
+# TRANSPORT : SERIAL TRANSPORT
+# ##########################
+class Transport(object):
+	'''
+	Owns an open serial port: writes commands without ever discarding input,
+	reads frames in bulk and resolves the sender's futures from the replies.
+
+	read_forever() is meant to run on its own thread (a plain threading.Thread
+	in poseidon.controller), everything else is thread safe.
+
+	ready is a Future that resolves once the board has printed its ready
+	banner, or fails with SenderCancelled if the transport is closed first.
+
+	write_listeners are called with every command right after it went out,
+	in wire order, from whichever thread wrote it. Keep them quick.
+	'''
+
+	def __init__(self, port, window_bytes=FIRMWARE_BUFFER_SIZE, max_in_flight=4):
+		self.port = port
+		self.write_lock = threading.Lock()
+		self.decoder = protocol.FrameDecoder()
+		self.sender = PipelinedSender(self.write, window_bytes, max_in_flight, self.wire_size)
+		self.ready = concurrent.futures.Future()
+		self.ready_lock = threading.Lock()
+		self.binary = False
+		self.binary_offered = False
+		self.running = True
+		self.write_listeners = []
+
+	def write(self, command, seq=None):
+		'''Write one command, binary encoded if that was negotiated and it came through the sender'''
+		data = None
+		if self.binary and seq is not None:
+			try:
+				data = binary.encode_command(command, seq)
+			except binary.NoOpcode:
+				pass
+		with self.write_lock:
+			self.port.write(data or command.encode())
+			for listener in self.write_listeners:
+				listener(command)
+
+	def wire_size(self, command):
+		if self.binary:
+			return binary.encoded_size(command)
+		return len(command)
+
+	def send(self, command, timeout=None):
+		return self.sender.send(command, timeout)
+
+	def send_all(self, commands, timeout=None):
+		return self.sender.send_all(commands, timeout)
+
+	def send_urgent(self, command):
+		return self.sender.send_urgent(command)
+
+	def frame_received(self, frame):
+		if frame == protocol.READY_BANNER:
+			self._settle_ready(result=time.monotonic())
+			return None
+		if frame == binary.OFFER:
+			self.binary_offered = True
+			return None
+		seq = binary.parse_ack(frame)
+		if seq is not None:
+			return self.sender.ack_received(seq)
+		return self.sender.reply_received(frame)
+
+	def negotiate(self):
+		'''
+		Offer the binary encoding, returns a Future that resolves to True once
+		the board has taken it up (False if it only echoed HELLO). Text keeps
+		working on both ends either way, so there is no need to wait for it.
+		'''
+		hello = self.sender.send(binary.HELLO)
+		result = concurrent.futures.Future()
+
+		def done(future):
+			if future.exception() is not None:
+				result.set_exception(future.exception())
+				return
+			self.binary = self.binary_offered
+			result.set_result(self.binary)
+
+		hello.add_done_callback(done)
+		return result
+
+	def _settle_ready(self, result=None, exception=None):
+		# A second banner (the board reset on its own) changes nothing
+		with self.ready_lock:
+			if self.ready.running() or self.ready.done():
+				return
+			self.ready.set_running_or_notify_cancel()
+		if exception is not None:
+			self.ready.set_exception(exception)
+		else:
+			self.ready.set_result(result)
+
+	def wait_ready(self, timeout=None):
+		'''Block until the board is ready, raises TimeoutError if it does not say so in time'''
+		try:
+			self.ready.result(timeout)
+		except concurrent.futures.TimeoutError:
+			raise TimeoutError("No <%s> from the board after %.1f s" % (protocol.READY_BANNER, timeout))
+
+	def read_forever(self, on_frame=None):
+		'''Block in the port read until bytes arrive, pass every frame to on_frame(text)'''
+		while self.running:
+			try:
+				frames = self.decoder.read(self.port)
+			except (OSError, serial.SerialException, TypeError, AttributeError):
+				# The port was closed underneath us (disconnect / closeEvent)
+				break
+			for frame in frames:
+				text = protocol.decode(frame)
+				self.frame_received(text)
+				if on_frame is not None:
+					on_frame(text)
+		self.running = False
+
+	def stop(self):
+		self.running = False
+		# Wake the blocking read up right away where pyserial supports it
+		if hasattr(self.port, 'cancel_read'):
+			self.port.cancel_read()
+
+	def close(self):
+		self.sender.cancel()
+		self._settle_ready(exception=SenderCancelled())
+		self.stop()
+
+
+class QueueFull(Exception):
+	pass
+
+
+# ##########################
+# TRANSPORT : COMMAND WORKER
+# ##########################
+class CommandWorker(object):
+	'''
+	One long lived thread that owns the order in which commands reach the
+	port. Jobs (a list of command strings) are queued by submit() and sent
+	through the transport one after the other; the worker never waits for
+	replies itself, only for room in the send window, so a RUN that is echoed
+	minutes later does not hold the queue up.
+
+	The normal queue is bounded so rapid jogging pushes back instead of piling
+	up. Urgent jobs (STOP, PAUSE) do not queue at all: they are written from
+	the calling thread with transport.send_urgent(), ahead of whatever the
+	worker is doing, and by default throw away the normal jobs still queued.
+	'''
+
+	def __init__(self, transport, maxsize=8):
+		self.transport = transport
+		self.maxsize = maxsize
+		self.jobs = collections.deque()
+		self.condition = threading.Condition()
+		self.running = True
+		self.thread = threading.Thread(target=self.run, name='poseidon-commands')
+		self.thread.daemon = True
+
+	def start(self):
+		self.thread.start()
+
+	def submit(self, commands, urgent=False, discard_queued=True):
+		'''
+		Queue a job and return a Future that resolves to the list of replies.
+		Raises QueueFull if the normal queue is at maxsize.
+		'''
+		job = concurrent.futures.Future()
+		job.commands = list(commands)
+		if urgent:
+			if discard_queued:
+				self.discard_queued()
+			job.set_running_or_notify_cancel()
+			try:
+				futures = [self.transport.send_urgent(command) for command in job.commands]
+			except Exception as e:
+				job.set_exception(e)
+				return job
+			gather(futures, job)
+			return job
+		with self.condition:
+			if len(self.jobs) >= self.maxsize:
+				raise QueueFull("%d commands already queued" % len(self.jobs))
+			self.jobs.append(job)
+			self.condition.notify()
+		return job
+
+	def discard_queued(self):
+		with self.condition:
+			while self.jobs:
+				self.jobs.popleft().cancel()
+
+	def _next_job(self):
+		with self.condition:
+			while self.running and not self.jobs:
+				self.condition.wait()
+			if not self.running:
+				return None
+			return self.jobs.popleft()
+
+	def run(self):
+		while True:
+			job = self._next_job()
+			if job is None:
+				break
+			if not job.set_running_or_notify_cancel():
+				continue
+			try:
+				futures = [self.transport.send(command) for command in job.commands]
+			except Exception as e:
+				job.set_exception(e)
+				continue
+			gather(futures, job)
+
+	def stop(self):
+		with self.condition:
+			self.running = False
+			for job in self.jobs:
+				job.cancel()
+			self.jobs.clear()
+			self.condition.notify_all()
+
+
+def gather(futures, job):
+	'''Resolve job with the results of futures once they are all done, without blocking'''
+	remaining = [len(futures)]
+	lock = threading.Lock()
+
+	def done(_):
+		with lock:
+			remaining[0] -= 1
+			if remaining[0]:
+				return
+		for future in futures:
+			if future.exception() is not None:
+				job.set_exception(future.exception())
+				return
+		job.set_result([future.result() for future in futures])
+
+	if not futures:
+		job.set_result([])
+	for future in futures:
+		future.add_done_callback(done)
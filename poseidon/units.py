@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+'''
+Converting what the user types (mm, mL, µL per s/min/hr) into the steps,
+steps/s and steps/s/s the firmware works in.
+
+Every (syringe, unit) pair gets its three factors worked out once, up front,
+so a conversion is one multiplication. Values can be plain numbers or
+numpy arrays (lists and tuples are turned into arrays), which converts a
+whole program of setpoints in one call:
+
+	units.speed(numpy.linspace(0, 5, 10000), "BD 10 mL", "mL/hr")
+
+Nothing in here prints and nothing needs Qt.
+'''
+
+import itertools
+
+# 200 steps per rev, 32 microsteps, one rev of the lead screw is 0.8 mm
+MOTOR_STEPS = 200
+MICROSTEPS = 32
+MM_PER_REV = 0.8
+STEPS_PER_MM = MOTOR_STEPS * MICROSTEPS / MM_PER_REV
+
+# Plunger areas in mm^2.
+# IMPORTANT: These are for BD Plastic syringes ONLY!! Others will vary.
+SYRINGES = [
+	# name,		volume (mL),	area (mm^2)
+	("BD 1 mL",		1,		17.34206347),
+	("BD 3 mL",		3,		57.88559215),
+	("BD 5 mL",		5,		112.9089185),
+	("BD 10 mL",	10,		163.539454),
+	("BD 20 mL",	20,		285.022957),
+	("BD 30 mL",	30,		366.0961536),
+	("BD 60 mL",	60,		554.0462538),
+]
+SYRINGE_OPTIONS = [name for name, volume, area in SYRINGES]
+SYRINGE_VOLUMES = [volume for name, volume, area in SYRINGES]
+SYRINGE_AREAS = [area for name, volume, area in SYRINGES]
+
+# What the units dropdowns offer
+UNITS = ['mm/s', 'mL/s', 'mL/hr', 'µL/hr']
+
+# mm^3 per unit of length, None for plain mm of plunger travel
+LENGTHS = {'mm': None, 'mL': 1000.0, 'µL': 1.0}
+# seconds per unit of time
+TIMES = {'s': 1.0, 'min': 60.0, 'hr': 3600.0}
+
+
+def unit_factors(area, unit):
+	'''(displacement, speed, accel) factors to steps for a plunger area in mm^2 and a unit like mL/hr'''
+	length, time = unit.split("/")
+	mm3 = LENGTHS[length]
+	steps = STEPS_PER_MM if mm3 is None else mm3 / area * STEPS_PER_MM
+	seconds = TIMES[time]
+	return (steps, steps / seconds, steps / (seconds * seconds))
+
+
+# (syringe name, unit) -> (displacement, speed, accel), every syringe times every unit
+FACTORS = dict(((name, unit), unit_factors(area, unit))
+	for (name, volume, area), unit in itertools.product(SYRINGES,
+		["%s/%s" % pair for pair in itertools.product(LENGTHS, TIMES)]))
+
+
+def factors(syringe, unit):
+	'''Table lookup, syringe can also be a plunger area in mm^2 for syringes not in the table'''
+	try:
+		return FACTORS[(syringe, unit)]
+	except KeyError:
+		if isinstance(syringe, str):
+			raise
+		return unit_factors(syringe, unit)
+
+
+def _scale(value, factor):
+	if isinstance(value, (list, tuple)):
+		import numpy
+		value = numpy.asarray(value, dtype=float)
+	return value * factor
+
+
+def displacement(value, syringe, unit):
+	'''mm / mL / µL -> steps'''
+	return _scale(value, factors(syringe, unit)[0])
+
+
+def speed(value, syringe, unit):
+	'''mm/s, mL/hr, ... -> steps/s'''
+	return _scale(value, factors(syringe, unit)[1])
+
+
+def accel(value, syringe, unit):
+	'''mm/s/s, mL/hr/hr, ... -> steps/s/s'''
+	return _scale(value, factors(syringe, unit)[2])
+
+
+def to_user(steps, syringe, unit, kind=0):
+	'''The other way round, steps back to the user's unit. kind is 0, 1 or 2 for displacement, speed, accel'''
+	return _scale(steps, 1.0 / factors(syringe, unit)[kind])
@@ -501,6 +501,36 @@ class Ui_MainWindow(object):
         self.camera_capture_image_BTN.setObjectName("camera_capture_image_BTN")
         self.horizontalLayout_5.addWidget(self.camera_capture_image_BTN)
         self.verticalLayout_10.addLayout(self.horizontalLayout_5)
+        self.horizontalLayout_17 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_17.setObjectName("horizontalLayout_17")
+        self.camera_timelapse_BTN = QtWidgets.QPushButton(self.camera)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Maximum)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.camera_timelapse_BTN.sizePolicy().hasHeightForWidth())
+        self.camera_timelapse_BTN.setSizePolicy(sizePolicy)
+        self.camera_timelapse_BTN.setCheckable(True)
+        self.camera_timelapse_BTN.setObjectName("camera_timelapse_BTN")
+        self.horizontalLayout_17.addWidget(self.camera_timelapse_BTN)
+        self.label_59 = QtWidgets.QLabel(self.camera)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Maximum, QtWidgets.QSizePolicy.Preferred)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.label_59.sizePolicy().hasHeightForWidth())
+        self.label_59.setSizePolicy(sizePolicy)
+        self.label_59.setObjectName("label_59")
+        self.horizontalLayout_17.addWidget(self.label_59)
+        self.camera_interval_INPUT = QtWidgets.QDoubleSpinBox(self.camera)
+        self.camera_interval_INPUT.setDecimals(1)
+        self.camera_interval_INPUT.setMaximum(3600.0)
+        self.camera_interval_INPUT.setProperty("value", 10.0)
+        self.camera_interval_INPUT.setObjectName("camera_interval_INPUT")
+        self.horizontalLayout_17.addWidget(self.camera_interval_INPUT)
+        self.camera_pump_events_CHECKBOX = QtWidgets.QCheckBox(self.camera)
+        self.camera_pump_events_CHECKBOX.setChecked(True)
+        self.camera_pump_events_CHECKBOX.setObjectName("camera_pump_events_CHECKBOX")
+        self.horizontalLayout_17.addWidget(self.camera_pump_events_CHECKBOX)
+        self.verticalLayout_10.addLayout(self.horizontalLayout_17)
         self.verticalLayout_11.addLayout(self.verticalLayout_10)
         self.tabWidget.addTab(self.camera, "")
         self.setup = QtWidgets.QWidget()
@@ -765,6 +795,10 @@ class Ui_MainWindow(object):
         self.camera_connect_BTN.setText(_translate("MainWindow", "Connect"))
         self.camera_disconnect_BTN.setText(_translate("MainWindow", "Disconnect"))
         self.camera_capture_image_BTN.setText(_translate("MainWindow", "Capture Image"))
+        self.camera_timelapse_BTN.setText(_translate("MainWindow", "Timelapse"))
+        self.label_59.setText(_translate("MainWindow", "Every"))
+        self.camera_interval_INPUT.setSuffix(_translate("MainWindow", " s"))
+        self.camera_pump_events_CHECKBOX.setText(_translate("MainWindow", "On pump events"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.camera), _translate("MainWindow", "Camera"))
         self.label_7.setText(_translate("MainWindow", "Select port:"))
         self.refresh_ports_BTN.setText(_translate("MainWindow", "Refresh ports"))
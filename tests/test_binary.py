@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+'''poseidon.binary encoding'''
+
+import pytest
+
+from poseidon import binary
+
+
+def test_out_of_range_is_not_sent_as_text():
+	for command in ["<RUN,DIST,1,0.0,F,3000000000.0,0.0,0.0>", "<JOG,ONE,1,0.0,B,inf,0.0,0.0>",
+			"<SETTING,SPEED,1,1e40,F,0.0,0.0,0.0>"]:
+		with pytest.raises(ValueError) as error:
+			binary.encode_command(command)
+		assert not isinstance(error.value, binary.NoOpcode)
+	with pytest.raises(binary.NoOpcode):
+		binary.encode_command(binary.HELLO)
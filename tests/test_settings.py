@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+'''poseidon.settings validation'''
+
+import pytest
+
+from poseidon import settings
+
+PUMP = '{"number": 1, "syringe": "BD 10 mL", "units": "mL/hr", "speed": %s, "accel": 1.0, "jog_delta": 0.1}'
+
+
+def document(speed):
+	return '{"format": "%s", "version": %d, "pumps": [%s]}' % (settings.FORMAT, settings.VERSION, PUMP % speed)
+
+
+def test_finite_speed_loads():
+	assert settings.parse(document("2.0"))['pumps'][0]['speed'] == 2.0
+
+
+@pytest.mark.parametrize('speed', ["1e400", "-1e400", "NaN", "Infinity"])
+def test_non_finite_speed_is_rejected(speed):
+	with pytest.raises(settings.SettingsError) as error:
+		settings.parse(document(speed))
+	assert "pumps[0].speed" in str(error.value)
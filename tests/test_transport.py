@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+'''
+poseidon.transport.PipelinedSender without a port: write is a function that
+can be made to fail.
+
+	python -m pytest tests
+'''
+
+import pytest
+
+from poseidon import transport
+
+SETTING = "<SETTING,SPEED,1,800.0,F,0.0,0.0,0.0>"
+
+
+class FlakyPort(object):
+	'''Records what is written, raises error instead while it is set'''
+
+	def __init__(self):
+		self.written = []
+		self.error = None
+
+	def write(self, command, seq):
+		if self.error is not None:
+			raise self.error
+		self.written.append(command)
+
+
+def test_send_after_failed_write():
+	port = FlakyPort()
+	sender = transport.PipelinedSender(port.write)
+	port.error = OSError("device unplugged")
+	for _ in range(2):
+		with pytest.raises(OSError):
+			sender.send(SETTING, timeout=0.1)
+	assert not sender.in_flight
+	assert sender.bytes_in_flight == 0
+
+	port.error = None
+	future = sender.send(SETTING, timeout=0.1)
+	assert port.written == [SETTING]
+	assert sender.reply_received("mode: SETTING ,setting: SPEED ,motorID: 1 ,value: 800.00 ,direction: F ,"
+		"p1 optional: 0.00 ,p2 optional: 0.00 ,p3 optional: 0.00 ,Time 0") is not None
+	assert future.done()
+
+
+def test_failed_urgent_write():
+	port = FlakyPort()
+	sender = transport.PipelinedSender(port.write, max_in_flight=1)
+	port.error = OSError("device unplugged")
+	with pytest.raises(OSError):
+		sender.send_urgent("<PAUSE,BLAH,1,BLAH,F,0.0,0.0,0.0>")
+	assert not sender.in_flight
+	assert not sender.paused
+
+	port.error = None
+	sender.send(SETTING, timeout=0.1)
+	assert port.written == [SETTING]